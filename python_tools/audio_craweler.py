@@ -1,125 +1,1169 @@
+import io
 import os
+import re
+import sys
 import json
+import wave
+import time
+import random
+import shutil
+import signal
 import asyncio
+import hashlib
+import argparse
 import subprocess
-from typing import Tuple
+import importlib.util
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from contextlib import AsyncExitStack, asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, Iterable, List, NamedTuple, Optional, Tuple
 from pathlib import Path
+from urllib.parse import urlparse, parse_qs
 
 import openai
 
 os.environ["PATH"] = f'{os.environ["PATH"]}:/opt/homebrew/Caskroom/miniforge/base/bin'
 
+DEFAULT_OUTPUT_DIR = "/Users/luominzhi/Scratch/audio/"
 
-async def exec_command(command) -> Tuple[str, str, int]:
-    process = await asyncio.create_subprocess_shell(
-        command,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-    )
-    stdout, stderr = await process.communicate()
-    return stdout.decode(), stderr.decode(), process.returncode
+# pipeline stages, in the order every video goes through them
+STAGES = ("download", "extract", "transcribe")
+
+TRANSCRIBE_MODEL = "whisper-1"
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "audio_craweler"
+DEFAULT_CACHE_SIZE_GB = 20
+
+# what the cache stores, and the file suffix of each kind (audio keys carry their own extension)
+CACHE_KINDS = {"info": ".json", "video": ".mp4", "audio": "", "transcript": ".txt"}
+
+# audio sent to transcription: "mp3" extracts a file from the downloaded video as before,
+# the others are piped out of ffmpeg as 16 kHz mono (file extension, ffmpeg output options)
+AUDIO_FORMATS = {
+    "opus": ("ogg", ["-c:a", "libopus", "-b:a", "24k", "-application", "voip", "-f", "ogg"]),
+    "pcm": ("wav", ["-c:a", "pcm_s16le", "-f", "s16le"]),
+}
+DEFAULT_AUDIO_FORMAT = "opus"
+SAMPLE_RATE = 16000
+
+# bilibili's CDN rejects requests without these
+DEFAULT_REFERER = "https://www.bilibili.com"
+DEFAULT_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+
+# long audio is transcribed in chunks of at most this many seconds, cut in silences where possible
+DEFAULT_CHUNK_SECONDS = 300
+# the transcription API rejects files over 25 MB
+MAX_CHUNK_BYTES = 24 * 1024 ** 2
+# a gap counts as silence when quieter than SILENCE_NOISE for at least SILENCE_SECONDS
+SILENCE_NOISE = "-35dB"
+SILENCE_SECONDS = 0.5
+# container of stream-copied chunks, by audio file extension (WAV is sliced directly)
+CHUNK_CONTAINERS = {"ogg": "ogg", "mp3": "mp3"}
+
+# failed transcription requests are retried with exponential backoff
+DEFAULT_TRANSCRIBE_RETRIES = 4
+RETRY_BACKOFF_SECONDS = 1.0
+
+# local speech recognition (--backend local), the model of examples/gradio/06_block_speech_text_sentiment.py
+LOCAL_ASR_MODEL = "facebook/wav2vec2-base-960h"
+# the model sees the audio in windows of this many seconds, so memory does not grow with the chunk length
+LOCAL_WINDOW_SECONDS = 30
+LOCAL_BATCH_SIZE = 8
+# how long a chunk waits for others to fill its batch
+BATCH_WAIT_SECONDS = 0.2
+
+# partial downloads older than this are left over from crashed runs
+STALE_PARTIAL_SECONDS = 24 * 3600
+
+# external commands (you-get, ffmpeg) running at the same time, across all stages
+DEFAULT_MAX_PROCESSES = max(4, 2 * (os.cpu_count() or 1))
+# commands still running after this many seconds are killed; info lookups should be quick
+DEFAULT_COMMAND_TIMEOUT = 1800
+INFO_TIMEOUT = 60
+# of the output a command prints, only the last lines are kept (for error messages)
+OUTPUT_TAIL_LINES = 50
+MAX_LINE_LENGTH = 1000
+READ_SIZE = 64 * 1024
+
+
+class CommandTimeout(Exception):
+    pass
+
+
+class CompletedCommand(NamedTuple):
+    returncode: int
+    # everything written to stdout, when captured
+    stdout: bytes
+    # the last lines of stderr, and of stdout when it is not captured
+    output: str
+    elapsed: float
+
+
+@dataclass
+class CommandStats:
+    runs: int = 0
+    failures: int = 0
+    timeouts: int = 0
+    total: float = 0.0
+    longest: float = 0.0
+
+
+class CommandRunner:
+    """Runs external commands without a shell, at most max_processes at the same time.
+
+    Output is read as it is written, line by line (a line ends at \\n or \\r, so progress bars
+    count too), and only the last OUTPUT_TAIL_LINES are kept unless stdout is captured.
+    Commands running longer than their timeout are killed along with their children.
+    """
+
+    def __init__(self, max_processes: int = DEFAULT_MAX_PROCESSES, timeout: float = DEFAULT_COMMAND_TIMEOUT):
+        self.max_processes = max_processes
+        self.timeout = timeout
+        # print every output line, prefixed with the command name
+        self.echo = False
+        self.stats: Dict[str, CommandStats] = {}
+        # created on first use, inside the event loop
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def run(
+        self, args: List[str], stdin: Optional[bytes] = None, capture: bool = False,
+        timeout: Optional[float] = None, on_line: Optional[Callable[[str], None]] = None,
+    ) -> CompletedCommand:
+        """Runs args and returns once it exits; on_line gets every output line that is not captured."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_processes)
+        name = Path(args[0]).name
+        stats = self.stats.setdefault(name, CommandStats())
+        tail: Deque[str] = deque(maxlen=OUTPUT_TAIL_LINES)
+
+        def line_received(line: str) -> None:
+            tail.append(line)
+            if on_line is not None:
+                on_line(line)
+            if self.echo:
+                print(f"[{name}] {line}", file=sys.stderr)
+
+        async with self._semaphore:
+            start = time.perf_counter()
+            process = await asyncio.create_subprocess_exec(
+                *args,
+                stdin=subprocess.DEVNULL if stdin is None else subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                # its own process group, so children (you-get runs ffmpeg) are killed too
+                start_new_session=True,
+            )
+            readers = [
+                self._read_all(process.stdout) if capture else self._read_lines(process.stdout, line_received),
+                self._read_lines(process.stderr, line_received),
+            ]
+            if stdin is not None:
+                readers.append(self._write(process.stdin, stdin))
+            limit = timeout or self.timeout
+            try:
+                stdout, *_ = await asyncio.wait_for(asyncio.gather(*readers, process.wait()), limit)
+            except asyncio.TimeoutError:
+                self._kill(process)
+                await process.wait()
+                stats.runs += 1
+                stats.timeouts += 1
+                raise CommandTimeout(f"{name} was killed after running for {limit:g}s")
+            except BaseException:
+                # cancelled, e.g. another chunk of the same video failed
+                self._kill(process)
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                stats.total += elapsed
+                stats.longest = max(stats.longest, elapsed)
+
+        stats.runs += 1
+        stats.failures += process.returncode != 0
+        return CompletedCommand(process.returncode, stdout or b"", "\n".join(tail), elapsed)
+
+    @staticmethod
+    async def _read_all(stream: asyncio.StreamReader) -> bytes:
+        return await stream.read()
+
+    @staticmethod
+    async def _read_lines(stream: asyncio.StreamReader, line_received: Callable[[str], None]) -> None:
+        partial = b""
+        while True:
+            chunk = await stream.read(READ_SIZE)
+            if not chunk:
+                break
+            lines = re.split(rb"[\r\n]", partial + chunk)
+            # an endless line cannot grow the buffer beyond MAX_LINE_LENGTH
+            partial = lines.pop()[-MAX_LINE_LENGTH:]
+            for line in lines:
+                if line.strip():
+                    line_received(line[:MAX_LINE_LENGTH].decode(errors="replace").rstrip())
+        if partial.strip():
+            line_received(partial.decode(errors="replace").rstrip())
+
+    @staticmethod
+    async def _write(stream: asyncio.StreamWriter, data: bytes) -> None:
+        try:
+            stream.write(data)
+            await stream.drain()
+            stream.close()
+        except (BrokenPipeError, ConnectionResetError):
+            # the command stopped reading; its exit code tells why
+            pass
+
+    @staticmethod
+    def _kill(process: asyncio.subprocess.Process) -> None:
+        if process.returncode is not None:
+            return
+        try:
+            if hasattr(os, "killpg"):
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                process.kill()
+        except ProcessLookupError:
+            pass
+
+    def summary(self) -> str:
+        return ", ".join(
+            f"{name} {stats.runs} runs in {stats.total:.1f}s (longest {stats.longest:.1f}s"
+            + (f", {stats.failures} failed" if stats.failures else "")
+            + (f", {stats.timeouts} timed out" if stats.timeouts else "")
+            + ")"
+            for name, stats in self.stats.items()
+        )
+
+
+commands = CommandRunner()
+
+
+async def exec_command(args: List[str], timeout: Optional[float] = None, capture: bool = False) -> Tuple[str, str, int]:
+    """Runs args through the shared runner, returning (stdout if captured, last output lines, exit code)."""
+    result = await commands.run(args, capture=capture, timeout=timeout)
+    return result.stdout.decode(errors="replace"), result.output, result.returncode
 
 
 async def extract_audio_from_video(video_path: str, audio_path: str) -> None:
     if Path(audio_path).exists():
         Path(audio_path).unlink()
 
-    command = f'ffmpeg -i "{video_path}" -vn "{audio_path}"'
-
-    stdout, stderr, return_code = await exec_command(command)
+    stdout, stderr, return_code = await exec_command(["ffmpeg", "-nostdin", "-i", video_path, "-vn", audio_path])
 
     if return_code != 0:
         raise Exception(f"Failed to extract audio: {stderr}")
 
 
-async def get_bilibili_video_title(url: str) -> str:
-    command = f'you-get --json "{url}"'
+async def run_ffmpeg(
+    args: List[str], stdin: Optional[bytes] = None, loglevel: str = "error",
+    on_line: Optional[Callable[[str], None]] = None,
+) -> bytes:
+    """Runs ffmpeg with args, feeding it stdin, and returns its stdout; raises if ffmpeg fails.
+
+    With on_line, stdout is not captured but passed line by line like the log.
+    """
+    result = await commands.run(
+        ["ffmpeg", "-hide_banner", "-loglevel", loglevel, *(["-nostdin"] if stdin is None else []), *args],
+        stdin=stdin, capture=on_line is None, on_line=on_line,
+    )
+    if result.returncode != 0:
+        raise Exception(result.output or f"ffmpeg exited with {result.returncode}")
+    return result.stdout
+
+
+async def pipe_audio(source: str, audio_format: str, headers: Optional[str] = None) -> bytes:
+    """Decodes the audio track of source (a file or a url) to 16 kHz mono and returns it without touching disk.
+
+    A url is read as a stream, so decoding runs while the data is still arriving.
+    """
+    extension, output_options = AUDIO_FORMATS[audio_format]
+    # http only, other inputs reject the option
+    input_options = ["-headers", headers] if headers and source.startswith(("http://", "https://")) else []
+    try:
+        stdout = await run_ffmpeg(
+            [*input_options, "-i", source, "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE), *output_options, "pipe:1"]
+        )
+    except Exception as e:
+        raise Exception(f"Failed to extract audio: {e}")
+    if not stdout:
+        raise Exception("Failed to extract audio: ffmpeg wrote nothing")
+    if audio_format == "pcm":
+        # raw samples, wrapped in a WAV header now that the length is known
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(SAMPLE_RATE)
+            wav.writeframes(stdout)
+        return buffer.getvalue()
+    return stdout
+
+
+class AudioChunk(NamedTuple):
+    start: float
+    audio: bytes
+    filename: str
 
-    stdout, stderr, return_code = await exec_command(command)
+
+async def analyze_audio(audio: bytes) -> Tuple[float, List[Tuple[float, float]]]:
+    """Decodes audio once, returning its duration and the (start, end) of every silence in seconds."""
+    duration = 0.0
+    silences = []
+    start = None
+
+    def line_received(line: str) -> None:
+        nonlocal duration, start
+        key, _, value = line.partition("=")
+        if key == "out_time_us" and value.strip().isdigit():
+            duration = int(value) / 1e6
+            return
+        match = re.search(r"silence_(start|end): (-?[\d.]+)", line)
+        if match is None:
+            return
+        if match.group(1) == "start":
+            start = max(0.0, float(match.group(2)))
+        elif start is not None:
+            silences.append((start, float(match.group(2))))
+            start = None
+
+    await run_ffmpeg(
+        ["-nostats", "-progress", "pipe:1", "-i", "pipe:0",
+         "-af", f"silencedetect=noise={SILENCE_NOISE}:d={SILENCE_SECONDS}", "-f", "null", "-"],
+        stdin=audio, loglevel="info", on_line=line_received,
+    )
+    if start is not None:
+        silences.append((start, duration))
+    return duration, silences
+
+
+def plan_cuts(duration: float, silences: List[Tuple[float, float]], max_seconds: float) -> List[float]:
+    """Returns where to cut so that no chunk is longer than max_seconds.
+
+    Each cut is in the middle of the last silence in the second half of its chunk, so words are not
+    split; a chunk without such a silence is cut at exactly max_seconds.
+    """
+    cuts = []
+    start = 0.0
+    while duration - start > max_seconds:
+        end = start + max_seconds
+        middles = [(a + b) / 2 for a, b in silences if start + max_seconds / 2 < (a + b) / 2 <= end]
+        start = middles[-1] if middles else end
+        cuts.append(start)
+    return cuts
+
+
+def slice_wav(audio: bytes, start: float, end: Optional[float]) -> bytes:
+    with wave.open(io.BytesIO(audio)) as source:
+        params = source.getparams()
+        first = int(start * params.framerate)
+        source.setpos(min(first, params.nframes))
+        count = params.nframes - first if end is None else int(end * params.framerate) - first
+        frames = source.readframes(max(0, count))
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as chunk:
+        chunk.setparams(params)
+        chunk.writeframes(frames)
+    return buffer.getvalue()
+
+
+async def split_audio(audio: bytes, filename: str, max_seconds: float, max_bytes: int) -> List[AudioChunk]:
+    """Splits audio into chunks no longer than max_seconds and (roughly) no larger than max_bytes."""
+    duration, silences = await analyze_audio(audio)
+    if duration > 0:
+        # leave some room for the bitrate varying along the audio
+        max_seconds = min(max_seconds, 0.9 * max_bytes * duration / len(audio))
+    if duration <= max_seconds:
+        return [AudioChunk(0.0, audio, filename)]
+
+    stem, _, extension = filename.rpartition(".")
+    bounds = [0.0, *plan_cuts(duration, silences, max_seconds)]
+    chunks = []
+    for number, (start, end) in enumerate(zip(bounds, bounds[1:] + [None]), 1):
+        if extension == "wav":
+            data = slice_wav(audio, start, end)
+        else:
+            length = ["-t", f"{end - start:.3f}"] if end is not None else []
+            data = await run_ffmpeg(
+                ["-i", "pipe:0", "-ss", f"{start:.3f}", *length, "-c", "copy",
+                 "-f", CHUNK_CONTAINERS[extension], "pipe:1"],
+                stdin=audio,
+            )
+        chunks.append(AudioChunk(start, data, f"{stem}.part{number}.{extension}"))
+    return chunks
+
+
+async def get_bilibili_video_info(url: str) -> dict:
+    stdout, stderr, return_code = await exec_command(["you-get", "--json", url], timeout=INFO_TIMEOUT, capture=True)
 
     if stderr or return_code != 0:
-        raise Exception(f"Failed to get bilibili video title: {stderr}")
+        raise Exception(f"Failed to get bilibili video info: {stderr}")
 
-    return json.loads(stdout)["title"]
+    return json.loads(stdout)
 
 
-async def download_bilibili_video(url: str, output_dir: str) -> None:
-    video_title = await get_bilibili_video_title(url)
+async def get_bilibili_video_title(url: str) -> str:
+    return (await get_bilibili_video_info(url))["title"]
 
-    command = f'you-get --output-dir {output_dir} "{url}"'
 
-    stdout, stderr, return_code = await exec_command(command)
+def pick_audio_source(info: dict) -> Optional[Tuple[str, str]]:
+    """Returns (url, ffmpeg headers) to stream the audio from, or None when the video has to be downloaded.
+
+    DASH streams list [video urls, audio urls] and the audio track is the same in every quality;
+    otherwise a stream that is a single file works too (ffmpeg skips the video track).
+    """
+    extra = info.get("extra") or {}
+    headers = (
+        f"Referer: {extra.get('referer') or DEFAULT_REFERER}\r\n"
+        f"User-Agent: {extra.get('ua') or DEFAULT_USER_AGENT}\r\n"
+    )
+    single_file = None
+    streams = (info.get("streams") or {}).values()
+    for stream in sorted(streams, key=lambda stream: stream.get("size") or 0):
+        src = stream.get("src") or []
+        if len(src) == 2 and all(isinstance(part, list) and part for part in src):
+            return src[1][0], headers
+        if single_file is None and len(src) == 1 and isinstance(src[0], str):
+            single_file = src[0]
+    return (single_file, headers) if single_file else None
+
+
+async def download_bilibili_video(url: str, output_dir: str) -> None:
+    stdout, stderr, return_code = await exec_command(["you-get", "--output-dir", output_dir, url])
 
     if return_code != 0:
         raise Exception(f"Failed to download video: {stderr}")
 
 
+class Segment(NamedTuple):
+    start: float
+    end: float
+    text: str
+
+
+class TranscriptionBackend:
+    """Turns one audio chunk into timed text segments, with times relative to the chunk."""
+
+    name = ""
+    # largest chunk the backend accepts
+    max_bytes = MAX_CHUNK_BYTES
+    # chunks worth sending at the same time, None for the --transcribe-jobs default
+    jobs: Optional[int] = None
+
+    async def transcribe(self, audio: bytes, filename: str) -> List[Segment]:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class WhisperApiBackend(TranscriptionBackend):
+    name = TRANSCRIBE_MODEL
+
+    async def transcribe(self, audio: bytes, filename: str) -> List[Segment]:
+        audio_file = io.BytesIO(audio)
+        # the API tells the format from the file name
+        audio_file.name = filename
+        transcript = await openai.Audio.atranscribe(TRANSCRIBE_MODEL, audio_file, response_format="verbose_json")
+        segments = transcript.get("segments") or []
+        if not segments:
+            return [Segment(0.0, float(transcript.get("duration") or 0.0), transcript["text"])]
+        return [Segment(segment["start"], segment["end"], segment["text"]) for segment in segments]
+
+
+class StubBackend(TranscriptionBackend):
+    """Describes the audio instead of transcribing it, for trying the crawler without network access."""
+
+    name = "stub"
+
+    def __init__(self, delay: float = 0.1):
+        self.delay = delay
+
+    async def transcribe(self, audio: bytes, filename: str) -> List[Segment]:
+        await asyncio.sleep(self.delay)
+        return [Segment(0.0, 0.0, f"{filename}: {len(audio)} bytes of audio")]
+
+
+# the speech recognition pipeline of a LocalAsrBackend worker process, loaded once per process
+_local_asr = None
+
+
+def _load_local_asr(model: str, threads: int) -> None:
+    global _local_asr
+    import torch
+    from transformers import pipeline
+
+    torch.set_num_threads(threads)
+    _local_asr = pipeline("automatic-speech-recognition", model, chunk_length_s=LOCAL_WINDOW_SECONDS, device=-1)
+
+
+def _run_local_asr(batch: List[bytes]) -> List[str]:
+    import numpy
+
+    inputs = [{"raw": numpy.frombuffer(samples, dtype=numpy.float32), "sampling_rate": SAMPLE_RATE} for samples in batch]
+    return [output["text"] for output in _local_asr(inputs, batch_size=len(inputs))]
+
+
+class LocalAsrBackend(TranscriptionBackend):
+    """Transcribes on the CPU with a transformers speech recognition pipeline, without any network access.
+
+    Each worker process loads the model once. Chunks from any video are decoded to 16 kHz samples
+    and queued; a free worker gets them as one batch once batch_size are waiting or the oldest has
+    waited BATCH_WAIT_SECONDS, and while every worker is busy the batches keep filling up.
+    """
+
+    def __init__(self, model: str = LOCAL_ASR_MODEL, workers: Optional[int] = None, batch_size: int = LOCAL_BATCH_SIZE):
+        if importlib.util.find_spec("transformers") is None or importlib.util.find_spec("torch") is None:
+            raise ImportError("the local backend needs transformers and torch: pip install transformers torch")
+        cpus = os.cpu_count() or 1
+        self.workers = workers or max(1, cpus // 4)
+        self.batch_size = batch_size
+        self.name = f"local-{model.replace('/', '--')}"
+        # one batch running and one filling up per worker
+        self.jobs = 2 * self.workers * batch_size
+        # spawn: torch does not survive being forked
+        self._executor = ProcessPoolExecutor(
+            self.workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_load_local_asr, initargs=(model, max(1, cpus // self.workers)),
+        )
+        self._pending: List[Tuple[bytes, asyncio.Future]] = []
+        self._flush_timer: Optional[asyncio.TimerHandle] = None
+        self._running = 0
+
+    async def transcribe(self, audio: bytes, filename: str) -> List[Segment]:
+        samples = await run_ffmpeg(
+            ["-i", "pipe:0", "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "f32le", "pipe:1"], stdin=audio
+        )
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((samples, future))
+        self._schedule()
+        text = await future
+        return [Segment(0.0, len(samples) / 4 / SAMPLE_RATE, text)]
+
+    def _schedule(self) -> None:
+        if self._running >= self.workers or not self._pending:
+            return
+        if len(self._pending) >= self.batch_size:
+            self._submit()
+        elif self._flush_timer is None:
+            self._flush_timer = asyncio.get_running_loop().call_later(BATCH_WAIT_SECONDS, self._submit)
+
+    def _submit(self) -> None:
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        # chunks of a failed video are cancelled while they wait
+        self._pending = [(samples, future) for samples, future in self._pending if not future.done()]
+        if self._running >= self.workers or not self._pending:
+            return
+        batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+        futures = [future for _, future in batch]
+        try:
+            submitted = self._executor.submit(_run_local_asr, [samples for samples, _ in batch])
+        except RuntimeError as e:
+            # the pool is shut down or broken (a worker died), nothing queued can run any more
+            batch, self._pending = batch + self._pending, []
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(Exception(f"local transcription is unavailable: {e}"))
+            return
+        self._running += 1
+        asyncio.wrap_future(submitted).add_done_callback(lambda done: self._deliver(done, futures))
+        self._schedule()
+
+    def _deliver(self, done: asyncio.Future, futures: List[asyncio.Future]) -> None:
+        self._running -= 1
+        if done.cancelled():
+            # the pool shut down before running the batch
+            error: Optional[BaseException] = Exception("the local transcription workers were shut down")
+        else:
+            error = done.exception()
+        texts = done.result() if error is None else [None] * len(futures)
+        for future, text in zip(futures, texts):
+            # chunks of a failed video are cancelled
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(text)
+        # whatever queued up meanwhile has waited long enough
+        self._submit()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+BACKENDS = {"whisper": WhisperApiBackend, "stub": StubBackend, "local": LocalAsrBackend}
+
+
+def format_timestamp(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+
+def render_transcript(segments: Iterable[Segment]) -> str:
+    return "\n".join(
+        f"[{format_timestamp(segment.start)}] {segment.text.strip()}" for segment in segments if segment.text.strip()
+    )
+
+
 async def convert_audio_to_text(audio_file_path: str) -> str:
-    # url = "https://api.openai.com/v1/audio/transcriptions"
-    #
-    # headers = {
-    #     'Authorization': f'Bearer {os.environ["OPENAI_API_KEY"]}',
-    #     'Content-Type': 'multipart/form-data'
-    # }
-    #
-    # data = {
-    #     'model': 'whisper-1',
-    # }
-    #
-    # with open(audio_file_path, 'rb') as f:
-    #     files = [
-    #         ('file', (f.name, f, "application/octet-stream"))
-    #     ]
-    #
-    #     async with httpx.AsyncClient() as client:
-    #         response = await client.post(
-    #             url,
-    #             headers=headers,
-    #             params=data,
-    #             files=files,
-    #             timeout=500
-    #         )
-    #         return response.json()["text"]
-
-    audio_file = open(audio_file_path, "rb")
-    transcript = await openai.Audio.atranscribe("whisper-1", audio_file)
-    return transcript.text
-
-
-async def convert_video_audio_to_text(url: str, output_dir: str, debug: bool = False) -> None:
-    if debug:
-        print("step 1 - get video title")
-    title = await get_bilibili_video_title(url)
+    """Transcribes one audio file in a single Whisper API request, without chunking or retries."""
+    audio = Path(audio_file_path)
+    segments = await WhisperApiBackend().transcribe(audio.read_bytes(), audio.name)
+    return " ".join(segment.text.strip() for segment in segments)
 
-    print(f"generating video copywriting from {title}")
 
-    if debug:
-        print("step 2 - download video into local")
-    await download_bilibili_video(url, output_dir)
+def parse_video_id(url: str) -> str:
+    """Returns the bilibili video id (BV... or av...) of url, with the part number for multi-part videos.
+
+    Urls without a recognizable id fall back to a hash of the url, so they are still cached.
+    """
+    parsed = urlparse(url)
+    match = re.search(r"(BV[0-9A-Za-z]{10})|av(\d+)", parsed.path)
+    if match is None:
+        return "url-" + hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+    video_id = match.group(1) or f"av{match.group(2)}"
+    part = parse_qs(parsed.query).get("p", ["1"])[0]
+    if part.isdigit() and int(part) > 1:
+        video_id += f"_p{part}"
+    return video_id
+
+
+class MediaCache:
+    """On-disk cache of titles, downloaded videos, extracted audio and transcripts.
+
+    Titles, videos and audio are keyed on the video id, transcripts on the hash of the audio
+    they were made from (and the model), so reruns and retries only redo the missing work.
+    Once the cache grows past max_bytes the least recently used files are evicted;
+    files pinned by a video that is still being processed are never evicted.
+    """
+
+    def __init__(self, root, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        # path -> (last used, size)
+        self._entries: Dict[str, Tuple[float, int]] = {}
+        self._pinned: Dict[str, int] = {}
+        for kind in CACHE_KINDS:
+            (self.root / kind).mkdir(parents=True, exist_ok=True)
+            with os.scandir(self.root / kind) as entries:
+                for entry in entries:
+                    if entry.is_file() and not entry.name.startswith("."):
+                        stat = entry.stat()
+                        self._entries[entry.path] = (stat.st_mtime, stat.st_size)
+
+        self._partial = self.root / "partial"
+        self._partial.mkdir(exist_ok=True)
+        for entry in self._partial.iterdir():
+            if time.time() - entry.stat().st_mtime > STALE_PARTIAL_SECONDS:
+                shutil.rmtree(entry, ignore_errors=True)
+
+    @property
+    def size(self) -> int:
+        return sum(size for _, size in self._entries.values())
+
+    def path(self, kind: str, key: str) -> Path:
+        return self.root / kind / f"{key}{CACHE_KINDS[kind]}"
+
+    def get(self, kind: str, key: str) -> Optional[Path]:
+        path = self.path(kind, key)
+        if not path.exists():
+            self._entries.pop(str(path), None)
+            return None
+        self._touch(path)
+        return path
+
+    def read_text(self, kind: str, key: str) -> Optional[str]:
+        path = self.get(kind, key)
+        return path.read_text(encoding="utf-8") if path is not None else None
+
+    def put(self, kind: str, key: str, source, pin: bool = False) -> Path:
+        """Moves source into the cache and returns its new path.
+
+        With pin, the file is pinned before anything is evicted, so it cannot be evicted
+        (not even to make room for itself) until it is unpinned.
+        """
+        path = self.path(kind, key)
+        os.replace(source, path)
+        self._touch(path)
+        if pin:
+            self.pin(path)
+        self.evict()
+        return path
+
+    def put_text(self, kind: str, key: str, text: str) -> Path:
+        return self.put_bytes(kind, key, text.encode("utf-8"))
+
+    def put_bytes(self, kind: str, key: str, data: bytes) -> Path:
+        temp_path = self.root / kind / f".{key}.{os.getpid()}.tmp"
+        temp_path.write_bytes(data)
+        return self.put(kind, key, temp_path)
+
+    def _touch(self, path: Path) -> None:
+        now = time.time()
+        os.utime(path, (now, now))
+        self._entries[str(path)] = (now, path.stat().st_size)
+
+    @contextmanager
+    def partial_dir(self, name: str):
+        """A scratch directory inside the cache (same file system, so put() is a rename)."""
+        path = self._partial / f"{name}.{os.getpid()}"
+        path.mkdir(parents=True, exist_ok=True)
+        try:
+            yield path
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def pin(self, path) -> None:
+        """Keeps path from being evicted until it is unpinned as often as it was pinned."""
+        key = str(path)
+        self._pinned[key] = self._pinned.get(key, 0) + 1
+
+    def unpin(self, path) -> None:
+        key = str(path)
+        self._pinned[key] -= 1
+        if not self._pinned[key]:
+            del self._pinned[key]
+
+    @contextmanager
+    def pinned(self, path):
+        self.pin(path)
+        try:
+            yield
+        finally:
+            self.unpin(path)
+
+    def evict(self) -> None:
+        total = self.size
+        if total <= self.max_bytes:
+            return
+        for path, (_, size) in sorted(self._entries.items(), key=lambda item: item[1][0]):
+            if total <= self.max_bytes:
+                break
+            if path in self._pinned:
+                continue
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            del self._entries[path]
+            total -= size
+
+
+@dataclass
+class StageLimits:
+    """How many videos may be in each stage at the same time."""
+
+    download: int = 4
+    extract: int = field(default_factory=lambda: os.cpu_count() or 1)
+    transcribe: int = 8
+
+
+@dataclass
+class VideoResult:
+    url: str
+    title: Optional[str] = None
+    text: Optional[str] = None
+    error: Optional[str] = None
+    timings: Dict[str, float] = field(default_factory=dict)
+    # stages skipped because their output was already in the cache
+    cached: List[str] = field(default_factory=list)
+
+
+class Pipeline:
+    """Runs many videos through download -> extract -> transcribe at once.
+
+    Every stage has its own semaphore, so downloads (network), ffmpeg (CPU) and
+    transcription (API) overlap across videos instead of running one video at a time.
+    The number of videos in flight is capped as well, so downloads cannot run far
+    ahead of transcription and fill the disk.
+    """
+
+    def __init__(self, limits: StageLimits):
+        self.limits = limits
+        self._semaphores = {stage: asyncio.Semaphore(getattr(limits, stage)) for stage in STAGES}
+        self._in_flight = asyncio.Semaphore(2 * sum(getattr(limits, stage) for stage in STAGES))
+        self.busy = dict.fromkeys(STAGES, 0.0)
+
+    @asynccontextmanager
+    async def video(self):
+        async with self._in_flight:
+            yield
+
+    @asynccontextmanager
+    async def stage(self, name: str, result: VideoResult, holding: Tuple[str, ...] = ()):
+        """Runs inside stage name; holding lists other stages whose slots are taken as well, without timing them."""
+        async with AsyncExitStack() as stack:
+            # always in STAGES order, so two videos cannot wait on each other
+            for stage in STAGES:
+                if stage == name or stage in holding:
+                    await stack.enter_async_context(self._semaphores[stage])
+            start = time.perf_counter()
+            try:
+                yield
+            finally:
+                elapsed = time.perf_counter() - start
+                result.timings[name] = result.timings.get(name, 0.0) + elapsed
+                self.busy[name] += elapsed
+
+
+async def fetch_video(
+    url: str, video_id: str, output_dir: str, result: VideoResult, pipeline: Pipeline,
+    cache: Optional[MediaCache], debug: bool = False,
+) -> str:
+    """Looks up the title and downloads the video, returning the path of the video file.
+
+    A cached video is returned pinned; the caller unpins it once it is done with it.
+    """
+    if cache is not None:
+        info = cache.read_text("info", video_id)
+        if info is not None:
+            result.title = json.loads(info)["title"]
+            video_path = cache.get("video", video_id)
+            if video_path is not None:
+                result.cached.append("download")
+                cache.pin(video_path)
+                return str(video_path)
+
+    async with pipeline.stage("download", result):
+        if result.title is None:
+            if debug:
+                print(f"[{url}] step 1 - get video title")
+            result.title = await get_bilibili_video_title(url)
+            if cache is not None:
+                cache.put_text("info", video_id, json.dumps({"title": result.title, "url": url}, ensure_ascii=False))
+            print(f"generating video copywriting from {result.title}")
+
+        if debug:
+            print(f"[{result.title}] step 2 - download video into local")
+        if cache is None:
+            await download_bilibili_video(url, output_dir)
+            return str(Path(output_dir) / f"{result.title}.mp4")
+        with cache.partial_dir(f"{video_id}-video") as partial:
+            await download_bilibili_video(url, str(partial))
+            return str(cache.put("video", video_id, partial / f"{result.title}.mp4", pin=True))
+
+
+async def extract_audio(
+    video_path: str, video_id: str, output_dir: str, result: VideoResult, pipeline: Pipeline,
+    cache: Optional[MediaCache], debug: bool = False,
+) -> str:
+    """Extracts the audio track of the video, returning the path of the audio file.
+
+    Like fetch_video, a cached audio file is returned pinned.
+    """
+    if cache is not None:
+        audio_path = cache.get("audio", f"{video_id}.mp3")
+        if audio_path is not None:
+            result.cached.append("extract")
+            cache.pin(audio_path)
+            return str(audio_path)
+
+    async with pipeline.stage("extract", result):
+        if debug:
+            print(f"[{result.title}] step 3 - extract audio from video")
+        if cache is None:
+            audio_path = str(Path(output_dir) / f"{result.title}.mp3")
+            await extract_audio_from_video(video_path, audio_path)
+            return audio_path
+        with cache.partial_dir(f"{video_id}-audio") as partial:
+            audio_path = partial / "audio.mp3"
+            await extract_audio_from_video(video_path, str(audio_path))
+            return str(cache.put("audio", f"{video_id}.mp3", audio_path, pin=True))
+
+
+async def stream_audio(
+    url: str, video_id: str, output_dir: str, result: VideoResult, pipeline: Pipeline,
+    cache: Optional[MediaCache], audio_format: str, debug: bool = False,
+) -> Tuple[bytes, str]:
+    """Pipes the audio out of ffmpeg without writing an audio file, returning (audio, file name).
+
+    ffmpeg reads the separate audio stream of the video straight from the CDN, so extraction runs
+    while the data is downloading; without such a stream the video is downloaded first.
+    """
+    extension = AUDIO_FORMATS[audio_format][0]
+    key = f"{video_id}.{extension}"
+    if cache is not None:
+        info = cache.read_text("info", video_id)
+        audio_path = cache.get("audio", key)
+        if info is not None and audio_path is not None:
+            result.title = json.loads(info)["title"]
+            result.cached += ["download", "extract"]
+            return audio_path.read_bytes(), f"{result.title}.{extension}"
+
+    # stream urls expire, so the info is looked up again even when the title is cached
+    async with pipeline.stage("download", result):
+        if debug:
+            print(f"[{url}] step 1 - get video info")
+        info = await get_bilibili_video_info(url)
+    result.title = info["title"]
+    if cache is not None:
+        cache.put_text("info", video_id, json.dumps({"title": result.title, "url": url}, ensure_ascii=False))
+    print(f"generating video copywriting from {result.title}")
+
+    source = pick_audio_source(info)
+    holding: Tuple[str, ...] = ("download",)
+    if source is None:
+        video_path = await fetch_video(url, video_id, output_dir, result, pipeline, cache, debug)
+        source, holding = (video_path, None), ()
+    try:
+        async with pipeline.stage("extract", result, holding):
+            if debug:
+                print(f"[{result.title}] step 2 - stream {audio_format} audio from {'url' if holding else 'video'}")
+            audio = await pipe_audio(source[0], audio_format, source[1])
+    finally:
+        if cache is not None and not holding:
+            cache.unpin(source[0])
+    if cache is not None:
+        cache.put_bytes("audio", key, audio)
+    return audio, f"{result.title}.{extension}"
+
+
+class Transcriber:
+    """Transcribes long audio as chunks cut in silences, sent to the backend concurrently.
+
+    Each chunk takes a transcribe slot of the pipeline, so the limit applies across all videos;
+    failed chunks are retried with exponential backoff and the segments are put back in order.
+    """
+
+    def __init__(
+        self, backend: TranscriptionBackend, chunk_seconds: float = DEFAULT_CHUNK_SECONDS,
+        retries: int = DEFAULT_TRANSCRIBE_RETRIES,
+    ):
+        self.backend = backend
+        self.chunk_seconds = chunk_seconds
+        self.retries = retries
+
+    @property
+    def name(self) -> str:
+        # chunking changes the transcript, so it is part of the cache key
+        return f"{self.backend.name}-{self.chunk_seconds:g}s"
+
+    async def transcribe(self, audio: bytes, filename: str, result: VideoResult, pipeline: Pipeline) -> List[Segment]:
+        async with pipeline.stage("extract", result):
+            chunks = await split_audio(audio, filename, self.chunk_seconds, self.backend.max_bytes)
+        tasks = [asyncio.ensure_future(self._transcribe_chunk(chunk, result, pipeline)) for chunk in chunks]
+        try:
+            transcribed = await asyncio.gather(*tasks)
+        except BaseException:
+            # one chunk failed for good, the transcript is lost anyway
+            for task in tasks:
+                task.cancel()
+            raise
+        return [
+            Segment(chunk.start + segment.start, chunk.start + segment.end, segment.text)
+            for chunk, segments in zip(chunks, transcribed) for segment in segments
+        ]
+
+    async def _transcribe_chunk(self, chunk: AudioChunk, result: VideoResult, pipeline: Pipeline) -> List[Segment]:
+        for attempt in range(self.retries + 1):
+            try:
+                async with pipeline.stage("transcribe", result):
+                    return await self.backend.transcribe(chunk.audio, chunk.filename)
+            except Exception as e:
+                if attempt == self.retries:
+                    raise Exception(f"Failed to transcribe {chunk.filename}: {e}")
+                delay = RETRY_BACKOFF_SECONDS * 2 ** attempt * random.uniform(0.5, 1.5)
+                print(f"failed to transcribe {chunk.filename} ({e}), retrying in {delay:.1f}s", file=sys.stderr)
+                await asyncio.sleep(delay)
+
+
+async def transcribe_audio(
+    audio: bytes, filename: str, result: VideoResult, pipeline: Pipeline, transcriber: Transcriber,
+    cache: Optional[MediaCache], debug: bool = False,
+) -> str:
+    key = f"{hashlib.sha256(audio).hexdigest()}-{transcriber.name}"
+    if cache is not None:
+        text = cache.read_text("transcript", key)
+        if text is not None:
+            result.cached.append("transcribe")
+            return text
 
     if debug:
-        print("step 3 - extract audio from video")
-    await extract_audio_from_video(
-        str(Path(output_dir) / f"{title}.mp4"),
-        str(Path(output_dir) / f"{title}.mp3"),
+        print(f"[{result.title}] step 4 - convert audio to text")
+    text = render_transcript(await transcriber.transcribe(audio, filename, result, pipeline))
+    if cache is not None:
+        cache.put_text("transcript", key, text)
+    return text
+
+
+async def process_video(
+    url: str, output_dir: str, pipeline: Pipeline, transcriber: Transcriber, cache: Optional[MediaCache] = None,
+    audio_format: str = DEFAULT_AUDIO_FORMAT, debug: bool = False,
+) -> VideoResult:
+    result = VideoResult(url)
+    video_id = parse_video_id(url)
+    async with pipeline.video():
+        try:
+            if audio_format == "mp3":
+                video_path = await fetch_video(url, video_id, output_dir, result, pipeline, cache, debug)
+                try:
+                    audio_path = Path(
+                        await extract_audio(video_path, video_id, output_dir, result, pipeline, cache, debug)
+                    )
+                finally:
+                    if cache is not None:
+                        cache.unpin(video_path)
+                try:
+                    audio, filename = audio_path.read_bytes(), audio_path.name
+                finally:
+                    if cache is not None:
+                        cache.unpin(audio_path)
+            else:
+                audio, filename = await stream_audio(
+                    url, video_id, output_dir, result, pipeline, cache, audio_format, debug
+                )
+            result.text = await transcribe_audio(audio, filename, result, pipeline, transcriber, cache, debug)
+            (Path(output_dir) / f"{result.title}.txt").write_text(result.text, encoding="utf-8")
+        except Exception as e:
+            result.error = str(e)
+            print(f"failed to process {result.title or url}: {e}", file=sys.stderr)
+    return result
+
+
+async def process_videos(
+    urls: Iterable[str], output_dir: str, limits: Optional[StageLimits] = None,
+    cache: Optional[MediaCache] = None, audio_format: str = DEFAULT_AUDIO_FORMAT,
+    transcriber: Optional[Transcriber] = None, debug: bool = False,
+) -> List[VideoResult]:
+    """Processes every url, returning the results in the same order; failures do not stop the batch."""
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    pipeline = Pipeline(limits or StageLimits())
+    transcriber = transcriber or Transcriber(WhisperApiBackend())
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(process_video(url, output_dir, pipeline, transcriber, cache, audio_format, debug) for url in urls)
     )
+    elapsed = time.perf_counter() - start
+
+    failed = sum(1 for result in results if result.error)
+    busy = ", ".join(f"{stage} {pipeline.busy[stage]:.1f}s" for stage in STAGES)
+    print(f"processed {len(results)} videos in {elapsed:.1f}s ({failed} failed); time spent per stage: {busy}")
+    if commands.stats:
+        print(f"commands: {commands.summary()}")
+    if cache is not None:
+        reused = ", ".join(
+            f"{stage} {sum(stage in result.cached for result in results)}" for stage in STAGES
+        )
+        print(f"reused from cache: {reused}; cache size {cache.size / 1024 ** 3:.2f} GB")
+    return results
+
+
+async def convert_video_audio_to_text(
+    url: str, output_dir: str, cache: Optional[MediaCache] = None, audio_format: str = DEFAULT_AUDIO_FORMAT,
+    transcriber: Optional[Transcriber] = None, debug: bool = False,
+) -> None:
+    result = (await process_videos(
+        [url], output_dir, cache=cache, audio_format=audio_format, transcriber=transcriber, debug=debug
+    ))[0]
+    if result.error:
+        raise Exception(result.error)
+    print(result.text)
 
-    if debug:
-        print("step 4 - convert audio to text")
-    text = await convert_audio_to_text(str(Path(output_dir) / f"{title}.mp3"))
-    print(text)
+
+def read_urls(urls: Iterable[str], url_file: Optional[str] = None) -> List[str]:
+    """Collects urls from the command line and a file (one per line, # starts a comment), without duplicates."""
+    collected = list(urls)
+    if url_file:
+        with open(url_file, encoding="utf-8") as f:
+            collected.extend(line.split("#", 1)[0].strip() for line in f)
+    return list(dict.fromkeys(url for url in collected if url))
+
+
+def parse_args() -> argparse.Namespace:
+    defaults = StageLimits()
+    parser = argparse.ArgumentParser(description="Download bilibili videos and transcribe their audio")
+    parser.add_argument("urls", nargs="*", help="video urls")
+    parser.add_argument("-f", "--url-file", help="file with one video url per line")
+    parser.add_argument("-o", "--output-dir", default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument("--download-jobs", type=int, default=defaults.download,
+                        help=f"videos downloaded at the same time (default: {defaults.download})")
+    parser.add_argument("--extract-jobs", type=int, default=defaults.extract,
+                        help=f"ffmpeg processes at the same time (default: {defaults.extract})")
+    parser.add_argument("--transcribe-jobs", type=int,
+                        help=f"chunks transcribed at the same time (default: {defaults.transcribe}, "
+                             f"for the local backend enough to keep every worker busy)")
+    parser.add_argument("--cache-dir", default=str(DEFAULT_CACHE_DIR),
+                        help=f"where downloads, audio and transcripts are cached (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--cache-size", type=float, default=DEFAULT_CACHE_SIZE_GB,
+                        help=f"cache size limit in GB, least recently used files are evicted first "
+                             f"(default: {DEFAULT_CACHE_SIZE_GB})")
+    parser.add_argument("--no-cache", action="store_true", help="download and process everything into output dir")
+    parser.add_argument("--audio-format", choices=[*AUDIO_FORMATS, "mp3"], default=DEFAULT_AUDIO_FORMAT,
+                        help="audio sent to transcription: opus/pcm are piped from ffmpeg as 16 kHz mono "
+                             "while downloading, mp3 extracts a file from the downloaded video "
+                             f"(default: {DEFAULT_AUDIO_FORMAT})")
+    parser.add_argument("--backend", choices=list(BACKENDS), default="whisper",
+                        help="whisper: OpenAI's transcription API, local: a transformers model on the CPU, "
+                             "stub: fake transcripts without network access (default: whisper)")
+    parser.add_argument("--local-model", default=LOCAL_ASR_MODEL,
+                        help=f"speech recognition model of the local backend (default: {LOCAL_ASR_MODEL})")
+    parser.add_argument("--local-workers", type=int,
+                        help="processes running the local model, each loads it once (default: a quarter of the CPUs)")
+    parser.add_argument("--batch-size", type=int, default=LOCAL_BATCH_SIZE,
+                        help=f"chunks the local model transcribes in one call (default: {LOCAL_BATCH_SIZE})")
+    parser.add_argument("--chunk-seconds", type=float, default=DEFAULT_CHUNK_SECONDS,
+                        help="longer audio is cut in silences and the chunks are transcribed concurrently "
+                             f"(default: {DEFAULT_CHUNK_SECONDS})")
+    parser.add_argument("--retries", type=int, default=DEFAULT_TRANSCRIBE_RETRIES,
+                        help=f"times a failed chunk is retried, with exponential backoff "
+                             f"(default: {DEFAULT_TRANSCRIBE_RETRIES})")
+    parser.add_argument("--max-processes", type=int, default=DEFAULT_MAX_PROCESSES,
+                        help=f"you-get and ffmpeg processes at the same time (default: {DEFAULT_MAX_PROCESSES})")
+    parser.add_argument("--command-timeout", type=float, default=DEFAULT_COMMAND_TIMEOUT,
+                        help=f"seconds after which a you-get or ffmpeg process is killed "
+                             f"(default: {DEFAULT_COMMAND_TIMEOUT})")
+    parser.add_argument("--debug", action="store_true", help="also print the output of every command")
+    args = parser.parse_args()
+    counts = [args.download_jobs, args.extract_jobs, args.transcribe_jobs, args.local_workers, args.batch_size,
+              args.max_processes]
+    if min(count for count in counts if count is not None) < 1:
+        parser.error("job, worker and batch counts must be at least 1")
+    if args.cache_size <= 0:
+        parser.error("--cache-size must be positive")
+    if args.chunk_seconds < 10:
+        parser.error("--chunk-seconds must be at least 10")
+    if args.retries < 0:
+        parser.error("--retries cannot be negative")
+    if args.command_timeout <= 0:
+        parser.error("--command-timeout must be positive")
+    return args
 
 
 async def main():
-    # url = "https://www.bilibili.com/video/BV1Mh4y127bX/?spm_id_from=444.41.list.card_archive.click&vd_source=e64200d4ea932bdbc9eb93c54976d3cf"
-    url = "https://www.bilibili.com/video/BV1n14y1m7F2/?spm_id_from=333.337.search-card.all.click&vd_source=e64200d4ea932bdbc9eb93c54976d3cf"
-    output_dir = "/Users/luominzhi/Scratch/audio/"
+    # e.g. https://www.bilibili.com/video/BV1n14y1m7F2/
+    args = parse_args()
+    urls = read_urls(args.urls, args.url_file)
+    if not urls:
+        print("no urls given", file=sys.stderr)
+        return 1
 
-    await asyncio.gather(
-        convert_video_audio_to_text(url, output_dir),
-        # extract_audio_from_video(video_path, audio_path),
-    )
+    commands.max_processes = args.max_processes
+    commands.timeout = args.command_timeout
+    commands.echo = args.debug
+    try:
+        if args.backend == "local":
+            backend = LocalAsrBackend(args.local_model, args.local_workers, args.batch_size)
+        else:
+            backend = BACKENDS[args.backend]()
+    except ImportError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    transcribe_jobs = args.transcribe_jobs or backend.jobs or StageLimits().transcribe
+    limits = StageLimits(args.download_jobs, args.extract_jobs, transcribe_jobs)
+    cache = None if args.no_cache else MediaCache(args.cache_dir, int(args.cache_size * 1024 ** 3))
+    transcriber = Transcriber(backend, args.chunk_seconds, args.retries)
+    try:
+        results = await process_videos(urls, args.output_dir, limits, cache, args.audio_format, transcriber, args.debug)
+    finally:
+        backend.close()
+    if len(results) == 1 and not results[0].error:
+        print(results[0].text)
+    return 1 if any(result.error for result in results) else 0
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+归档目录
+整理时把每个放入目标文件夹的文件追加到一个只追加的二进制目录中，记录为定长结构
+（日期、设备编号、大小、类型、校验和、路径偏移），路径单独存放在另一个文件中。
+查询时把目录内存映射后用 NumPy 按日期/设备过滤，百万级文件也只需毫秒级，不需要遍历文件夹；
+没有安装 NumPy 时退回到逐条解析（结果相同，速度较慢）
+"""
+
+import os
+import re
+import mmap
+import struct
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 目录文件，存放在目标文件夹根目录
+CATALOG_FILENAME = '.media_organizer_catalog.bin'
+PATHS_FILENAME = '.media_organizer_catalog.paths'
+DEVICES_FILENAME = '.media_organizer_catalog.devices'
+
+# 文件头: 魔数、记录长度
+CATALOG_MAGIC = b'MOCATLG1'
+HEADER = struct.Struct('<8sI4x')
+
+# 记录: 日期 (YYYYMMDD)、设备编号、大小、路径偏移、路径长度、类型、校验和（未校验时全为 0）
+RECORD = struct.Struct('<iIQQIB3x20s')
+
+# 文件类型
+KIND_OTHER = 0
+KIND_VIDEO = 1
+KIND_IMAGE = 2
+KIND_NAMES = {KIND_OTHER: 'other', KIND_VIDEO: 'video', KIND_IMAGE: 'image'}
+
+# 累计多少条记录后写入一次目录
+FLUSH_BATCH_SIZE = 1000
+
+# 日期文件夹名称: "YYYYMMDD - 设备名称"
+_FOLDER_PATTERN = re.compile(r'^(\d{8}) - (.+)$')
+
+if np is not None:
+    RECORD_DTYPE = np.dtype({
+        'names': ['date', 'device', 'size', 'path_offset', 'path_length', 'kind', 'checksum'],
+        'formats': ['<i4', '<u4', '<u8', '<u8', '<u4', 'u1', 'V20'],
+        'offsets': [0, 4, 8, 16, 24, 28, 32],
+        'itemsize': RECORD.size,
+    })
+
+
+def date_key(value):
+    """把 date/datetime 转换为目录中使用的整数日期 YYYYMMDD"""
+    return value.year * 10000 + value.month * 100 + value.day
+
+
+def parse_folder_name(name):
+    """解析日期文件夹名称，返回 (日期整数, 设备名称)；不是日期文件夹时返回 None"""
+    match = _FOLDER_PATTERN.match(name)
+    if match is None:
+        return None
+    return int(match.group(1)), match.group(2)
+
+
+def _format_date(value):
+    text = str(value)
+    return f"{text[:4]}-{text[4:6]}-{text[6:]}"
+
+
+def _read_devices(root):
+    path = Path(root) / DEVICES_FILENAME
+    if not path.exists():
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.rstrip('\n') for line in f]
+
+
+class ArchiveCatalog:
+    """向目标文件夹的归档目录追加记录，可以在多个线程中同时调用
+
+    记录先缓存在内存中，按批写入：先追加路径，再追加引用这些路径的定长记录，
+    中断时最多留下没有被引用的路径，不会出现指向不存在路径的记录。
+    写入记录和分配设备编号时对目录文件加锁，多个进程同时导入到同一目标文件夹也不会交错或重复编号
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self._lock = threading.Lock()
+        self._pending = []
+        self.added = 0
+        self._device_ids = {name: i for i, name in enumerate(_read_devices(self.root))}
+        self._devices_file = open(self.root / DEVICES_FILENAME, 'a', encoding='utf-8')
+        self._paths_file = open(self.root / PATHS_FILENAME, 'ab')
+        self._records_file = open(self.root / CATALOG_FILENAME, 'ab')
+        if self._records_file.tell() == 0:
+            self._records_file.write(HEADER.pack(CATALOG_MAGIC, RECORD.size))
+            self._records_file.flush()
+
+    @contextmanager
+    def _file_lock(self):
+        """跨进程的排他锁（加在目录文件上），没有 fcntl 时只有线程锁"""
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._records_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._records_file.fileno(), fcntl.LOCK_UN)
+
+    def _device_id(self, device_name):
+        device_id = self._device_ids.get(device_name)
+        if device_id is not None:
+            return device_id
+        # 其他进程可能在打开目录之后登记了新设备：加锁后重新读取设备列表再分配编号
+        with self._file_lock():
+            self._device_ids = {name: i for i, name in enumerate(_read_devices(self.root))}
+            device_id = self._device_ids.get(device_name)
+            if device_id is None:
+                device_id = self._device_ids[device_name] = len(self._device_ids)
+                self._devices_file.write(device_name + '\n')
+                self._devices_file.flush()
+        return device_id
+
+    def add(self, path, size, device_name, date=None, kind=KIND_OTHER, checksum=None):
+        """登记一个已放入归档的文件；date 为整数日期，默认从所在的日期文件夹名称中解析"""
+        path = Path(path)
+        if date is None:
+            parsed = parse_folder_name(path.parent.name)
+            date = parsed[0] if parsed else 0
+        relative = os.path.relpath(path, self.root).encode('utf-8', 'surrogateescape')
+        digest = bytes.fromhex(checksum) if checksum else b''
+        with self._lock:
+            self._pending.append((date, self._device_id(device_name), size, relative, kind, digest))
+            self.added += 1
+            if len(self._pending) >= FLUSH_BATCH_SIZE:
+                self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        with self._file_lock():
+            offset = os.fstat(self._paths_file.fileno()).st_size
+            paths = bytearray()
+            records = bytearray()
+            for date, device_id, size, relative, kind, digest in self._pending:
+                records += RECORD.pack(date, device_id, size, offset + len(paths), len(relative), kind, digest)
+                paths += relative
+            self._paths_file.write(paths)
+            self._paths_file.flush()
+            self._records_file.write(records)
+            self._records_file.flush()
+        self._pending = []
+
+    def close(self):
+        """写入剩余记录并关闭目录"""
+        with self._lock:
+            if self._records_file is None:
+                return
+            self._flush()
+            for f in (self._records_file, self._paths_file, self._devices_file):
+                f.close()
+            self._records_file = None
+
+
+def rebuild_catalog(root, kind_of, checksums_of=None):
+    """遍历已有的归档文件夹重新生成目录（目录不存在、过时或文件被手动删除/移动后使用）
+
+    kind_of(path) 返回文件类型 (KIND_*)，返回 None 的文件不登记；
+    checksums_of(folder) 返回 {文件名: 校验和}，用于填入校验和（可选）。返回登记的文件数
+    """
+    root = Path(root)
+    for name in (CATALOG_FILENAME, PATHS_FILENAME, DEVICES_FILENAME):
+        try:
+            (root / name).unlink()
+        except FileNotFoundError:
+            pass
+    catalog = ArchiveCatalog(root)
+    try:
+        with os.scandir(root) as folders:
+            for folder in sorted(folders, key=lambda entry: entry.name):
+                parsed = parse_folder_name(folder.name)
+                if parsed is None or not folder.is_dir():
+                    continue
+                date, device_name = parsed
+                checksums = {}
+                if checksums_of is not None:
+                    try:
+                        checksums = checksums_of(folder.path)
+                    except OSError:
+                        pass
+                with os.scandir(folder.path) as entries:
+                    for entry in entries:
+                        if entry.name.startswith('.') or not entry.is_file():
+                            continue
+                        kind = kind_of(Path(entry.path))
+                        if kind is None:
+                            continue
+                        catalog.add(entry.path, entry.stat().st_size, device_name, date, kind,
+                                    checksums.get(entry.name))
+    finally:
+        catalog.close()
+    logging.info(f"归档目录已重新生成: {root}（{catalog.added} 个文件）")
+    return catalog.added
+
+
+class CatalogReader:
+    """只读打开归档目录，把记录文件和路径文件内存映射后查询
+
+    安装了 NumPy 时 records 是直接映射到文件的结构化数组，过滤是向量化的比较；
+    没有 NumPy 时按需逐条解析
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.devices = _read_devices(self.root)
+        self._records_map = None
+        self._paths_map = None
+        self.count = 0
+        self.records = None
+        records_path = self.root / CATALOG_FILENAME
+        if not records_path.exists():
+            return
+        with open(records_path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < HEADER.size:
+                return
+            magic, record_size = HEADER.unpack(f.read(HEADER.size))
+            if magic != CATALOG_MAGIC or record_size != RECORD.size:
+                raise ValueError(f"不支持的归档目录格式: {records_path}")
+            # 忽略中断时可能留下的不完整的最后一条记录
+            self.count = (size - HEADER.size) // RECORD.size
+            if self.count:
+                self._records_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.count:
+            with open(self.root / PATHS_FILENAME, 'rb') as f:
+                if os.fstat(f.fileno()).st_size:
+                    self._paths_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if np is not None:
+                self.records = np.frombuffer(
+                    self._records_map, dtype=RECORD_DTYPE, count=self.count, offset=HEADER.size
+                )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _iter_records(self):
+        view = memoryview(self._records_map)[HEADER.size:HEADER.size + self.count * RECORD.size]
+        try:
+            yield from enumerate(RECORD.iter_unpack(view))
+        finally:
+            view.release()
+
+    def _path(self, offset, length):
+        relative = self._paths_map[offset:offset + length].decode('utf-8', 'surrogateescape')
+        return str(self.root / relative)
+
+    def _device_filter(self, device_name):
+        if device_name is None:
+            return None
+        try:
+            return self.devices.index(device_name)
+        except ValueError:
+            return -1
+
+    def _matching_rows(self, device_name=None, start_date=None, end_date=None, kind=None):
+        """返回满足条件的记录下标"""
+        device_id = self._device_filter(device_name)
+        start = date_key(start_date) if start_date else None
+        end = date_key(end_date) if end_date else None
+        if not self.count or device_id == -1:
+            return []
+        if self.records is not None:
+            mask = np.ones(self.count, dtype=bool)
+            if device_id is not None:
+                mask &= self.records['device'] == device_id
+            if start is not None:
+                mask &= self.records['date'] >= start
+            if end is not None:
+                mask &= self.records['date'] <= end
+            if kind is not None:
+                mask &= self.records['kind'] == kind
+            return np.flatnonzero(mask)
+        return [
+            i for i, (date, device, _, _, _, record_kind, _) in self._iter_records()
+            if (device_id is None or device == device_id)
+            and (start is None or date >= start)
+            and (end is None or date <= end)
+            and (kind is None or record_kind == kind)
+        ]
+
+    def _record(self, i):
+        return RECORD.unpack_from(self._records_map, HEADER.size + int(i) * RECORD.size)
+
+    def query(self, device_name=None, start_date=None, end_date=None, kind=None, limit=None):
+        """按设备名称、日期范围（date 对象，包含两端）和类型查询，返回字典列表"""
+        rows = self._matching_rows(device_name, start_date, end_date, kind)
+        results = []
+        for i in rows[:limit] if limit is not None else rows:
+            date, device, size, offset, length, record_kind, digest = self._record(i)
+            results.append({
+                'path': self._path(offset, length),
+                'date': _format_date(date),
+                'device_name': self.devices[device] if device < len(self.devices) else '',
+                'size': size,
+                'kind': KIND_NAMES.get(record_kind, 'other'),
+                'checksum': digest.hex() if any(digest) else None,
+            })
+        return results
+
+    def count_matching(self, device_name=None, start_date=None, end_date=None, kind=None):
+        """返回满足条件的 (文件数, 总字节数)"""
+        rows = self._matching_rows(device_name, start_date, end_date, kind)
+        if self.records is not None and len(rows):
+            return len(rows), int(self.records['size'][rows].sum())
+        return len(rows), sum(self._record(i)[2] for i in rows)
+
+    def stats(self):
+        """按设备统计文件数、总大小和日期范围，返回 {'files', 'bytes', 'devices': [...]}"""
+        per_device = {}
+        if self.records is not None:
+            devices = self.records['device']
+            sizes = self.records['size']
+            dates = self.records['date']
+            for device_id in np.unique(devices):
+                selected = devices == device_id
+                device_dates = dates[selected]
+                per_device[int(device_id)] = [
+                    int(selected.sum()), int(sizes[selected].sum()),
+                    int(device_dates.min()), int(device_dates.max()),
+                ]
+        elif self.count:
+            for _, (date, device_id, size, _, _, _, _) in self._iter_records():
+                entry = per_device.setdefault(device_id, [0, 0, date, date])
+                entry[0] += 1
+                entry[1] += size
+                entry[2] = min(entry[2], date)
+                entry[3] = max(entry[3], date)
+        devices = [
+            {
+                'device_name': self.devices[device_id] if device_id < len(self.devices) else '',
+                'files': files,
+                'bytes': total,
+                'first_date': _format_date(first),
+                'last_date': _format_date(last),
+            }
+            for device_id, (files, total, first, last) in sorted(per_device.items())
+        ]
+        return {
+            'files': self.count,
+            'bytes': sum(device['bytes'] for device in devices),
+            'devices': devices,
+        }
+
+    def close(self):
+        # 先释放 NumPy 视图，否则映射无法关闭
+        self.records = None
+        for mapped in (self._records_map, self._paths_map):
+            if mapped is not None:
+                mapped.close()
+        self._records_map = None
+        self._paths_map = None
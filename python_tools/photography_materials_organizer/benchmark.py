@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+媒体文件整理工具 - 性能基准测试
+生成指定形状的合成源文件夹（文件数量、目录结构、文件大小分布、已导入比例均可配置），
+用不同模式运行 organize_videos，输出耗时、文件/秒、MB/s、读写系统调用次数和峰值内存，
+结果为 JSON，可追加到 JSONL 文件中长期跟踪性能变化。
+
+每个模式在独立的子进程中运行，峰值内存和系统调用计数互不影响；
+目标文件夹在每次运行前从预先导入的基线复制（媒体文件用硬链接），保证各模式的起点相同。
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import logging
+import sqlite3
+import hashlib
+import argparse
+import platform
+import subprocess
+import tempfile
+from pathlib import Path
+from datetime import datetime, timedelta
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from video_organizer import organize_videos, INDEX_FILENAME
+
+# 目录结构
+SHAPES = ('flat', 'deep', 'dcim')
+
+# 文件大小分布: [(比例, 最小字节数, 最大字节数, 扩展名列表)]
+SIZE_PROFILES = {
+    'tiny': [
+        (0.6, 1024, 16 * 1024, ['.jpg', '.heic', '.dng']),
+        (0.4, 4 * 1024, 64 * 1024, ['.mp4', '.mov']),
+    ],
+    'mixed': [
+        (0.7, 16 * 1024, 256 * 1024, ['.jpg', '.heic', '.dng']),
+        (0.25, 256 * 1024, 4 * 1024 * 1024, ['.mp4', '.mov']),
+        (0.05, 4 * 1024 * 1024, 32 * 1024 * 1024, ['.mp4', '.mov']),
+    ],
+    'large': [
+        (0.5, 1024 * 1024, 8 * 1024 * 1024, ['.jpg', '.dng']),
+        (0.5, 16 * 1024 * 1024, 128 * 1024 * 1024, ['.mp4', '.mov']),
+    ],
+}
+
+# 可运行的模式: 名称 -> organize_videos 的参数（jobs 为 None 时使用 --jobs）
+MODES = {
+    'sequential': {'jobs': 1},
+    'parallel': {'jobs': None},
+    'index': {'jobs': None, 'use_index': True},
+    'dedup': {'jobs': None, 'dedup': 'hardlink'},
+    'hardlink': {'jobs': None, 'link_mode': 'hardlink'},
+    'filesystem-date': {'jobs': None, 'date_source': 'filesystem'},
+    'plan': {'jobs': None, 'plan': True},
+}
+
+DEFAULT_MODES = ['sequential', 'parallel', 'index', 'plan']
+
+DEVICE_NAME = 'Bench'
+
+# 生成文件内容使用的随机数据块
+_FILL_BLOCK_SIZE = 1024 * 1024
+
+# 已生成的源文件夹中的标记文件，参数相同时复用
+_COMPLETE_MARKER = '.benchmark_complete.json'
+
+
+def _tree_key(params):
+    text = json.dumps(params, sort_keys=True)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:10]
+
+
+def _relative_dir(i, shape, depth, files_per_dir):
+    """第 i 个文件所在的相对目录"""
+    if shape == 'flat':
+        return ''
+    bucket = i // files_per_dir
+    if shape == 'dcim':
+        # 相机存储卡: DCIM/100MEDIA、DCIM/101MEDIA ...
+        return os.path.join('DCIM', f"{100 + bucket % 900}MEDIA")
+    parts = []
+    for _ in range(depth):
+        parts.append(f"d{bucket % 10}")
+        bucket //= 10
+    return os.path.join(*parts)
+
+
+def _pick_size(rng, profile):
+    roll = rng.random()
+    for share, low, high, extensions in profile:
+        if roll < share:
+            return rng.randint(low, high), rng.choice(extensions)
+        roll -= share
+    share, low, high, extensions = profile[-1]
+    return rng.randint(low, high), rng.choice(extensions)
+
+
+def _write_file(path, index, size, fill):
+    """写入 size 字节：文件头包含序号，保证每个文件内容不同"""
+    header = f"benchmark file {index}\n".encode()
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.write(fd, header[:size])
+        remaining = size - min(len(header), size)
+        while remaining > 0:
+            remaining -= os.write(fd, fill[:min(remaining, len(fill))])
+    finally:
+        os.close(fd)
+
+
+def generate_tree(root, files, shape='dcim', depth=3, files_per_dir=500, size_profile='tiny', seed=0,
+                  days=30, imported_fraction=0.0):
+    """生成合成源文件夹，返回 (测试数据目录, 已导入部分的文件列表, 总字节数)
+
+    源文件夹为 测试数据目录/source；文件的修改时间分布在最近 days 天内；
+    前 imported_fraction 比例的文件会在基线目标文件夹中预先导入
+    """
+    params = {
+        'files': files, 'shape': shape, 'depth': depth, 'files_per_dir': files_per_dir,
+        'size_profile': size_profile, 'seed': seed, 'days': days, 'imported_fraction': imported_fraction,
+    }
+    tree_dir = Path(root) / f"tree-{_tree_key(params)}"
+    source = tree_dir / 'source'
+    marker = tree_dir / _COMPLETE_MARKER
+    if marker.exists():
+        info = json.loads(marker.read_text(encoding='utf-8'))
+        print(f"♻️  复用已生成的源文件夹: {source}（{info['files']} 个文件）", file=sys.stderr)
+        return tree_dir, info['imported'], info['bytes']
+
+    if tree_dir.exists():
+        shutil.rmtree(tree_dir)
+    source.mkdir(parents=True)
+    rng = random.Random(seed)
+    fill = rng.randbytes(_FILL_BLOCK_SIZE) if hasattr(rng, 'randbytes') else os.urandom(_FILL_BLOCK_SIZE)
+    profile = SIZE_PROFILES[size_profile]
+    now = datetime.now()
+    imported_count = int(files * imported_fraction)
+    imported = []
+    total_bytes = 0
+    created_dirs = set()
+    start = time.monotonic()
+
+    for i in range(files):
+        folder = source / _relative_dir(i, shape, depth, files_per_dir)
+        if folder not in created_dirs:
+            folder.mkdir(parents=True, exist_ok=True)
+            created_dirs.add(folder)
+        size, ext = _pick_size(rng, profile)
+        path = folder / f"IMG_{i:07d}{ext}"
+        _write_file(path, i, size, fill)
+        timestamp = (now - timedelta(days=rng.random() * days)).timestamp()
+        os.utime(path, (timestamp, timestamp))
+        total_bytes += size
+        if i < imported_count:
+            imported.append(str(path.relative_to(source)))
+        if (i + 1) % 10000 == 0:
+            print(f"   已生成 {i + 1}/{files} 个文件", file=sys.stderr)
+
+    marker.write_text(json.dumps({
+        'files': files, 'bytes': total_bytes, 'imported': imported, 'params': params,
+    }), encoding='utf-8')
+    print(
+        f"✅ 已生成源文件夹: {source}（{files} 个文件，{total_bytes / 1024 / 1024:.1f} MB，"
+        f"耗时 {time.monotonic() - start:.1f} 秒）",
+        file=sys.stderr,
+    )
+    return tree_dir, imported, total_bytes
+
+
+def prepare_baseline(tree_dir, imported):
+    """把已导入部分的文件整理到基线目标文件夹（同时建立扫描索引和内容哈希索引）"""
+    baseline = tree_dir / 'baseline'
+    if (baseline / _COMPLETE_MARKER).exists():
+        return baseline
+    if baseline.exists():
+        shutil.rmtree(baseline)
+    baseline.mkdir()
+    if imported:
+        # 用硬链接构造只包含已导入文件的源文件夹，导入后源路径与完整源文件夹一致
+        staging = tree_dir / 'staging'
+        if staging.exists():
+            shutil.rmtree(staging)
+        for relative in imported:
+            target = staging / relative
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.link(tree_dir / 'source' / relative, target)
+        _run_quietly(staging, baseline, use_index=True, dedup='hardlink', jobs=os.cpu_count() or 4)
+        _rewrite_index_sources(baseline, staging, tree_dir / 'source')
+        shutil.rmtree(staging)
+    (baseline / _COMPLETE_MARKER).write_text('{}', encoding='utf-8')
+    return baseline
+
+
+def _rewrite_index_sources(baseline, staging, source):
+    """把基线扫描索引中的源路径从临时文件夹改为完整源文件夹，使增量模式能命中"""
+    conn = sqlite3.connect(str(baseline / INDEX_FILENAME))
+    try:
+        conn.execute(
+            'UPDATE organized_files SET source_path = ? || substr(source_path, ?)',
+            (os.path.abspath(source), len(os.path.abspath(staging)) + 1),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _run_quietly(source, target, **kwargs):
+    logging.getLogger().setLevel(logging.WARNING)
+    return organize_videos(str(source), str(target), DEVICE_NAME, 'all', **kwargs)
+
+
+def _clone_baseline(baseline, target):
+    """复制基线目标文件夹：媒体文件用硬链接，索引等隐藏文件真正复制（运行时会被修改）"""
+    def copy_function(src, dst):
+        if os.path.basename(src).startswith('.'):
+            return shutil.copy2(src, dst)
+        return os.link(src, dst)
+
+    if target.exists():
+        shutil.rmtree(target)
+    shutil.copytree(baseline, target, copy_function=copy_function)
+    marker = target / _COMPLETE_MARKER
+    if marker.exists():
+        marker.unlink()
+
+
+def _read_proc_io():
+    """读取 /proc/self/io（Linux），包含 read/write 系统调用次数和字节数"""
+    try:
+        with open('/proc/self/io', 'r') as f:
+            return {key: int(value) for key, value in (line.split(':') for line in f)}
+    except OSError:
+        return {}
+
+
+def _run_mode_in_process(config):
+    """在子进程中运行一种模式，返回结果字典"""
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    kwargs = dict(config['kwargs'])
+    workdir = Path(config['workdir'])
+    metrics_path = workdir / 'metrics.json'
+    if kwargs.pop('plan', False):
+        kwargs['plan_path'] = str(workdir / 'plan.jsonl')
+    io_before = _read_proc_io()
+    start = time.perf_counter()
+    success = organize_videos(
+        config['source'], config['target'], DEVICE_NAME, 'all', metrics_path=str(metrics_path), **kwargs
+    )
+    wall = time.perf_counter() - start
+    io_after = _read_proc_io()
+
+    result = {'success': bool(success), 'wall_seconds': round(wall, 3)}
+    if metrics_path.exists():
+        metrics = json.loads(metrics_path.read_text(encoding='utf-8'))
+        result.update({
+            'files': metrics['files_done'],
+            'bytes_processed': metrics['bytes_done'],
+            'bytes_copied': metrics['bytes_copied'],
+            'files_per_second': round(metrics['files_done'] / wall, 1) if wall else None,
+            'mb_per_second': round(metrics['bytes_copied'] / wall / 1024 / 1024, 2) if wall else None,
+            'results': metrics['results'],
+            'phases': metrics['phases'],
+            'queue_peak': metrics['queue']['peak'],
+            'bottleneck': metrics['bottleneck'],
+            'folders': metrics.get('folders'),
+        })
+    if io_before and io_after:
+        result['syscalls'] = {
+            'read': io_after['syscr'] - io_before['syscr'],
+            'write': io_after['syscw'] - io_before['syscw'],
+        }
+        result['io_bytes'] = {
+            'read_chars': io_after['rchar'] - io_before['rchar'],
+            'write_chars': io_after['wchar'] - io_before['wchar'],
+            'read_storage': io_after.get('read_bytes', 0) - io_before.get('read_bytes', 0),
+            'write_storage': io_after.get('write_bytes', 0) - io_before.get('write_bytes', 0),
+        }
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        # Linux 上 ru_maxrss 的单位是 KB，macOS 上是字节
+        peak_rss = usage.ru_maxrss if sys.platform != 'darwin' else usage.ru_maxrss // 1024
+        result.update({
+            'peak_rss_kb': peak_rss,
+            'user_cpu_seconds': round(usage.ru_utime, 3),
+            'system_cpu_seconds': round(usage.ru_stime, 3),
+            'voluntary_context_switches': usage.ru_nvcsw,
+            'involuntary_context_switches': usage.ru_nivcsw,
+        })
+    return result
+
+
+def run_mode(mode, tree_dir, baseline, jobs, scan_workers=1, drop_caches=False):
+    """在独立子进程中运行一种模式"""
+    kwargs = {key: value for key, value in MODES[mode].items()}
+    if kwargs.get('jobs') is None:
+        kwargs['jobs'] = jobs
+    if scan_workers > 1:
+        kwargs['scan_workers'] = scan_workers
+    workdir = Path(tempfile.mkdtemp(prefix=f"bench-{mode}-", dir=tree_dir))
+    target = workdir / 'target'
+    try:
+        _clone_baseline(baseline, target)
+        if drop_caches:
+            _drop_caches()
+        config = {
+            'source': str(tree_dir / 'source'),
+            'target': str(target),
+            'workdir': str(workdir),
+            'kwargs': kwargs,
+        }
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--run-mode', json.dumps(config)],
+            stdout=subprocess.PIPE, text=True, check=False,
+        )
+        if completed.returncode != 0:
+            return {'mode': mode, 'success': False, 'error': f"子进程退出码 {completed.returncode}"}
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        result = dict(mode=mode, **result)
+        result['options'] = kwargs
+        return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _drop_caches():
+    """清空页缓存（需要 root 权限，失败时忽略），用于测量冷缓存性能"""
+    try:
+        os.sync()
+        with open('/proc/sys/vm/drop_caches', 'w') as f:
+            f.write('3\n')
+    except OSError as e:
+        print(f"⚠️  无法清空页缓存: {e}", file=sys.stderr)
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_table(results):
+    print(f"{'模式':<16}{'耗时(秒)':>10}{'文件/秒':>12}{'MB/s':>10}{'读调用':>10}{'写调用':>10}{'峰值内存(MB)':>14}",
+          file=sys.stderr)
+    for result in results:
+        syscalls = result.get('syscalls', {})
+        print(
+            f"{result['mode']:<16}{result.get('wall_seconds', 0):>10.2f}{result.get('files_per_second') or 0:>12.1f}"
+            f"{result.get('mb_per_second') or 0:>10.1f}{syscalls.get('read', 0):>10}{syscalls.get('write', 0):>10}"
+            f"{result.get('peak_rss_kb', 0) / 1024:>14.1f}",
+            file=sys.stderr,
+        )
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(
+        description='媒体文件整理工具 - 性能基准测试',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+  python benchmark.py --files 10000
+  python benchmark.py --files 100000 --shape deep --size-profile mixed --imported-fraction 0.9 --modes index parallel
+  python benchmark.py --files 1000000 --workdir /data/bench --keep --output results.jsonl
+        """
+    )
+    parser.add_argument('--files', type=int, default=10000, help='生成的文件数量（默认: 10000）')
+    parser.add_argument('--shape', choices=SHAPES, default='dcim',
+                        help='目录结构: flat (全部在一个目录), deep (多层嵌套), dcim (存储卡 DCIM/100MEDIA 结构，默认)')
+    parser.add_argument('--depth', type=int, default=4, help='deep 结构的目录层数（默认: 4）')
+    parser.add_argument('--files-per-dir', type=int, default=500, help='deep/dcim 结构每个目录的文件数（默认: 500）')
+    parser.add_argument('--size-profile', choices=sorted(SIZE_PROFILES), default='tiny',
+                        help='文件大小分布: tiny (几 KB，默认), mixed (照片和视频混合), large (MB 到百 MB 级)')
+    parser.add_argument('--imported-fraction', type=float, default=0.0,
+                        help='已导入到目标文件夹的文件比例 0~1，用于测试增量导入（默认: 0）')
+    parser.add_argument('--modes', nargs='+', choices=sorted(MODES), default=DEFAULT_MODES,
+                        help=f"要运行的模式（默认: {' '.join(DEFAULT_MODES)}）")
+    parser.add_argument('-j', '--jobs', type=int, default=8, help='并发模式使用的线程数（默认: 8）')
+    parser.add_argument('--scan-workers', type=int, default=1, help='并行扫描的线程数（默认: 1）')
+    parser.add_argument('--repeat', type=int, default=1, help='每种模式重复运行的次数（默认: 1）')
+    parser.add_argument('--seed', type=int, default=0, help='随机数种子（默认: 0）')
+    parser.add_argument('--workdir', help='生成测试数据的目录（默认: 系统临时目录，结束后删除）')
+    parser.add_argument('--keep', action='store_true', help='保留生成的测试数据，下次使用相同参数时直接复用')
+    parser.add_argument('--drop-caches', action='store_true', help='每次运行前清空页缓存（需要 root 权限）')
+    parser.add_argument('--output', help='把结果作为一行 JSON 追加到该文件（JSONL），不指定时输出到标准输出')
+    parser.add_argument('--run-mode', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_mode:
+        print(json.dumps(_run_mode_in_process(json.loads(args.run_mode))))
+        return 0
+
+    if args.files < 1 or args.jobs < 1 or args.repeat < 1:
+        parser.error("--files、--jobs 和 --repeat 必须大于等于 1")
+    if not 0 <= args.imported_fraction <= 1:
+        parser.error("--imported-fraction 必须在 0 到 1 之间")
+
+    workdir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix='media-organizer-bench-'))
+    workdir.mkdir(parents=True, exist_ok=True)
+    tree_dir = None
+    try:
+        tree_dir, imported, total_bytes = generate_tree(
+            workdir, args.files, args.shape, args.depth, args.files_per_dir, args.size_profile,
+            args.seed, imported_fraction=args.imported_fraction,
+        )
+        baseline = prepare_baseline(tree_dir, imported)
+
+        results = []
+        for mode in args.modes:
+            for run in range(args.repeat):
+                print(f"▶️  运行模式 {mode}（第 {run + 1}/{args.repeat} 次）...", file=sys.stderr)
+                result = run_mode(mode, tree_dir, baseline, args.jobs, args.scan_workers, args.drop_caches)
+                result['run'] = run + 1
+                results.append(result)
+        _print_table(results)
+
+        report = {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'tree': {
+                'files': args.files,
+                'bytes': total_bytes,
+                'shape': args.shape,
+                'depth': args.depth,
+                'files_per_dir': args.files_per_dir,
+                'size_profile': args.size_profile,
+                'imported_fraction': args.imported_fraction,
+                'seed': args.seed,
+            },
+            'results': results,
+        }
+        line = json.dumps(report, ensure_ascii=False)
+        if args.output:
+            with open(args.output, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+            print(f"✅ 结果已追加到: {args.output}", file=sys.stderr)
+        else:
+            print(line)
+    finally:
+        if not args.keep:
+            # 只删除本次生成的数据，不删除用户指定的 workdir 本身
+            shutil.rmtree(tree_dir if args.workdir else workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日期范围预过滤
+指定了起止日期时，在扫描阶段用廉价的线索提前排除明显不在范围内的目录和文件，
+只对剩下的候选文件读取拍摄日期并做精确判断（见 video_organizer.resolve_target_folder）:
+
+- 目录名中的日期: 2024、2024-06、2024-06-15、20240615 - 设备名、DCIM 中按日期命名的 100_0615（月日）
+- 文件名中的日期: VID_20240615_123456.mp4、IMG_20240615_...、PXL_20240615...、2024-06-15 12.00.00.jpg
+- 文件系统时间: 拍摄后文件才会被写入，修改时间不会早于内嵌的拍摄时间；macOS 上没有内嵌时间时使用创建时间，
+  而保留修改时间的复制会让创建时间晚于修改时间，所以修改时间和创建时间都早于起始日期的文件才能确定不在范围内
+
+线索与拍摄日期之间可能相差时区，判断时两端各放宽 PREFILTER_SLACK_DAYS 天
+"""
+
+import re
+import threading
+from datetime import date, datetime, timedelta
+
+# 预过滤时日期范围两端放宽的天数
+PREFILTER_SLACK_DAYS = 1
+
+# 目录名: 年 / 年-月 / 年-月-日（后面可以跟其他文字，如 "20240615 - iPhone"）
+_YEAR_DIR = re.compile(r'^((?:19|20)\d{2})$')
+_MONTH_DIR = re.compile(r'^((?:19|20)\d{2})[-_.](0[1-9]|1[0-2])$')
+_DAY_DIR = re.compile(r'^((?:19|20)\d{2})([-_.]?)(0[1-9]|1[0-2])\2(0[1-9]|[12]\d|3[01])(?!\d)')
+# DCIM 中按日期命名的文件夹（如佳能的 100_0615），只有月日没有年份
+_DCIM_DAY_DIR = re.compile(r'^\d{3}_(0[1-9]|1[0-2])(0[1-9]|[12]\d|3[01])$')
+
+# 文件名中的日期（可以紧跟 6 位时间，如 20240615123456.jpg）
+_NAME_DATE = re.compile(
+    r'(?<!\d)((?:19|20)\d{2})([-_]?)(0[1-9]|1[0-2])\2(0[1-9]|[12]\d|3[01])(?=\D|$|\d{6}(?!\d))'
+)
+
+
+def _make_date(year, month, day):
+    try:
+        return date(int(year), int(month), int(day))
+    except ValueError:
+        return None
+
+
+def _month_end(year, month):
+    if month == 12:
+        return date(year, 12, 31)
+    return date(year, month + 1, 1) - timedelta(days=1)
+
+
+def date_from_filename(name):
+    """从文件名中提取日期，没有时返回 None"""
+    match = _NAME_DATE.search(name)
+    if match is None:
+        return None
+    return _make_date(match.group(1), match.group(3), match.group(4))
+
+
+def date_range_from_dirname(name):
+    """从目录名推断其中文件的日期范围，返回 (最早, 最晚)；无法推断时返回 None
+
+    只有月日的 DCIM 目录返回 ('monthday', 月, 日)，由调用方结合日期范围的年份判断
+    """
+    match = _DAY_DIR.match(name)
+    if match:
+        day = _make_date(match.group(1), match.group(3), match.group(4))
+        return (day, day) if day else None
+    match = _MONTH_DIR.match(name)
+    if match:
+        year, month = int(match.group(1)), int(match.group(2))
+        return date(year, month, 1), _month_end(year, month)
+    match = _YEAR_DIR.match(name)
+    if match:
+        year = int(match.group(1))
+        return date(year, 1, 1), date(year, 12, 31)
+    match = _DCIM_DAY_DIR.match(name)
+    if match:
+        return ('monthday', int(match.group(1)), int(match.group(2)))
+    return None
+
+
+class DateRangePrefilter:
+    """扫描阶段的日期预过滤，传给 media_scanner.scan_files 的 prefilter 参数
+
+    skip_directory / skip_name / skip_stat 返回 True 表示可以确定不在日期范围内；
+    use_names 为 False 时不使用目录名和文件名中的日期（日期来源为文件系统时间时名称与日期无关，只按文件系统时间排除）。
+    counts 累计被排除的目录和文件数，可以在多个扫描线程中同时使用
+    """
+
+    def __init__(self, start_date=None, end_date=None, use_names=True, slack_days=PREFILTER_SLACK_DAYS):
+        slack = timedelta(days=slack_days)
+        self.start = start_date - slack if start_date else None
+        self.end = end_date + slack if end_date else None
+        self.use_names = use_names
+        # 修改时间和创建时间都早于该时间戳的文件一定早于起始日期
+        self._min_mtime = datetime.combine(self.start, datetime.min.time()).timestamp() if self.start else None
+        self._lock = threading.Lock()
+        self.counts = {'directories': 0, 'by_name': 0, 'by_mtime': 0}
+
+    @property
+    def active(self):
+        return self.start is not None or self.end is not None
+
+    def _outside(self, first, last):
+        return (self.start is not None and last < self.start) or (self.end is not None and first > self.end)
+
+    def _count(self, key):
+        with self._lock:
+            self.counts[key] += 1
+        return True
+
+    def skip_directory(self, name):
+        """目录名中的日期完全不在范围内时返回 True"""
+        if not self.use_names:
+            return False
+        found = date_range_from_dirname(name)
+        if found is None:
+            return False
+        if found[0] == 'monthday':
+            # 没有年份：只有起止日期都指定时，检查范围内每一年的这一天
+            if self.start is None or self.end is None:
+                return False
+            _, month, day = found
+            for year in range(self.start.year, self.end.year + 1):
+                candidate = _make_date(year, month, day)
+                if candidate is not None and self.start <= candidate <= self.end:
+                    return False
+            return self._count('directories')
+        if self._outside(*found):
+            return self._count('directories')
+        return False
+
+    def skip_name(self, name):
+        """文件名中的日期不在范围内时返回 True（在 stat 之前调用）"""
+        if not self.use_names:
+            return False
+        found = date_from_filename(name)
+        if found is not None and self._outside(found, found):
+            return self._count('by_name')
+        return False
+
+    def skip_stat(self, stat_info):
+        """修改时间和创建时间（有时）都早于起始日期时返回 True"""
+        if self._min_mtime is None:
+            return False
+        latest = max(stat_info.st_mtime, getattr(stat_info, 'st_birthtime', stat_info.st_mtime))
+        if latest < self._min_mtime:
+            return self._count('by_mtime')
+        return False
+
+    def summary(self):
+        """返回排除情况的说明文字，没有排除任何内容时返回 None"""
+        counts = self.counts
+        if not any(counts.values()):
+            return None
+        return (
+            f"日期预过滤: 跳过目录 {counts['directories']} 个，按文件名排除 {counts['by_name']} 个文件，"
+            f"按修改时间排除 {counts['by_mtime']} 个文件"
+        )
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+内容去重
+先用 "文件大小 + 头尾数据块" 计算快速的部分哈希，只有部分哈希相同时才计算完整哈希，
+哈希 -> 目标文件的对应关系保存在目标文件夹的索引数据库中
+"""
+
+import os
+import sqlite3
+import hashlib
+import threading
+import logging
+from contextlib import contextmanager
+
+from scan_index import INDEX_FILENAME, open_read_only
+
+# 部分哈希读取的头部/尾部数据块大小
+PARTIAL_BLOCK_SIZE = 64 * 1024
+
+# 计算完整哈希时每次读取的大小
+FULL_HASH_CHUNK_SIZE = 1024 * 1024
+
+# 累计多少条记录后写入一次数据库
+FLUSH_BATCH_SIZE = 1000
+
+
+def _new_hash():
+    return hashlib.blake2b(digest_size=20)
+
+
+def partial_hash(file_path, size=None):
+    """计算部分哈希：文件大小 + 头部数据块 + 尾部数据块
+
+    文件不大于两个数据块时会读取全部内容，此时部分哈希即为完整哈希
+    """
+    if size is None:
+        size = os.path.getsize(file_path)
+    digest = _new_hash()
+    digest.update(str(size).encode())
+    with open(file_path, 'rb') as f:
+        if size <= PARTIAL_BLOCK_SIZE * 2:
+            digest.update(f.read())
+        else:
+            digest.update(f.read(PARTIAL_BLOCK_SIZE))
+            f.seek(-PARTIAL_BLOCK_SIZE, os.SEEK_END)
+            digest.update(f.read(PARTIAL_BLOCK_SIZE))
+    return digest.hexdigest()
+
+
+def full_hash(file_path):
+    """计算完整文件内容的哈希"""
+    digest = _new_hash()
+    buffer = bytearray(FULL_HASH_CHUNK_SIZE)
+    view = memoryview(buffer)
+    with open(file_path, 'rb', buffering=0) as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            digest.update(view[:n])
+    return digest.hexdigest()
+
+
+def _is_small(size):
+    return size <= PARTIAL_BLOCK_SIZE * 2
+
+
+class DedupMatch:
+    """一次去重查询的结果
+
+    duplicate 为已存在的相同内容文件路径（没有则为 None）；
+    不是重复文件时，复制完成后调用 register() 登记新文件
+    """
+
+    def __init__(self, index, size, partial, full):
+        self._index = index
+        self.size = size
+        self.partial = partial
+        self.full = full
+        self.duplicate = None
+
+    def register(self, destination, content_path=None):
+        """登记新文件；content_path 为当前可以读取到该内容的路径（目标文件尚未生成时传入源文件）"""
+        self._index._add(self.size, self.partial, self.full, str(destination), content_path)
+
+
+class ContentIndex:
+    """内容哈希 -> 目标文件 的索引
+
+    打开时把全部记录读入内存。相同 (大小, 部分哈希) 的文件在查询和登记期间持有同一把锁，
+    并发导入两份相同的文件时只会复制一次；不同内容的文件之间哈希计算完全并行。
+    read_only 为 True 时以只读方式打开（用于生成整理计划），新记录只保存在内存中。
+    """
+
+    def __init__(self, db_path, read_only=False):
+        self.db_path = db_path
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._pending = []
+        # (size, partial_hash) -> [[destination, full_hash, content_path], ...]
+        self._entries = {}
+        if read_only:
+            self._conn = open_read_only(db_path)
+            self._load()
+            return
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            '''
+            CREATE TABLE IF NOT EXISTS content_hashes (
+                destination TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                partial_hash TEXT NOT NULL,
+                full_hash TEXT
+            )
+            '''
+        )
+        self._conn.commit()
+        self._load()
+
+    def _load(self):
+        count = 0
+        try:
+            rows = self._conn.execute('SELECT destination, size, partial_hash, full_hash FROM content_hashes')
+            for destination, size, partial, full in rows:
+                self._entries.setdefault((size, partial), []).append([destination, full, destination])
+                count += 1
+        except sqlite3.OperationalError:
+            # 只读打开的旧数据库中可能还没有这张表
+            pass
+        logging.info(f"已加载内容哈希索引: {self.db_path}（{count} 条记录）")
+
+    @classmethod
+    def for_target(cls, to_path, read_only=False):
+        """打开目标文件夹中的内容哈希索引"""
+        return cls(to_path / INDEX_FILENAME, read_only)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _key_lock(self, key):
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+    @contextmanager
+    def lookup(self, file_path, size):
+        """查询文件是否与已整理的文件内容相同
+
+        用法:
+            with index.lookup(path, size) as match:
+                if match.duplicate: ...
+                else: 复制后 match.register(destination)
+        """
+        partial = partial_hash(file_path, size)
+        key = (size, partial)
+        with self._key_lock(key):
+            match = DedupMatch(self, size, partial, partial if _is_small(size) else None)
+            with self._lock:
+                candidates = [list(entry) for entry in self._entries.get(key, ())]
+            for destination, candidate_full, content_path in candidates:
+                if candidate_full is None:
+                    try:
+                        candidate_full = full_hash(content_path)
+                    except OSError:
+                        # 目标文件已被删除或移动，忽略该记录
+                        self._remove(key, destination)
+                        continue
+                    self._update_full(key, destination, candidate_full)
+                if match.full is None:
+                    match.full = full_hash(file_path)
+                if candidate_full == match.full:
+                    match.duplicate = destination
+                    break
+            yield match
+
+    def _add(self, size, partial, full, destination, content_path=None):
+        key = (size, partial)
+        with self._lock:
+            self._entries.setdefault(key, []).append([destination, full, content_path or destination])
+            self._queue_row(destination, size, partial, full)
+
+    def _update_full(self, key, destination, full):
+        with self._lock:
+            for entry in self._entries.get(key, ()):
+                if entry[0] == destination:
+                    entry[1] = full
+            self._queue_row(destination, key[0], key[1], full)
+
+    def _remove(self, key, destination):
+        with self._lock:
+            entries = self._entries.get(key, [])
+            entries[:] = [entry for entry in entries if entry[0] != destination]
+            if self.read_only:
+                return
+            self._flush()
+            self._conn.execute('DELETE FROM content_hashes WHERE destination = ?', (destination,))
+            self._conn.commit()
+
+    def _queue_row(self, destination, size, partial, full):
+        if self.read_only:
+            return
+        self._pending.append((destination, size, partial, full))
+        if len(self._pending) >= FLUSH_BATCH_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        self._conn.executemany(
+            'INSERT OR REPLACE INTO content_hashes (destination, size, partial_hash, full_hash) '
+            'VALUES (?, ?, ?, ?)',
+            self._pending,
+        )
+        self._conn.commit()
+        self._pending = []
+
+    def close(self):
+        """写入剩余记录并关闭数据库"""
+        with self._lock:
+            if self._conn is None:
+                return
+            self._flush()
+            self._conn.close()
+            self._conn = None
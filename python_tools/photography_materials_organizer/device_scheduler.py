@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多设备导入调度
+每个源设备（存储卡、读卡器）有自己的有界队列，由该设备唯一的读取线程填充；
+共享的写入线程池从各设备队列中取任务。同一设备同时进行的任务数有上限，
+慢速存储卡不会被快速存储卡挤占，快速存储卡也能用满剩余的写入线程，目标磁盘始终保持忙碌。
+"""
+
+import time
+import threading
+from collections import deque
+
+# 每个设备队列的长度上限
+DEVICE_QUEUE_SIZE = 32
+
+
+class _DeviceState:
+    def __init__(self, key, limit, queue_size):
+        self.key = key
+        self.limit = limit
+        self.queue_size = queue_size
+        self.items = deque()
+        self.active = 0
+        self.active_bytes = 0
+        self.finished = False
+        self.last_served = 0.0
+        self.bytes_done = 0
+        self.files_done = 0
+        self.busy_seconds = 0.0
+        self.busy_since = None
+
+
+class DeviceScheduler:
+    """按源设备公平调度的任务队列
+
+    put() 由各设备的读取线程调用，设备队列已满时阻塞；get() 由写入线程调用，
+    从 "还有排队任务且进行中的任务数未达到 per_device_jobs" 的设备中选择正在传输字节数最少、
+    最久没有被服务的设备，保证每个设备都能持续得到写入带宽。
+    所有设备都调用了 finish_device() 且队列清空后 get() 返回 None。
+    """
+
+    def __init__(self, per_device_jobs=1, queue_size=DEVICE_QUEUE_SIZE):
+        self.per_device_jobs = max(1, int(per_device_jobs))
+        self.queue_size = queue_size
+        self._devices = {}
+        self._condition = threading.Condition()
+        self._closed = False
+
+    def add_device(self, key):
+        """登记一个源设备"""
+        with self._condition:
+            if key not in self._devices:
+                self._devices[key] = _DeviceState(key, self.per_device_jobs, self.queue_size)
+
+    def put(self, key, item, size):
+        """放入一个任务，设备队列已满时阻塞；调度器已关闭时返回 False"""
+        with self._condition:
+            device = self._devices[key]
+            while len(device.items) >= device.queue_size and not self._closed:
+                self._condition.wait()
+            if self._closed:
+                return False
+            device.items.append((item, size))
+            self._condition.notify_all()
+            return True
+
+    def finish_device(self, key):
+        """设备的读取线程已结束，不会再放入任务"""
+        with self._condition:
+            self._devices[key].finished = True
+            self._condition.notify_all()
+
+    def close(self):
+        """中断调度：丢弃排队的任务，唤醒所有等待中的线程"""
+        with self._condition:
+            self._closed = True
+            for device in self._devices.values():
+                device.items.clear()
+            self._condition.notify_all()
+
+    def _pick(self):
+        candidates = [
+            device for device in self._devices.values()
+            if device.items and device.active < device.limit
+        ]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda device: (device.active_bytes, device.last_served))
+
+    def _all_done(self):
+        return all(device.finished and not device.items for device in self._devices.values())
+
+    def get(self):
+        """取出下一个任务，返回 (设备, 任务, 大小)；全部完成或已关闭时返回 None"""
+        with self._condition:
+            while True:
+                if self._closed:
+                    return None
+                device = self._pick()
+                if device is not None:
+                    item, size = device.items.popleft()
+                    now = time.monotonic()
+                    if device.active == 0:
+                        device.busy_since = now
+                    device.active += 1
+                    device.active_bytes += size
+                    device.last_served = now
+                    # 设备队列有空位了，唤醒等待的读取线程
+                    self._condition.notify_all()
+                    return device.key, item, size
+                if self._all_done():
+                    return None
+                self._condition.wait()
+
+    def task_done(self, key, size):
+        """一个任务处理完成"""
+        with self._condition:
+            device = self._devices[key]
+            device.active -= 1
+            device.active_bytes -= size
+            device.bytes_done += size
+            device.files_done += 1
+            if device.active == 0 and device.busy_since is not None:
+                device.busy_seconds += time.monotonic() - device.busy_since
+                device.busy_since = None
+            self._condition.notify_all()
+
+    def queued(self):
+        """所有设备队列中排队的任务总数"""
+        with self._condition:
+            return sum(len(device.items) for device in self._devices.values())
+
+    def stats(self):
+        """各设备的统计：已处理文件数、字节数、繁忙时间和繁忙期间的吞吐量 (MB/s)"""
+        with self._condition:
+            result = {}
+            for key, device in self._devices.items():
+                busy = device.busy_seconds
+                if device.busy_since is not None:
+                    busy += time.monotonic() - device.busy_since
+                result[key] = {
+                    'files': device.files_done,
+                    'bytes': device.bytes_done,
+                    'busy_seconds': round(busy, 3),
+                    'mb_per_second': round(device.bytes_done / busy / (1024 * 1024), 2) if busy else 0.0,
+                }
+            return result
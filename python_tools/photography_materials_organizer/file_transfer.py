@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件传输
+提供 copy / hardlink / reflink / move 四种方式把文件放到目标位置，尽量让内核完成数据搬运：
+同一文件系统上使用硬链接、FICLONE (Btrfs/XFS reflink) 或重命名，只涉及元数据操作；
+需要真正复制数据时依次尝试 copy_file_range、sendfile，最后才使用大缓冲区的用户态复制。
+复制和克隆先写入同一文件夹中的临时文件，完成后再原子地发布为目标文件名，
+中断时不会留下写了一半的目标文件
+"""
+
+import os
+import glob
+import errno
+import itertools
+import queue
+import shutil
+import logging
+import threading
+
+from integrity import new_checksum, file_checksum, ChecksumMismatch
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# 支持的传输方式
+LINK_MODES = ('copy', 'hardlink', 'reflink', 'move')
+
+# linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+# copy_file_range / sendfile 每次调用请求的字节数
+KERNEL_COPY_CHUNK_SIZE = 64 * 1024 * 1024
+
+# 用户态复制的缓冲区大小
+BUFFER_COPY_SIZE = 8 * 1024 * 1024
+
+# 临时文件后缀，临时文件名为 ".<目标文件名>.<进程号>-<线程号>.partial"
+TEMP_SUFFIX = '.partial'
+
+# 这些错误表示当前文件系统或内核不支持该操作，可以换一种方式重试
+_UNSUPPORTED_ERRNOS = {
+    errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTTY,
+    errno.EPERM, errno.EBADF, getattr(errno, 'ENOTSUP', errno.EOPNOTSUPP)
+}
+
+
+def _is_unsupported(error):
+    return error.errno in _UNSUPPORTED_ERRNOS
+
+
+def _rewind(src_fd, dst_fd):
+    os.lseek(src_fd, 0, os.SEEK_SET)
+    os.lseek(dst_fd, 0, os.SEEK_SET)
+    os.ftruncate(dst_fd, 0)
+
+
+def _copy_with_copy_file_range(src_fd, dst_fd):
+    while os.copy_file_range(src_fd, dst_fd, KERNEL_COPY_CHUNK_SIZE):
+        pass
+
+
+def _copy_with_sendfile(src_fd, dst_fd):
+    offset = 0
+    while True:
+        sent = os.sendfile(dst_fd, src_fd, offset, KERNEL_COPY_CHUNK_SIZE)
+        if not sent:
+            break
+        offset += sent
+
+
+def _copy_with_buffer(src_fd, dst_fd):
+    buffer = bytearray(BUFFER_COPY_SIZE)
+    view = memoryview(buffer)
+    with open(src_fd, 'rb', buffering=0, closefd=False) as src:
+        while True:
+            n = src.readinto(buffer)
+            if not n:
+                break
+            written = 0
+            while written < n:
+                written += os.write(dst_fd, view[written:n])
+
+
+def _hash_worker(chunks, digest):
+    while True:
+        chunk = chunks.get()
+        if chunk is None:
+            return
+        digest.update(chunk)
+
+
+def copy_and_hash(src_fd, dst_fd):
+    """用户态复制数据并同时计算校验和，源文件只读取一次，返回校验和
+
+    从第二块开始由单独的线程计算哈希：主线程写入第 N 块、读取第 N+1 块的同时
+    哈希线程处理第 N 块（hashlib 和文件读写都会释放 GIL）。三个缓冲区轮流使用，
+    队列长度为 1，保证正在被读取覆盖的缓冲区已经计算完哈希
+    """
+    digest = new_checksum()
+    buffers = [bytearray(BUFFER_COPY_SIZE) for _ in range(3)]
+    chunks = queue.Queue(maxsize=1)
+    hasher = None
+    with open(src_fd, 'rb', buffering=0, closefd=False) as src:
+        try:
+            for i in itertools.count():
+                buffer = buffers[i % 3]
+                n = src.readinto(buffer)
+                if not n:
+                    break
+                view = memoryview(buffer)[:n]
+                written = 0
+                while written < n:
+                    written += os.write(dst_fd, view[written:])
+                if i == 0:
+                    # 第一块直接计算，只有一块的小文件不需要启动哈希线程
+                    digest.update(view)
+                    continue
+                if hasher is None:
+                    hasher = threading.Thread(target=_hash_worker, args=(chunks, digest), daemon=True)
+                    hasher.start()
+                chunks.put(view)
+        finally:
+            if hasher is not None:
+                chunks.put(None)
+                hasher.join()
+    return digest.hexdigest()
+
+
+def copy_file_data(src_fd, dst_fd):
+    """在两个文件描述符之间复制数据，返回实际使用的方式"""
+    if hasattr(os, 'copy_file_range'):
+        try:
+            _copy_with_copy_file_range(src_fd, dst_fd)
+            return 'copy_file_range'
+        except OSError as e:
+            if not _is_unsupported(e):
+                raise
+            _rewind(src_fd, dst_fd)
+    if hasattr(os, 'sendfile'):
+        try:
+            _copy_with_sendfile(src_fd, dst_fd)
+            return 'sendfile'
+        except OSError as e:
+            if not _is_unsupported(e) and e.errno != errno.ENOTSOCK:
+                raise
+            _rewind(src_fd, dst_fd)
+    _copy_with_buffer(src_fd, dst_fd)
+    return 'buffer'
+
+
+def temp_path_for(destination):
+    """返回 destination 对应的临时文件路径（同一文件夹、隐藏文件、每个线程唯一）"""
+    folder, name = os.path.split(os.fspath(destination))
+    return os.path.join(folder, f".{name}.{os.getpid()}-{threading.get_ident()}{TEMP_SUFFIX}")
+
+
+def remove_partial_files(destination):
+    """删除 destination 残留的临时文件（上次运行中断时留下的），返回删除的数量"""
+    folder, name = os.path.split(os.fspath(destination))
+    pattern = os.path.join(glob.escape(folder), f".{glob.escape(name)}.*{TEMP_SUFFIX}")
+    removed = 0
+    for path in glob.glob(pattern):
+        try:
+            os.unlink(path)
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def _publish(temp_path, destination):
+    """把写完的临时文件原子地发布为 destination，不覆盖已存在的文件"""
+    try:
+        # 硬链接的创建是原子的，且目标已存在时会失败
+        os.link(temp_path, destination)
+    except FileExistsError:
+        os.unlink(temp_path)
+        raise
+    except OSError as e:
+        if not _is_unsupported(e):
+            os.unlink(temp_path)
+            raise
+        # 不支持硬链接的文件系统（如 exFAT、部分 SMB）退回到检查后重命名
+        if os.path.exists(destination):
+            os.unlink(temp_path)
+            raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), str(destination))
+        os.rename(temp_path, destination)
+        return
+    os.unlink(temp_path)
+
+
+def _clone_or_copy(source, destination, try_reflink, durable=False, verify=False):
+    """把 source 的内容写入临时文件后发布为 destination，目标已存在时抛出 FileExistsError
+
+    durable 为 True 时在发布前 fsync，保证断电后目标文件内容完整；
+    verify 为 True 时复制的同时计算源文件的校验和，写回磁盘后重新读取临时文件比对，
+    不一致时删除临时文件并抛出 ChecksumMismatch。返回 (方式, 校验和)，不校验时校验和为 None
+    """
+    if os.path.exists(destination):
+        raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), str(destination))
+    temp_path = temp_path_for(destination)
+    checksum = None
+    src_fd = os.open(source, os.O_RDONLY)
+    try:
+        dst_fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            method = None
+            if verify:
+                # 需要读取数据计算校验和，不使用 reflink 和内核复制
+                checksum = copy_and_hash(src_fd, dst_fd)
+                method = 'buffer'
+            elif try_reflink and fcntl is not None:
+                try:
+                    fcntl.ioctl(dst_fd, FICLONE, src_fd)
+                    method = 'reflink'
+                except OSError as e:
+                    if not _is_unsupported(e):
+                        raise
+                    logging.debug(f"不支持 reflink，改为复制: {source} ({e})")
+            if method is None:
+                method = copy_file_data(src_fd, dst_fd)
+            if durable or verify:
+                os.fsync(dst_fd)
+        except BaseException:
+            os.close(dst_fd)
+            os.unlink(temp_path)
+            raise
+        os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+    try:
+        if verify:
+            written = file_checksum(temp_path, drop_cache=True)
+            if written != checksum:
+                raise ChecksumMismatch(destination, checksum, written)
+        shutil.copystat(source, temp_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    _publish(temp_path, destination)
+    return method, checksum
+
+
+def _hardlink(source, destination):
+    """创建硬链接，不支持时返回 False"""
+    try:
+        os.link(source, destination)
+        return True
+    except FileExistsError:
+        raise
+    except OSError as e:
+        if not _is_unsupported(e):
+            raise
+        logging.debug(f"无法创建硬链接，改为复制: {source} ({e})")
+        return False
+
+
+def transfer_file(source, destination, mode='copy', durable=False, verify=False):
+    """按指定方式把 source 放到 destination
+
+    目标文件已存在时抛出 FileExistsError，不会覆盖；当前文件系统不支持所选方式时
+    （如跨文件系统的 hardlink/move、不支持 reflink 的文件系统）自动回退到复制。
+    durable 为 True 时复制的数据在发布前 fsync 到磁盘。
+    verify 为 True 时复制的数据在发布前从磁盘重新读取并比对校验和（不一致时抛出 ChecksumMismatch）；
+    硬链接和同一文件系统上的移动不复制数据，只计算一次目标文件的校验和。
+    返回 (实际使用的方式, 校验和)，方式为 reflink / copy_file_range / sendfile / buffer / hardlink / move，
+    verify 为 False 时校验和为 None
+    """
+    if mode not in LINK_MODES:
+        raise ValueError(f"不支持的传输方式: {mode}")
+
+    if mode == 'hardlink':
+        if _hardlink(source, destination):
+            return 'hardlink', file_checksum(destination) if verify else None
+        return _clone_or_copy(source, destination, try_reflink=False, durable=durable, verify=verify)
+
+    if mode == 'move':
+        # 先建立硬链接再删除源文件，链接的创建是原子的，不会覆盖已存在的目标文件
+        if _hardlink(source, destination):
+            os.unlink(source)
+            return 'move', file_checksum(destination) if verify else None
+        if os.stat(source).st_dev == os.stat(os.path.dirname(destination) or '.').st_dev:
+            # 同一文件系统但不支持硬链接（如 exFAT），直接重命名
+            if os.path.exists(destination):
+                raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), str(destination))
+            os.rename(source, destination)
+            return 'move', file_checksum(destination) if verify else None
+        # 跨文件系统移动：复制数据必须落盘（校验通过）后才能删除源文件
+        result = _clone_or_copy(source, destination, try_reflink=False, durable=True, verify=verify)
+        os.unlink(source)
+        return result
+
+    return _clone_or_copy(source, destination, try_reflink=(mode == 'reflink'), durable=durable, verify=verify)
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+监视源文件夹
+Linux 上用 inotify 监视源文件夹及其全部子目录，相机和 Wi-Fi 传输写入新文件时立即得到通知，
+文件在一段时间内不再被写入（写入已稳定）后按批交给整理流程，不需要反复遍历整个文件夹。
+其他系统上没有 inotify，退回到定期扫描并比较文件的大小和修改时间
+"""
+
+import os
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+
+from media_scanner import scan_files, SYSTEM_DIRECTORIES
+
+# 文件最后一次被写入后等待多少秒才认为写入已完成
+SETTLE_SECONDS = 2.0
+
+# 文件被关闭（IN_CLOSE_WRITE）后的等待时间，写入方重新打开文件继续写入时会重新计时
+CLOSED_SETTLE_SECONDS = 0.5
+
+# 没有 inotify 时两次扫描的间隔（秒）
+POLL_INTERVAL = 5.0
+
+# 没有待处理的文件时每次最多等待多少秒（之后检查是否需要停止）
+IDLE_WAIT_SECONDS = 1.0
+
+# inotify 事件（见 inotify(7)）
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0o2000000)
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_ONLYDIR)
+
+_EVENT = struct.Struct('iIII')
+_READ_SIZE = 64 * 1024
+
+
+class _Inotify:
+    """通过 ctypes 调用 libc 的 inotify 接口，不可用时构造函数抛出 OSError"""
+
+    def __init__(self):
+        if not hasattr(os, 'uname') or os.uname().sysname != 'Linux':
+            raise OSError(errno.ENOSYS, "inotify 只在 Linux 上可用")
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        try:
+            self._add_watch = libc.inotify_add_watch
+            init = libc.inotify_init1
+        except AttributeError:
+            raise OSError(errno.ENOSYS, "libc 不支持 inotify")
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self.fd = init(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, os.strerror(code))
+
+    def add_watch(self, path):
+        """监视目录 path，返回监视描述符"""
+        wd = self._add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, os.strerror(code), path)
+        return wd
+
+    def read_events(self, timeout):
+        """等待最多 timeout 秒，返回 [(监视描述符, 事件掩码, 文件名)]"""
+        readable, _, _ = select.select([self.fd], [], [], max(0.0, timeout))
+        if not readable:
+            return []
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, _READ_SIZE)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                offset += length
+                events.append((wd, mask, name))
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class FolderWatcher:
+    """监视源文件夹中新出现或被修改的媒体文件
+
+    构造时即开始监视（先创建 FolderWatcher 再扫描已有文件，扫描期间出现的文件不会遗漏）；
+    batches() 阻塞等待，每当有文件写入稳定后产出一批 [(路径, stat)]，直到 stop_event 被设置或按下 Ctrl+C
+    """
+
+    def __init__(self, root, extensions, skip_hidden=False, settle_seconds=SETTLE_SECONDS,
+                 poll_interval=POLL_INTERVAL):
+        self.root = os.path.abspath(root)
+        self.extensions = extensions
+        self.skip_hidden = skip_hidden
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        # 路径 -> 最早可以交给整理流程的时间 (time.monotonic)
+        self._pending = {}
+        # 监视描述符 -> 目录路径
+        self._directories = {}
+        # 没有 inotify 时上一次扫描看到的 路径 -> (大小, 修改时间)
+        self._known = None
+        try:
+            self._inotify = _Inotify()
+        except OSError as e:
+            logging.warning(f"无法使用 inotify（{e}），改为每 {poll_interval:g} 秒扫描一次源文件夹")
+            self._inotify = None
+            # 定期扫描时至少要连续两次看到相同的大小和修改时间才能认为写入已完成
+            self.settle_seconds = max(settle_seconds, poll_interval)
+            self._known = {path: (st.st_size, st.st_mtime_ns) for path, st in self._scan(self.root)}
+        else:
+            self._watch_tree(self.root)
+
+    @property
+    def mode(self):
+        return 'inotify' if self._inotify is not None else 'polling'
+
+    def _scan(self, root):
+        return scan_files(root, self.extensions, skip_hidden=self.skip_hidden)
+
+    def _wanted_file(self, name):
+        if self.skip_hidden and name.startswith('.'):
+            return False
+        return os.path.splitext(name)[1].lower() in self.extensions
+
+    def _wanted_directory(self, name):
+        if name in SYSTEM_DIRECTORIES:
+            return False
+        return not (self.skip_hidden and name.startswith('.'))
+
+    def _watch_tree(self, root):
+        """监视 root 及其全部子目录，返回监视的目录数"""
+        count = 0
+        for dirpath, dirnames, _ in os.walk(root):
+            dirnames[:] = [name for name in dirnames if self._wanted_directory(name)]
+            try:
+                self._directories[self._inotify.add_watch(dirpath)] = dirpath
+                count += 1
+            except OSError as e:
+                if e.errno == errno.ENOSPC:
+                    logging.error(
+                        f"inotify 监视数量已达上限，{dirpath} 中的新文件不会被发现"
+                        f"（可调大 /proc/sys/fs/inotify/max_user_watches）"
+                    )
+                elif e.errno != errno.ENOENT:
+                    logging.warning(f"无法监视目录 {dirpath}: {e}")
+        return count
+
+    def defer_if_recent(self, path, stat_info):
+        """扫描到的已有文件在 settle_seconds 内被修改过（可能仍在写入）时放入等待队列并返回 True，
+        写入稳定后由 batches() 产出；否则返回 False
+        """
+        age = time.time() - stat_info.st_mtime
+        if age >= self.settle_seconds:
+            return False
+        self._schedule(os.path.abspath(path), self.settle_seconds - max(0.0, age))
+        return True
+
+    def _schedule(self, path, delay):
+        self._pending[path] = time.monotonic() + delay
+
+    def _handle_events(self, events):
+        for wd, mask, name in events:
+            if mask & IN_Q_OVERFLOW:
+                # 事件队列溢出，有事件丢失：重新扫描一次，已处理的文件由导入日志/索引跳过
+                logging.warning("inotify 事件队列溢出，重新扫描源文件夹")
+                for path, _ in self._scan(self.root):
+                    self._schedule(path, self.settle_seconds)
+                continue
+            if mask & IN_IGNORED:
+                self._directories.pop(wd, None)
+                continue
+            directory = self._directories.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and self._wanted_directory(name):
+                    # 新目录：先开始监视，再把其中已经存在的文件加入等待队列
+                    self._watch_tree(path)
+                    for file_path, _ in self._scan(path):
+                        self._schedule(file_path, self.settle_seconds)
+                continue
+            if not self._wanted_file(name):
+                continue
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                self._pending.pop(path, None)
+            elif mask & IN_MOVED_TO:
+                # 传输工具写完临时文件后重命名进来，文件已经完整
+                self._schedule(path, 0)
+            elif mask & IN_CLOSE_WRITE:
+                self._schedule(path, min(CLOSED_SETTLE_SECONDS, self.settle_seconds))
+            else:
+                self._schedule(path, self.settle_seconds)
+
+    def _poll(self):
+        known = {}
+        for path, st in self._scan(self.root):
+            signature = (st.st_size, st.st_mtime_ns)
+            known[path] = signature
+            if self._known.get(path) != signature:
+                self._schedule(path, self.settle_seconds)
+        for path in self._known.keys() - known.keys():
+            self._pending.pop(path, None)
+        self._known = known
+
+    def _take_ready(self):
+        """取出等待时间已到的文件，返回 [(路径, stat)]"""
+        now = time.monotonic()
+        ready = []
+        for path, deadline in list(self._pending.items()):
+            if deadline > now:
+                continue
+            del self._pending[path]
+            try:
+                ready.append((path, os.stat(path)))
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logging.warning(f"无法读取文件信息 {path}: {e}")
+        ready.sort()
+        return ready
+
+    def _wait(self, timeout):
+        if self._inotify is not None:
+            self._handle_events(self._inotify.read_events(timeout))
+        else:
+            # 每次都是完整扫描，不因等待中的文件而提前
+            time.sleep(self.poll_interval)
+            self._poll()
+
+    def batches(self, stop_event=None):
+        """产出写入已稳定的文件批次，直到 stop_event 被设置或按下 Ctrl+C"""
+        try:
+            while stop_event is None or not stop_event.is_set():
+                timeout = IDLE_WAIT_SECONDS
+                if self._pending:
+                    timeout = min(timeout, max(0.0, min(self._pending.values()) - time.monotonic()))
+                self._wait(timeout)
+                batch = self._take_ready()
+                if batch:
+                    yield batch
+        except KeyboardInterrupt:
+            logging.info("已停止监视源文件夹")
+        finally:
+            self.close()
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
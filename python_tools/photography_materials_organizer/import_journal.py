@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+导入日志（断点续传）
+每次导入在目标文件夹中维护一个只追加的 JSONL 预写日志：开始处理某个文件前写入 "start"，
+处理完成后写入 "done"。导入被中断后重新运行时，已完成的文件直接跳过，
+开始了但没有完成的文件会先清理残留的临时文件再重新处理；导入正常结束后删除日志
+"""
+
+import os
+import json
+import hashlib
+import threading
+import logging
+
+from file_transfer import remove_partial_files
+
+# 日志文件名前缀，完整文件名为 ".media_organizer_journal-<源文件夹和设备名的摘要>.jsonl"
+JOURNAL_PREFIX = '.media_organizer_journal-'
+
+
+def journal_path_for(to_path, from_path, device_name):
+    """返回 (源文件夹, 设备名称) 对应的日志文件路径"""
+    key = f"{os.path.abspath(from_path)}\0{device_name}".encode('utf-8')
+    digest = hashlib.sha1(key).hexdigest()[:12]
+    return to_path / f"{JOURNAL_PREFIX}{digest}.jsonl"
+
+
+class ImportJournal:
+    """一次导入的预写日志
+
+    日志的每一行在写入后立即 flush，进程崩溃或被中断时已写入的记录不会丢失；
+    最后几条记录即使因断电丢失也只会导致对应文件被重新检查（目标文件已存在时跳过），不会出错
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        # 源文件路径 -> (大小, 修改时间)
+        self._done = {}
+        started = {}
+        if path.exists():
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 崩溃时最后一行可能只写了一半
+                        continue
+                    source = record.get('source')
+                    if record.get('op') == 'start':
+                        started[source] = record.get('destination')
+                    elif record.get('op') == 'done':
+                        self._done[source] = (record.get('size'), record.get('mtime_ns'))
+                        started.pop(source, None)
+            logging.info(f"发现未完成的导入日志，继续上次的导入: {path}（已完成 {len(self._done)} 个文件）")
+        self.resumed = bool(self._done or started)
+
+        # 清理上次中断时正在写入的临时文件
+        removed = 0
+        for destination in started.values():
+            if destination:
+                removed += remove_partial_files(destination)
+        if removed:
+            logging.info(f"已清理上次中断留下的临时文件: {removed} 个")
+
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def __len__(self):
+        return len(self._done)
+
+    def _write(self, record):
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line)
+            self._file.flush()
+
+    def is_done(self, source, stat_info):
+        """文件是否已在上次（被中断的）导入中处理完成且之后没有变化"""
+        entry = self._done.get(os.fspath(source))
+        return entry is not None and entry == (stat_info.st_size, stat_info.st_mtime_ns)
+
+    def mark_started(self, source, destination):
+        """记录开始处理一个文件"""
+        self._write({'op': 'start', 'source': os.fspath(source), 'destination': os.fspath(destination)})
+
+    def mark_done(self, source, stat_info, result, destination=None):
+        """记录一个文件处理完成"""
+        record = {
+            'op': 'done',
+            'source': os.fspath(source),
+            'size': stat_info.st_size,
+            'mtime_ns': stat_info.st_mtime_ns,
+            'result': result,
+        }
+        if destination is not None:
+            record['destination'] = os.fspath(destination)
+        self._write(record)
+
+    def close(self, completed=False):
+        """关闭日志；completed 为 True（导入正常结束）时删除日志文件"""
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+        if completed:
+            try:
+                self.path.unlink()
+            except OSError as e:
+                logging.warning(f"删除导入日志失败 {self.path}: {e}")
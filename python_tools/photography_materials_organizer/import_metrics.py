@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+导入进度和性能指标
+统计已发现/已处理的文件数和字节数、复制速度、工作队列深度以及各阶段耗时
+（扫描、stat、读取日期、计算哈希、创建文件夹、复制），定期通过回调报告进度，
+结束时生成 JSON 摘要，用于判断一次缓慢的导入是受限于扫描、CPU 还是磁盘
+"""
+
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+# 进度回调的最小间隔（秒）
+PROGRESS_INTERVAL = 1.0
+
+# 各阶段的显示名称，阶段耗时按所有线程累计
+PHASE_NAMES = {
+    'scan': '扫描',
+    'stat': 'stat',
+    'date': '读取日期',
+    'hash': '计算哈希',
+    'mkdir': '创建文件夹',
+    'copy': '复制',
+}
+
+# 工作线程中执行的阶段，用于和扫描耗时比较找出瓶颈
+_WORKER_PHASES = ('date', 'hash', 'mkdir', 'copy')
+
+
+class ImportMetrics:
+    """一次导入的进度和性能指标，可以在多个线程中同时更新
+
+    callback(snapshot) 在处理文件的线程中调用，两次调用至少间隔 interval 秒；
+    snapshot 为 snapshot() 返回的字典
+    """
+
+    def __init__(self, callback=None, interval=PROGRESS_INTERVAL, jobs=1):
+        self.callback = callback
+        self.interval = interval
+        self.jobs = jobs
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._end = None
+        self._last_emit = self._start
+        self.scan_complete = False
+        self.files_found = 0
+        self.bytes_found = 0
+        self.files_done = 0
+        self.bytes_done = 0
+        self.bytes_copied = 0
+        self.results = {}
+        self.phases = dict.fromkeys(PHASE_NAMES, 0.0)
+        self.queue_depth = 0
+        self.queue_max = 0
+        self.queue_peak = 0
+        self.producer_blocked = 0.0
+        self.worker_idle = 0.0
+
+    def add_time(self, phase, seconds):
+        """累计某个阶段的耗时"""
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name):
+        """统计 with 块的耗时，计入阶段 name"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def track_scan(self, items, get_size):
+        """包装扫描结果的迭代器：统计扫描耗时和发现的文件，扫描结束时标记完成"""
+        iterator = iter(items)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add_time('scan', time.perf_counter() - start)
+                with self._lock:
+                    self.scan_complete = True
+                return
+            size = get_size(item)
+            with self._lock:
+                self.phases['scan'] += time.perf_counter() - start
+                self.files_found += 1
+                self.bytes_found += size
+            yield item
+
+    def file_found(self, size):
+        """登记一个不经过 track_scan 发现的文件（多个扫描线程时使用）"""
+        with self._lock:
+            self.files_found += 1
+            self.bytes_found += size
+
+    def scan_finished(self):
+        """标记扫描已全部完成（多个扫描线程时使用）"""
+        with self._lock:
+            self.scan_complete = True
+
+    def queue_sampled(self, depth, maxsize, blocked=0.0):
+        """记录生产者放入条目后的队列深度，blocked 为本次因队列已满等待的秒数"""
+        with self._lock:
+            self.queue_depth = depth
+            self.queue_max = maxsize
+            self.queue_peak = max(self.queue_peak, depth)
+            self.producer_blocked += blocked
+
+    def worker_waited(self, seconds):
+        """记录工作线程等待队列中新条目的时间"""
+        with self._lock:
+            self.worker_idle += seconds
+
+    def file_done(self, result, size):
+        """登记一个处理完成的文件，必要时调用进度回调"""
+        now = time.monotonic()
+        with self._lock:
+            self.files_done += 1
+            self.bytes_done += size
+            self.results[result] = self.results.get(result, 0) + 1
+            if result == 'copied':
+                self.bytes_copied += size
+            emit = self.callback is not None and now - self._last_emit >= self.interval
+            if emit:
+                self._last_emit = now
+        if emit:
+            self.callback(self.snapshot())
+
+    def finish(self):
+        """结束计时，调用最后一次进度回调并返回最终的指标"""
+        with self._lock:
+            self._end = time.monotonic()
+            self.scan_complete = True
+        snapshot = self.snapshot()
+        if self.callback is not None:
+            self.callback(snapshot)
+        return snapshot
+
+    def bottleneck(self):
+        """根据各阶段耗时判断瓶颈阶段，没有足够数据时返回 None
+
+        扫描在生产者线程中进行，其余阶段由 jobs 个工作线程分担，
+        因此用扫描耗时与工作线程的平均繁忙时间比较
+        """
+        with self._lock:
+            phases = dict(self.phases)
+        worker_busy = {name: phases.get(name, 0.0) / self.jobs for name in _WORKER_PHASES}
+        slowest = max(worker_busy, key=worker_busy.get)
+        scan = phases.get('scan', 0.0)
+        if scan <= 0 and worker_busy[slowest] <= 0:
+            return None
+        if scan >= sum(worker_busy.values()):
+            return 'scan'
+        return slowest
+
+    def snapshot(self):
+        """返回当前指标的字典（可直接序列化为 JSON）"""
+        with self._lock:
+            end = self._end if self._end is not None else time.monotonic()
+            elapsed = max(end - self._start, 1e-9)
+            remaining_bytes = max(self.bytes_found - self.bytes_done, 0)
+            done_rate = self.bytes_done / elapsed
+            eta = None
+            if self.scan_complete and done_rate > 0:
+                eta = round(remaining_bytes / done_rate, 1)
+            fraction = None
+            if self.bytes_found:
+                fraction = self.bytes_done / self.bytes_found
+            elif self.files_found:
+                fraction = self.files_done / self.files_found
+            snapshot = {
+                'elapsed_seconds': round(elapsed, 3),
+                'scan_complete': self.scan_complete,
+                'files_found': self.files_found,
+                'bytes_found': self.bytes_found,
+                'files_done': self.files_done,
+                'bytes_done': self.bytes_done,
+                'bytes_copied': self.bytes_copied,
+                'files_per_second': round(self.files_done / elapsed, 2),
+                'copy_mb_per_second': round(self.bytes_copied / elapsed / (1024 * 1024), 2),
+                'fraction': round(fraction, 4) if fraction is not None else None,
+                'eta_seconds': eta,
+                'queue': {
+                    'depth': self.queue_depth,
+                    'max': self.queue_max,
+                    'peak': self.queue_peak,
+                    'producer_blocked_seconds': round(self.producer_blocked, 3),
+                    'worker_idle_seconds': round(self.worker_idle, 3),
+                },
+                'phases': {name: round(seconds, 3) for name, seconds in self.phases.items()},
+                'results': dict(self.results),
+                'jobs': self.jobs,
+            }
+        snapshot['bottleneck'] = self.bottleneck()
+        return snapshot
+
+    def write_summary(self, path, **extra):
+        """把最终指标写入 JSON 文件，extra 中的键值一并写入"""
+        summary = dict(self.snapshot(), **extra)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        return summary
+
+
+def format_progress(snapshot):
+    """把指标快照格式化为一行进度信息"""
+    found = f"{snapshot['files_found']}" if snapshot['scan_complete'] else f"{snapshot['files_found']}+"
+    text = (
+        f"进度: {snapshot['files_done']}/{found} 个文件"
+        f"，{snapshot['files_per_second']:.1f} 个文件/秒，复制 {snapshot['copy_mb_per_second']:.1f} MB/s"
+    )
+    if snapshot['fraction'] is not None:
+        text += f"，{snapshot['fraction'] * 100:.1f}%"
+    if snapshot['eta_seconds'] is not None:
+        text += f"，预计剩余 {snapshot['eta_seconds']:.0f} 秒"
+    if snapshot['queue']['max']:
+        text += f"，队列 {snapshot['queue']['depth']}/{snapshot['queue']['max']}"
+    return text
+
+
+def format_phases(snapshot):
+    """把各阶段累计耗时格式化为一行文字"""
+    return "，".join(
+        f"{PHASE_NAMES.get(name, name)} {seconds:.2f} 秒"
+        for name, seconds in snapshot['phases'].items() if seconds
+    )
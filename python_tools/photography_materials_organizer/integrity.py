@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+复制完整性校验
+复制时在读取源文件的同时计算校验和（源文件只读取一次），写完后从磁盘重新读取目标文件比对，
+结果记录在每个目标文件夹的校验清单中。清单是 b2sum 格式的文本文件，
+也可以在文件夹中直接用 `b2sum -l 160 -c .media_organizer_checksums.b2` 检查。
+verify_archive 按清单并行重新校验整个归档
+"""
+
+import os
+import errno
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# 每个目标文件夹中的校验清单文件名
+MANIFEST_FILENAME = '.media_organizer_checksums.b2'
+
+# 计算校验和时每次读取的大小
+CHECKSUM_CHUNK_SIZE = 8 * 1024 * 1024
+
+# 校验和为 160 位 BLAKE2b，与内容去重使用的完整哈希相同
+CHECKSUM_DIGEST_SIZE = 20
+
+
+class ChecksumMismatch(OSError):
+    """目标文件的校验和与源文件不一致"""
+
+    def __init__(self, path, expected, actual):
+        super().__init__(errno.EIO, f"校验和不一致（期望 {expected}，实际 {actual}）", str(path))
+        self.expected = expected
+        self.actual = actual
+
+
+def new_checksum():
+    """返回新的校验和对象"""
+    return hashlib.blake2b(digest_size=CHECKSUM_DIGEST_SIZE)
+
+
+def file_checksum(file_path, drop_cache=False):
+    """流式计算文件的校验和
+
+    drop_cache 为 True 时先丢弃该文件在页缓存中的数据（需要已写回磁盘），
+    保证读到的是磁盘上实际存储的内容，而不是刚写入的缓存
+    """
+    digest = new_checksum()
+    buffer = bytearray(CHECKSUM_CHUNK_SIZE)
+    view = memoryview(buffer)
+    with open(file_path, 'rb', buffering=0) as f:
+        if drop_cache and hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            digest.update(view[:n])
+    return digest.hexdigest()
+
+
+def _escape_name(name):
+    """按 b2sum 的规则转义文件名，返回 (行前缀, 转义后的文件名)"""
+    if '\\' in name or '\n' in name:
+        return '\\', name.replace('\\', '\\\\').replace('\n', '\\n')
+    return '', name
+
+
+def _unescape_name(name):
+    result = []
+    chars = iter(name)
+    for char in chars:
+        if char == '\\':
+            char = next(chars, '')
+            result.append('\n' if char == 'n' else char)
+        else:
+            result.append(char)
+    return ''.join(result)
+
+
+def read_manifest(folder):
+    """读取文件夹中的校验清单，返回 {文件名: 校验和}（同一文件有多条记录时以最后一条为准）"""
+    entries = {}
+    manifest_path = Path(folder) / MANIFEST_FILENAME
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            escaped = line.startswith('\\')
+            if escaped:
+                line = line[1:]
+            checksum, sep, name = line.partition('  ')
+            if not sep:
+                continue
+            entries[_unescape_name(name) if escaped else name] = checksum
+    return entries
+
+
+class ManifestWriter:
+    """向各目标文件夹的校验清单追加记录，可以在多个线程中同时调用
+
+    每个文件夹的清单在第一次写入时打开，之后一直保持打开直到 close()；
+    take_checksum() 返回当前线程最近一次记录的校验和，供归档目录等后续步骤使用
+    """
+
+    def __init__(self):
+        self._files = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.recorded = 0
+
+    def record(self, file_path, checksum):
+        """记录一个文件的校验和"""
+        file_path = Path(file_path)
+        prefix, name = _escape_name(file_path.name)
+        with self._lock:
+            manifest = self._files.get(file_path.parent)
+            if manifest is None:
+                manifest = open(file_path.parent / MANIFEST_FILENAME, 'a', encoding='utf-8')
+                self._files[file_path.parent] = manifest
+            manifest.write(f"{prefix}{checksum}  {name}\n")
+            manifest.flush()
+            self.recorded += 1
+        self._local.checksum = checksum
+
+    def take_checksum(self):
+        """取出当前线程最近一次记录的校验和（取出后清空），没有时返回 None"""
+        checksum = getattr(self._local, 'checksum', None)
+        self._local.checksum = None
+        return checksum
+
+    def close(self):
+        with self._lock:
+            for manifest in self._files.values():
+                manifest.close()
+            self._files.clear()
+
+
+def _find_manifests(root):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [name for name in dirnames if not name.startswith('.')]
+        if MANIFEST_FILENAME in filenames:
+            yield Path(dirpath)
+
+
+def _verify_entry(folder, name, expected):
+    path = folder / name
+    try:
+        actual = file_checksum(path)
+    except FileNotFoundError:
+        return 'missing', path, None
+    except OSError as e:
+        return 'error', path, str(e)
+    return ('ok' if actual == expected else 'mismatch'), path, actual
+
+
+def verify_archive(root, workers=None):
+    """按校验清单重新校验 root 下的全部文件
+
+    每个文件由 workers 个线程并行计算校验和（hashlib 计算大块数据时会释放 GIL，
+    多个线程可以同时用满多个 CPU 核心和磁盘队列），workers 为空时使用 CPU 核心数。
+    返回统计字典: folders / files / ok / mismatch / missing / error / untracked
+    """
+    workers = max(1, int(workers or os.cpu_count() or 1))
+    stats = dict.fromkeys(('folders', 'files', 'ok', 'mismatch', 'missing', 'error', 'untracked'), 0)
+    tasks = []
+    for folder in _find_manifests(root):
+        stats['folders'] += 1
+        try:
+            entries = read_manifest(folder)
+        except (OSError, UnicodeDecodeError) as e:
+            logging.error(f"读取校验清单失败 {folder}: {e}")
+            stats['error'] += 1
+            continue
+        tasks.extend((folder, name, checksum) for name, checksum in entries.items())
+        with os.scandir(folder) as it:
+            stats['untracked'] += sum(
+                1 for entry in it
+                if entry.is_file() and not entry.name.startswith('.') and entry.name not in entries
+            )
+
+    logging.info(f"开始校验归档: {root}（{stats['folders']} 个文件夹，{len(tasks)} 个文件，{workers} 个线程）")
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for status, path, detail in executor.map(lambda task: _verify_entry(*task), tasks):
+            stats['files'] += 1
+            stats[status] += 1
+            if status == 'mismatch':
+                logging.error(f"校验和不一致: {path}")
+            elif status == 'missing':
+                logging.error(f"文件缺失: {path}")
+            elif status == 'error':
+                logging.error(f"读取文件失败 {path}: {detail}")
+    return stats
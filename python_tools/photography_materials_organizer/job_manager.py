@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+后台整理任务管理
+Web UI 提交的整理任务在有上限的线程池中运行，与浏览器页面的连接无关：
+关闭页面不会中断任务，重新打开后可以按任务 ID 重新连接，查看进度和日志。
+每个任务有自己的日志缓冲（按线程名过滤，多个任务同时运行时日志不会混在一起），
+支持暂停、继续和取消
+"""
+
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from video_organizer import organize_videos
+from log_buffer import LogBuffer
+
+# 同时运行的任务数，其余任务排队等待
+MAX_CONCURRENT_JOBS = 2
+
+# 排队（尚未开始）的任务数上限
+MAX_PENDING_JOBS = 8
+
+# 保留的已结束任务数，超过时丢弃最早结束的任务
+JOB_HISTORY = 20
+
+# 任务状态的显示名称
+JOB_STATES = {
+    'queued': '排队中',
+    'running': '运行中',
+    'paused': '已暂停',
+    'cancelling': '正在取消',
+    'cancelled': '已取消',
+    'succeeded': '已完成',
+    'failed': '失败',
+}
+
+_FINISHED_STATES = ('cancelled', 'succeeded', 'failed')
+
+
+class JobCancelled(Exception):
+    """任务被取消"""
+
+
+class JobControl:
+    """任务的暂停/取消开关，由整理线程在处理每个文件前检查"""
+
+    def __init__(self):
+        self._cancelled = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    @property
+    def stop_event(self):
+        """取消时被设置的 Event，供需要在等待期间响应取消的步骤使用（如监视源文件夹）"""
+        return self._cancelled
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def cancel(self):
+        self._cancelled.set()
+        # 唤醒暂停中的任务，让它尽快退出
+        self._running.set()
+
+    def checkpoint(self):
+        """暂停时阻塞直到继续，已取消时抛出 JobCancelled"""
+        self._running.wait()
+        if self._cancelled.is_set():
+            raise JobCancelled()
+
+    def wrap(self, items):
+        """包装待处理条目的迭代器，取出每个条目前调用 checkpoint()"""
+        for item in items:
+            self.checkpoint()
+            yield item
+
+
+class _JobLogFilter(logging.Filter):
+    """只保留任务线程及其工作线程（线程名以任务线程名为前缀）产生的日志"""
+
+    def __init__(self, thread_name):
+        super().__init__()
+        self.thread_name = thread_name
+        self.prefix = thread_name + '-'
+
+    def filter(self, record):
+        return record.threadName == self.thread_name or record.threadName.startswith(self.prefix)
+
+
+class Job:
+    """一个整理任务
+
+    params 为传给 organize_videos 的关键字参数；log 为任务自己的 LogBuffer；
+    snapshot 为最近一次收到的进度指标（见 import_metrics.ImportMetrics.snapshot）
+    """
+
+    def __init__(self, params, description, log_dir, log_lines):
+        self.id = uuid.uuid4().hex[:8]
+        self.params = params
+        self.description = description
+        self.state = 'queued'
+        self.created_at = datetime.now()
+        self.started = None
+        self.finished = None
+        self.error = None
+        self.snapshot = None
+        self.control = JobControl()
+        log_path = log_dir / f"organize-{self.created_at.strftime('%Y%m%d-%H%M%S')}-{self.id}.log"
+        self.log = LogBuffer(max_lines=log_lines, log_path=log_path)
+        self.thread_name = f"job-{self.id}"
+        self.log.addFilter(_JobLogFilter(self.thread_name))
+
+    @property
+    def done(self):
+        return self.state in _FINISHED_STATES
+
+    def _on_progress(self, snapshot):
+        self.snapshot = snapshot
+
+    def status(self):
+        """返回任务状态的字典，用于界面显示"""
+        if self.started is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self.finished or time.monotonic()) - self.started
+        snapshot = self.snapshot or {}
+        return {
+            'id': self.id,
+            'description': self.description,
+            'state': self.state,
+            'state_name': JOB_STATES[self.state],
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'elapsed_seconds': round(elapsed, 1),
+            'files_done': snapshot.get('files_done', 0),
+            'files_found': snapshot.get('files_found', 0),
+            'fraction': snapshot.get('fraction'),
+            'files_per_second': snapshot.get('files_per_second', 0.0),
+            'copy_mb_per_second': snapshot.get('copy_mb_per_second', 0.0),
+            'eta_seconds': snapshot.get('eta_seconds'),
+            'error': self.error,
+            'log_path': str(self.log.log_path),
+        }
+
+
+class JobManager:
+    """后台整理任务的注册表和执行器
+
+    submit() 立即返回 Job，任务在最多 max_workers 个线程中运行，排队的任务超过
+    max_pending 时拒绝提交；任务结束后保留最近 history 个，供界面查看结果和日志
+    """
+
+    def __init__(self, log_dir, max_workers=MAX_CONCURRENT_JOBS, max_pending=MAX_PENDING_JOBS,
+                 history=JOB_HISTORY, log_lines=200):
+        self.log_dir = log_dir
+        self.max_pending = max_pending
+        self.history = history
+        self.log_lines = log_lines
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='organize-job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, params, description=""):
+        """提交一个整理任务，返回 Job；排队的任务过多时抛出 RuntimeError"""
+        with self._lock:
+            pending = sum(1 for job in self._jobs.values() if job.state == 'queued')
+            if pending >= self.max_pending:
+                raise RuntimeError(f"排队的任务过多（{pending} 个），请等待已有任务完成")
+            job = Job(params, description, self.log_dir, self.log_lines)
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job)
+        return job
+
+    def _run(self, job):
+        with self._lock:
+            if job.control.cancelled:
+                job.log.close()
+                return
+            job.state = 'running'
+            job.started = time.monotonic()
+
+        # 任务运行期间把线程改名为 job-<ID>，工作线程以此为前缀命名，日志过滤器据此只收集本任务的日志
+        thread = threading.current_thread()
+        original_name = thread.name
+        thread.name = job.thread_name
+        logger = logging.getLogger()
+        logger.addHandler(job.log)
+        state = 'failed'
+        try:
+            if organize_videos(progress_callback=job._on_progress, control=job.control, **job.params):
+                state = 'succeeded'
+        except JobCancelled:
+            logging.warning("任务已取消，已处理的文件会保留，重新运行相同的导入会从中断处继续")
+            state = 'cancelled'
+        except Exception as e:
+            logging.error(f"任务执行出错: {e}")
+            job.error = str(e)
+        finally:
+            logger.removeHandler(job.log)
+            job.log.close()
+            thread.name = original_name
+            with self._lock:
+                job.state = state
+                job.finished = time.monotonic()
+            self._prune()
+
+    def _prune(self):
+        with self._lock:
+            finished = [job for job in self._jobs.values() if job.done]
+            finished.sort(key=lambda job: job.finished)
+            for job in finished[:max(0, len(finished) - self.history)]:
+                del self._jobs[job.id]
+
+    def get(self, job_id):
+        """按 ID 查找任务，不存在时返回 None"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self):
+        """返回所有任务，最新提交的在前"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return sorted(jobs, key=lambda job: job.created_at, reverse=True)
+
+    def pause(self, job_id):
+        """暂停任务：正在处理的文件完成后停止取新文件"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.state != 'running':
+                return False
+            job.control.pause()
+            job.state = 'paused'
+        job.log.add("任务已暂停，正在处理的文件完成后停止", "WARNING")
+        return True
+
+    def resume(self, job_id):
+        """继续暂停的任务"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.state != 'paused':
+                return False
+            job.state = 'running'
+            job.control.resume()
+        job.log.add("任务继续运行")
+        return True
+
+    def cancel(self, job_id):
+        """取消排队中或运行中的任务"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.done:
+                return False
+            job.control.cancel()
+            if job.state == 'queued':
+                # 还没有开始，直接标记为已取消
+                job.state = 'cancelled'
+                job.finished = time.monotonic()
+            else:
+                job.state = 'cancelling'
+        job.log.add("任务已取消" if job.done else "正在取消任务...", "WARNING")
+        return True
+
+    def shutdown(self, wait=True):
+        """取消所有未结束的任务并关闭执行器"""
+        for job in self.list_jobs():
+            if not job.done:
+                job.control.cancel()
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Web UI 日志缓冲
+只在内存中保留最近 N 行日志和按级别累计的计数，完整日志写入文件；
+emit 只是加锁后追加到定长的环形缓冲区，不会阻塞整理线程，也不会随导入规模无限增长
+"""
+
+import threading
+import logging
+from collections import deque
+from datetime import datetime
+
+# 界面中显示的日志行数
+DEFAULT_MAX_LINES = 200
+
+LOG_FORMAT = '[%(asctime)s] %(levelname)s: %(message)s'
+LOG_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class LogBuffer(logging.Handler):
+    """环形缓冲区日志处理器
+
+    lines 只保留最近 max_lines 行；counts 按级别累计全部日志的行数；
+    log_path 不为空时把全部日志同时写入该文件。version 在每次写入后加一，
+    界面可以据此判断是否需要刷新。
+    """
+
+    def __init__(self, max_lines=DEFAULT_MAX_LINES, log_path=None):
+        super().__init__()
+        self.setFormatter(logging.Formatter(LOG_FORMAT, datefmt=LOG_DATE_FORMAT))
+        self.lines = deque(maxlen=max_lines)
+        self.counts = {}
+        self.total = 0
+        self.version = 0
+        self.log_path = log_path
+        self._buffer_lock = threading.Lock()
+        self._file = None
+        if log_path is not None:
+            log_path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(log_path, 'a', encoding='utf-8')
+
+    def emit(self, record):
+        try:
+            line = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        self._append(line, record.levelname)
+
+    def add(self, message, level="INFO"):
+        """直接添加一行日志（不经过 logging，如界面自身的提示信息）"""
+        timestamp = datetime.now().strftime(LOG_DATE_FORMAT)
+        self._append(f"[{timestamp}] {level}: {message}", level)
+
+    def _append(self, line, level):
+        with self._buffer_lock:
+            self.lines.append(line)
+            self.counts[level] = self.counts.get(level, 0) + 1
+            self.total += 1
+            self.version += 1
+            if self._file is not None:
+                self._file.write(line + '\n')
+
+    def render(self):
+        """返回界面中显示的文本：计数摘要 + 最近的日志行"""
+        with self._buffer_lock:
+            lines = list(self.lines)
+            counts = dict(self.counts)
+            total = self.total
+            if self._file is not None:
+                self._file.flush()
+        header = f"共 {total} 行日志"
+        details = "，".join(
+            f"{level} {counts[level]}" for level in ('WARNING', 'ERROR') if counts.get(level)
+        )
+        if details:
+            header += f"（{details}）"
+        if total > len(lines):
+            header += f"，仅显示最近 {len(lines)} 行"
+        if self.log_path is not None:
+            header += f"\n完整日志: {self.log_path}"
+        return header + "\n" + "-" * 40 + "\n" + "\n".join(lines) + "\n"
+
+    def close(self):
+        with self._buffer_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        super().close()
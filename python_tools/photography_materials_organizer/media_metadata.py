@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+媒体元数据解析
+只读取文件头部的少量数据，从 EXIF (JPEG/HEIC/RAW)、QuickTime/MP4 的 mvhd atom、
+AVCHD (MTS) 的 MDPM 信息以及 Sony XML 附属文件中获取拍摄时间，不依赖 ffprobe 等外部程序
+"""
+
+import os
+import re
+import struct
+from datetime import datetime, timezone
+
+# 首次读取的文件头大小，绝大多数格式的拍摄时间都位于这个范围内
+HEADER_READ_SIZE = 64 * 1024
+
+JPEG_EXTENSIONS = {'.jpg', '.jpeg'}
+
+# 以 TIFF 结构存储的 RAW 格式
+TIFF_EXTENSIONS = {
+    '.tiff', '.tif', '.cr2', '.nef', '.nrw', '.arw', '.srf', '.dng', '.orf', '.rw2', '.raw',
+    '.pef', '.srw', '.3fr', '.fff', '.dcr', '.kdc', '.rwl', '.iiq'
+}
+
+HEIF_EXTENSIONS = {'.heic', '.heif', '.avif'}
+
+QUICKTIME_EXTENSIONS = {'.mp4', '.mov', '.m4v', '.3gp', '.insv', '.lrv'}
+
+AVCHD_EXTENSIONS = {'.mts', '.m2ts', '.ts'}
+
+# EXIF 标签
+TAG_DATETIME = 0x0132
+TAG_EXIF_IFD = 0x8769
+TAG_DATETIME_ORIGINAL = 0x9003
+TAG_DATETIME_DIGITIZED = 0x9004
+
+# QuickTime 时间从 1904-01-01 UTC 开始计秒
+QUICKTIME_EPOCH_OFFSET = 2082844800
+
+# AVCHD 视频 SEI 中的 MDPM 标识
+MDPM_MARKER = b'MDPM'
+
+SONY_XML_DATE_PATTERN = re.compile(rb'CreationDate\s+value="([^"]+)"')
+
+MIN_VALID_YEAR = 1970
+
+
+class _HeaderReader:
+    """带文件头缓存的随机读取器：位于头部的数据直接从缓存中取，其余位置再去读文件"""
+
+    def __init__(self, f):
+        self._f = f
+        self.header = f.read(HEADER_READ_SIZE)
+
+    def read_at(self, offset, size):
+        end = offset + size
+        if end <= len(self.header):
+            return self.header[offset:end]
+        self._f.seek(offset)
+        return self._f.read(size)
+
+
+def _valid(value):
+    if value is None or value.year < MIN_VALID_YEAR:
+        return None
+    return value
+
+
+def _parse_exif_datetime(raw):
+    text = raw.split(b'\x00', 1)[0].decode('ascii', 'ignore').strip()
+    try:
+        return _valid(datetime.strptime(text[:19], '%Y:%m:%d %H:%M:%S'))
+    except ValueError:
+        return None
+
+
+def _parse_tiff(reader, base):
+    """解析 base 处的 TIFF 结构，返回 DateTimeOriginal，缺失时依次回退到 DateTimeDigitized、DateTime"""
+    head = reader.read_at(base, 8)
+    if len(head) < 8:
+        return None
+    if head[:2] == b'II':
+        endian = '<'
+    elif head[:2] == b'MM':
+        endian = '>'
+    else:
+        return None
+    # 42 为标准 TIFF，ORF 使用 "RO"/"SR"，RW2 使用 0x55
+    magic = struct.unpack(endian + 'H', head[2:4])[0]
+    if magic not in (42, 0x4F52, 0x5352, 0x55):
+        return None
+    ifd0_offset = struct.unpack(endian + 'I', head[4:8])[0]
+
+    def read_ifd(offset):
+        count_data = reader.read_at(base + offset, 2)
+        if len(count_data) < 2:
+            return {}
+        count = struct.unpack(endian + 'H', count_data)[0]
+        data = reader.read_at(base + offset + 2, count * 12)
+        entries = {}
+        for i in range(len(data) // 12):
+            tag, field_type, value_count = struct.unpack(endian + 'HHI', data[i * 12:i * 12 + 8])
+            entries[tag] = (field_type, value_count, data[i * 12 + 8:i * 12 + 12])
+        return entries
+
+    def read_ascii(entry):
+        field_type, value_count, value = entry
+        if field_type != 2:
+            return None
+        if value_count <= 4:
+            return _parse_exif_datetime(value[:value_count])
+        value_offset = struct.unpack(endian + 'I', value)[0]
+        return _parse_exif_datetime(reader.read_at(base + value_offset, value_count))
+
+    ifd0 = read_ifd(ifd0_offset)
+    if TAG_EXIF_IFD in ifd0:
+        exif_offset = struct.unpack(endian + 'I', ifd0[TAG_EXIF_IFD][2])[0]
+        exif_ifd = read_ifd(exif_offset)
+        for tag in (TAG_DATETIME_ORIGINAL, TAG_DATETIME_DIGITIZED):
+            if tag in exif_ifd:
+                value = read_ascii(exif_ifd[tag])
+                if value:
+                    return value
+    if TAG_DATETIME in ifd0:
+        return read_ascii(ifd0[TAG_DATETIME])
+    return None
+
+
+def _parse_jpeg(reader, base=0):
+    """在 JPEG 的 APP1 段中查找 EXIF"""
+    if reader.read_at(base, 2) != b'\xff\xd8':
+        return None
+    offset = base + 2
+    while True:
+        marker = reader.read_at(offset, 4)
+        if len(marker) < 4 or marker[0] != 0xFF:
+            return None
+        code = marker[1]
+        # SOS 之后是图像数据，不会再有元数据段
+        if code in (0xDA, 0xD9):
+            return None
+        length = struct.unpack('>H', marker[2:4])[0]
+        if code == 0xE1 and reader.read_at(offset + 4, 6) == b'Exif\x00\x00':
+            return _parse_tiff(reader, offset + 10)
+        offset += 2 + length
+
+
+def _parse_raf(reader):
+    """Fujifilm RAF：文件头第 84 字节处记录内嵌 JPEG 预览的位置"""
+    if not reader.header.startswith(b'FUJIFILMCCD-RAW'):
+        return None
+    jpeg_offset = struct.unpack('>I', reader.read_at(84, 4))[0]
+    return _parse_jpeg(reader, jpeg_offset)
+
+
+def _iter_boxes(reader, start, end):
+    """遍历 ISO BMFF (MP4/MOV/HEIF) 的 box，产出 (类型, 数据起始位置, box 结束位置)"""
+    offset = start
+    while end is None or offset + 8 <= end:
+        header = reader.read_at(offset, 8)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack('>I4s', header)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack('>Q', reader.read_at(offset + 8, 8))[0]
+            header_size = 16
+        elif size == 0:
+            if end is None:
+                return
+            size = end - offset
+        if size < header_size:
+            return
+        yield box_type, offset + header_size, offset + size
+        offset += size
+
+
+def _find_box(reader, start, end, box_type):
+    for found_type, data_start, box_end in _iter_boxes(reader, start, end):
+        if found_type == box_type:
+            return data_start, box_end
+    return None
+
+
+def _parse_quicktime(reader):
+    """读取 moov/mvhd 中的创建时间（UTC），只读取 atom 头部，跳过 mdat 数据"""
+    moov = _find_box(reader, 0, None, b'moov')
+    if moov is None:
+        return None
+    mvhd = _find_box(reader, moov[0], moov[1], b'mvhd')
+    if mvhd is None:
+        return None
+    data = reader.read_at(mvhd[0], 12)
+    if len(data) < 8:
+        return None
+    if data[0] == 1:
+        creation_time = struct.unpack('>Q', data[4:12])[0]
+    else:
+        creation_time = struct.unpack('>I', data[4:8])[0]
+    if creation_time <= QUICKTIME_EPOCH_OFFSET:
+        return None
+    utc_time = datetime.fromtimestamp(creation_time - QUICKTIME_EPOCH_OFFSET, timezone.utc)
+    return _valid(utc_time.astimezone().replace(tzinfo=None))
+
+
+def _read_uint(data, offset, size):
+    if size == 0:
+        return 0, offset
+    return int.from_bytes(data[offset:offset + size], 'big'), offset + size
+
+
+def _parse_heif(reader):
+    """在 HEIF 的 meta box 中通过 iinf/iloc 找到 Exif 数据项，再解析其中的 TIFF 结构"""
+    meta = _find_box(reader, 0, None, b'meta')
+    if meta is None:
+        return None
+    # meta 是 FullBox，数据前有 4 字节 version/flags
+    children_start = meta[0] + 4
+    iinf = _find_box(reader, children_start, meta[1], b'iinf')
+    iloc = _find_box(reader, children_start, meta[1], b'iloc')
+    if iinf is None or iloc is None:
+        return None
+
+    iinf_version = reader.read_at(iinf[0], 1)[0]
+    entries_start = iinf[0] + 4 + (2 if iinf_version == 0 else 4)
+    exif_item_id = None
+    for box_type, data_start, _ in _iter_boxes(reader, entries_start, iinf[1]):
+        if box_type != b'infe':
+            continue
+        infe = reader.read_at(data_start, 16)
+        version = infe[0]
+        if version < 2:
+            continue
+        id_size = 2 if version == 2 else 4
+        item_id = int.from_bytes(infe[4:4 + id_size], 'big')
+        item_type = infe[4 + id_size + 2:4 + id_size + 6]
+        if item_type == b'Exif':
+            exif_item_id = item_id
+            break
+    if exif_item_id is None:
+        return None
+
+    data = reader.read_at(iloc[0], iloc[1] - iloc[0])
+    version = data[0]
+    offset_size = data[4] >> 4
+    length_size = data[4] & 0x0F
+    base_offset_size = data[5] >> 4
+    index_size = data[5] & 0x0F if version in (1, 2) else 0
+    pos = 6
+    item_count, pos = _read_uint(data, pos, 2 if version < 2 else 4)
+    for _ in range(item_count):
+        item_id, pos = _read_uint(data, pos, 2 if version < 2 else 4)
+        construction_method = 0
+        if version in (1, 2):
+            construction_method, pos = _read_uint(data, pos, 2)
+            construction_method &= 0x0F
+        pos += 2  # data_reference_index
+        base_offset, pos = _read_uint(data, pos, base_offset_size)
+        extent_count, pos = _read_uint(data, pos, 2)
+        extents = []
+        for _ in range(extent_count):
+            if index_size:
+                pos += index_size
+            extent_offset, pos = _read_uint(data, pos, offset_size)
+            extent_length, pos = _read_uint(data, pos, length_size)
+            extents.append((extent_offset, extent_length))
+        if item_id != exif_item_id:
+            continue
+        if construction_method != 0 or not extents:
+            return None
+        exif_start = base_offset + extents[0][0]
+        # Exif 数据项以 4 字节的 TIFF 头偏移量开头
+        tiff_header_offset = struct.unpack('>I', reader.read_at(exif_start, 4))[0]
+        return _parse_tiff(reader, exif_start + 4 + tiff_header_offset)
+    return None
+
+
+def _bcd(value):
+    high, low = value >> 4, value & 0x0F
+    if high > 9 or low > 9:
+        raise ValueError("invalid BCD")
+    return high * 10 + low
+
+
+def _parse_avchd(reader):
+    """在 AVCHD 视频流开头的 SEI 中查找 MDPM 信息（0x18: 时区/年/月，0x19: 日/时/分/秒）"""
+    header = reader.header
+    position = header.find(MDPM_MARKER)
+    while position != -1:
+        count_pos = position + len(MDPM_MARKER)
+        if count_pos < len(header):
+            count = header[count_pos]
+            tags = {}
+            for i in range(count):
+                entry = header[count_pos + 1 + i * 5:count_pos + 6 + i * 5]
+                if len(entry) < 5:
+                    break
+                tags[entry[0]] = entry[1:]
+            if 0x18 in tags and 0x19 in tags:
+                try:
+                    year = _bcd(tags[0x18][1]) * 100 + _bcd(tags[0x18][2])
+                    month = _bcd(tags[0x18][3])
+                    day, hour, minute, second = (_bcd(b) for b in tags[0x19])
+                    return _valid(datetime(year, month, day, hour, minute, second))
+                except ValueError:
+                    pass
+        position = header.find(MDPM_MARKER, position + 1)
+    return None
+
+
+def _parse_sony_xml(reader):
+    """Sony 相机视频附属的 XML 文件中的 CreationDate"""
+    match = SONY_XML_DATE_PATTERN.search(reader.header)
+    if not match:
+        return None
+    try:
+        value = datetime.fromisoformat(match.group(1).decode('ascii'))
+    except ValueError:
+        return None
+    # 保留拍摄地的本地时间
+    return _valid(value.replace(tzinfo=None))
+
+
+def _parser_for(suffix):
+    if suffix in JPEG_EXTENSIONS:
+        return _parse_jpeg
+    if suffix in TIFF_EXTENSIONS:
+        return lambda reader: _parse_tiff(reader, 0)
+    if suffix == '.raf':
+        return _parse_raf
+    if suffix in HEIF_EXTENSIONS:
+        return _parse_heif
+    if suffix in QUICKTIME_EXTENSIONS:
+        return _parse_quicktime
+    if suffix in AVCHD_EXTENSIONS:
+        return _parse_avchd
+    if suffix == '.xml':
+        return _parse_sony_xml
+    return None
+
+
+def read_capture_date(file_path):
+    """从文件内嵌的元数据中读取拍摄时间
+
+    返回本地时间的 datetime（不带时区），不支持的格式或没有拍摄时间时返回 None
+    """
+    parser = _parser_for(os.path.splitext(str(file_path))[1].lower())
+    if parser is None:
+        return None
+    try:
+        with open(file_path, 'rb') as f:
+            return parser(_HeaderReader(f))
+    except (OSError, ValueError, IndexError, struct.error, OverflowError):
+        return None
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视频封面和代理文件
+整理过程中每复制完一个视频就提交给后台的 ffmpeg 进程池，生成封面图 (JPEG) 和低分辨率代理文件 (H.264)，
+存放在同一日期文件夹的 proxies 子文件夹中。同时运行的 ffmpeg 进程数不超过 CPU 核心数，
+每个 ffmpeg 只使用一个线程，导入结束时代理文件基本已经生成完毕，不需要再单独跑一遍。
+已经生成过的内容（按 "大小 + 部分哈希" 识别，记录在目标文件夹的索引数据库中）直接复用，不会重复转码
+"""
+
+import os
+import shutil
+import sqlite3
+import logging
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from scan_index import INDEX_FILENAME
+from dedup import partial_hash
+
+# 代理文件所在的子文件夹名称
+PROXY_DIRNAME = 'proxies'
+
+# 封面图取自视频的第几秒（视频更短时取第一帧）
+POSTER_OFFSET_SECONDS = 1
+
+# 封面图宽度和代理文件高度（像素）
+POSTER_WIDTH = 640
+PROXY_HEIGHT = 540
+
+# 生成结果
+PROXY_RESULTS = ('generated', 'reused', 'existing', 'failed')
+
+
+def proxy_paths(video_path):
+    """返回视频对应的 (封面图路径, 代理文件路径)"""
+    video_path = Path(video_path)
+    folder = video_path.parent / PROXY_DIRNAME
+    return folder / f"{video_path.name}.jpg", folder / f"{video_path.name}.proxy.mp4"
+
+
+def _poster_command(ffmpeg, source, output, offset):
+    return [
+        ffmpeg, '-nostdin', '-hide_banner', '-loglevel', 'error', '-y',
+        '-ss', str(offset), '-i', str(source),
+        '-frames:v', '1', '-vf', f'scale={POSTER_WIDTH}:-2', '-threads', '1',
+        '-f', 'image2', str(output),
+    ]
+
+
+def _proxy_command(ffmpeg, source, output):
+    return [
+        ffmpeg, '-nostdin', '-hide_banner', '-loglevel', 'error', '-y',
+        '-i', str(source),
+        '-map', '0:v:0', '-map', '0:a:0?',
+        '-vf', f'scale=-2:{PROXY_HEIGHT}', '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '28',
+        '-c:a', 'aac', '-b:a', '96k', '-threads', '1', '-movflags', '+faststart',
+        '-f', 'mp4', str(output),
+    ]
+
+
+def _run_ffmpeg(command, output):
+    """运行 ffmpeg 写入临时文件，成功后重命名为 output；失败时抛出 RuntimeError"""
+    temp_path = output.with_name(f".{output.name}.partial")
+    command = command[:-1] + [str(temp_path)]
+    try:
+        result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if result.returncode != 0 or not temp_path.exists() or temp_path.stat().st_size == 0:
+            message = result.stderr.decode('utf-8', 'replace').strip().splitlines()
+            raise RuntimeError(message[-1] if message else f"ffmpeg 退出码 {result.returncode}")
+        os.replace(temp_path, output)
+    finally:
+        if temp_path.exists():
+            temp_path.unlink()
+
+
+def _link_or_copy(existing, destination):
+    try:
+        os.link(existing, destination)
+    except FileExistsError:
+        pass
+    except OSError:
+        shutil.copy2(existing, destination)
+
+
+class ProxyIndex:
+    """内容 -> 已生成的封面图和代理文件 的索引，保存在目标文件夹的索引数据库中"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            '''
+            CREATE TABLE IF NOT EXISTS proxy_outputs (
+                content_key TEXT PRIMARY KEY,
+                poster TEXT NOT NULL,
+                proxy TEXT NOT NULL
+            )
+            '''
+        )
+        self._conn.commit()
+        self._entries = {
+            key: (poster, proxy)
+            for key, poster, proxy in self._conn.execute('SELECT content_key, poster, proxy FROM proxy_outputs')
+        }
+
+    def find(self, key):
+        """返回内容 key 已生成且仍然存在的 (封面图, 代理文件)，没有时返回 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or not all(os.path.exists(path) for path in entry):
+            return None
+        return entry
+
+    def record(self, key, poster, proxy):
+        with self._lock:
+            self._entries[key] = (str(poster), str(proxy))
+            # 转码很慢，每条记录都立即写入，中断后已生成的内容不会丢失
+            self._conn.execute(
+                'INSERT OR REPLACE INTO proxy_outputs (content_key, poster, proxy) VALUES (?, ?, ?)',
+                (key, str(poster), str(proxy))
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class ProxyGenerator:
+    """后台生成封面图和代理文件
+
+    submit() 立即返回，视频在最多 workers 个并发的 ffmpeg 进程中处理；
+    close() 等待全部完成并返回各结果的数量。找不到 ffmpeg 时构造函数抛出 FileNotFoundError
+    """
+
+    def __init__(self, workers=None, ffmpeg=None):
+        self.ffmpeg = ffmpeg or shutil.which('ffmpeg')
+        if not self.ffmpeg:
+            raise FileNotFoundError("未找到 ffmpeg")
+        self.workers = max(1, int(workers or os.cpu_count() or 1))
+        # 线程只负责等待 ffmpeg 子进程，真正的转码在独立的 ffmpeg 进程中并行进行；
+        # 线程名以创建者的线程名为前缀，日志能归到同一个后台任务（见 job_manager）
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix=f"{threading.current_thread().name}-proxy"
+        )
+        self._indexes = {}
+        self._lock = threading.Lock()
+        self._futures = []
+        self.counts = dict.fromkeys(PROXY_RESULTS, 0)
+
+    def _index_for(self, to_path):
+        with self._lock:
+            index = self._indexes.get(to_path)
+            if index is None:
+                index = self._indexes[to_path] = ProxyIndex(Path(to_path) / INDEX_FILENAME)
+            return index
+
+    def submit(self, video_path, to_path):
+        """提交一个已整理的视频，to_path 为其所在的目标根文件夹（索引数据库所在位置）"""
+        future = self._executor.submit(self._generate, Path(video_path), self._index_for(to_path))
+        with self._lock:
+            self._futures.append(future)
+
+    def pending(self):
+        """尚未完成的视频数"""
+        with self._lock:
+            return sum(1 for future in self._futures if not future.done())
+
+    def _generate(self, video_path, index):
+        poster, proxy = proxy_paths(video_path)
+        if poster.exists() and proxy.exists():
+            return self._count('existing')
+        try:
+            key = f"{video_path.stat().st_size}:{partial_hash(video_path)}"
+            poster.parent.mkdir(exist_ok=True)
+            existing = index.find(key)
+            if existing is not None:
+                # 相同内容已经生成过（如同一段视频导入到了其他文件夹）
+                _link_or_copy(existing[0], poster)
+                _link_or_copy(existing[1], proxy)
+                return self._count('reused')
+            if not poster.exists():
+                try:
+                    _run_ffmpeg(_poster_command(self.ffmpeg, video_path, poster, POSTER_OFFSET_SECONDS), poster)
+                except RuntimeError:
+                    # 视频比 POSTER_OFFSET_SECONDS 短时取第一帧
+                    _run_ffmpeg(_poster_command(self.ffmpeg, video_path, poster, 0), poster)
+            if not proxy.exists():
+                _run_ffmpeg(_proxy_command(self.ffmpeg, video_path, proxy), proxy)
+            index.record(key, poster, proxy)
+        except (OSError, RuntimeError) as e:
+            logging.error(f"生成代理文件失败 {video_path}: {e}")
+            return self._count('failed')
+        logging.debug(f"代理文件已生成: {proxy}")
+        return self._count('generated')
+
+    def _count(self, result):
+        with self._lock:
+            self.counts[result] += 1
+        return result
+
+    def close(self, cancel=False):
+        """等待所有视频处理完成，关闭进程池和索引，返回各结果的数量
+
+        cancel 为 True 时（导入被中断）丢弃还没有开始的视频，只等待正在运行的 ffmpeg
+        """
+        if cancel:
+            with self._lock:
+                for future in self._futures:
+                    future.cancel()
+        remaining = self.pending()
+        if remaining:
+            logging.info(f"等待代理文件生成完成（剩余 {remaining} 个视频）...")
+        self._executor.shutdown(wait=True)
+        for index in self._indexes.values():
+            index.close()
+        return dict(self.counts)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+目录扫描
+基于 os.scandir 的流式扫描器：按扩展名提前过滤，只为候选文件调用 stat，
+可跳过隐藏目录和系统目录，并可在高延迟的网络存储上用多个线程并行遍历子目录
+"""
+
+import os
+import time
+import queue
+import threading
+import logging
+
+# 存储卡、NAS 和各操作系统自动生成的系统目录，其中不会有需要整理的素材
+SYSTEM_DIRECTORIES = {
+    '.Trashes', '.Spotlight-V100', '.fseventsd', '.TemporaryItems', '.DocumentRevisions-V100',
+    '@eaDir', '#recycle', '#snapshot', '$RECYCLE.BIN', 'System Volume Information', 'lost+found',
+}
+
+# 并行扫描时结果队列的长度上限（以目录为单位）
+SCAN_QUEUE_SIZE = 256
+
+_DONE = object()
+
+
+def _should_skip(name, skip_hidden):
+    if name in SYSTEM_DIRECTORIES:
+        return True
+    return skip_hidden and name.startswith('.')
+
+
+def _scan_directory(path, extensions, skip_hidden, metrics=None, prefilter=None):
+    """扫描单个目录，返回 (候选文件列表 [(路径, stat)], 子目录列表, 文件总数)"""
+    files = []
+    subdirs = []
+    file_count = 0
+    stat_seconds = 0.0
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                name = entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not _should_skip(name, skip_hidden) and not (
+                                prefilter is not None and prefilter.skip_directory(name)):
+                            subdirs.append(entry.path)
+                        continue
+                    if not entry.is_file():
+                        continue
+                    file_count += 1
+                    if skip_hidden and name.startswith('.'):
+                        continue
+                    if extensions is not None and os.path.splitext(name)[1].lower() not in extensions:
+                        continue
+                    if prefilter is not None and prefilter.skip_name(name):
+                        continue
+                    # DirEntry 会缓存 stat 结果，后续处理直接复用
+                    start = time.perf_counter()
+                    stat_info = entry.stat()
+                    stat_seconds += time.perf_counter() - start
+                    if prefilter is not None and prefilter.skip_stat(stat_info):
+                        continue
+                    files.append((entry.path, stat_info))
+                except OSError as e:
+                    logging.warning(f"无法读取文件信息 {entry.path}: {e}")
+    except OSError as e:
+        logging.warning(f"无法扫描目录 {path}: {e}")
+    if metrics is not None:
+        metrics.add_time('stat', stat_seconds)
+    return files, subdirs, file_count
+
+
+def _scan_sequential(root, extensions, skip_hidden, counter, metrics, prefilter):
+    stack = [root]
+    while stack:
+        files, subdirs, file_count = _scan_directory(stack.pop(), extensions, skip_hidden, metrics, prefilter)
+        if counter is not None:
+            counter['total'] += file_count
+        yield from files
+        # 逆序入栈，保持与目录列出顺序一致的深度优先遍历
+        stack.extend(reversed(subdirs))
+
+
+def _scan_concurrent(root, extensions, skip_hidden, counter, workers, metrics, prefilter):
+    results = queue.Queue(maxsize=SCAN_QUEUE_SIZE)
+    directories = queue.Queue()
+    stop_event = threading.Event()
+    state = {'pending': 1}
+    state_lock = threading.Lock()
+
+    def put_result(item):
+        while not stop_event.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def worker():
+        while True:
+            path = directories.get()
+            if path is None or stop_event.is_set():
+                return
+            try:
+                files, subdirs, file_count = _scan_directory(path, extensions, skip_hidden, metrics, prefilter)
+            except Exception as e:
+                # 预过滤等步骤的意外异常交给消费者重新抛出，否则消费者会一直等待这个目录的结果
+                put_result(e)
+                return
+            with state_lock:
+                state['pending'] += len(subdirs)
+            for subdir in subdirs:
+                directories.put(subdir)
+            put_result((files, file_count))
+            with state_lock:
+                state['pending'] -= 1
+                finished = state['pending'] == 0
+            if finished:
+                put_result(_DONE)
+
+    parent_name = threading.current_thread().name
+    threads = [
+        threading.Thread(target=worker, name=f"{parent_name}-scanner-{i}", daemon=True)
+        for i in range(workers)
+    ]
+    directories.put(root)
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            item = results.get()
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            files, file_count = item
+            if counter is not None:
+                counter['total'] += file_count
+            yield from files
+    finally:
+        stop_event.set()
+        for _ in threads:
+            directories.put(None)
+
+
+def scan_files(root, extensions=None, skip_hidden=False, workers=1, counter=None, metrics=None, prefilter=None):
+    """递归扫描 root，逐个产出 (文件路径字符串, stat 结果)
+
+    extensions 为小写扩展名集合（如 {'.mp4'}），不匹配的文件不会 stat，也不会产出；
+    skip_hidden 为 True 时跳过以 "." 开头的文件和目录，系统目录（.Trashes、@eaDir 等）总是跳过；
+    workers 大于 1 时用多个线程并行遍历子目录，适合 NAS/SMB 等高延迟存储；
+    counter 为可选的字典，用于累计扫描到的文件总数（键 'total'）；
+    metrics 为可选的 ImportMetrics，用于累计 stat 调用的耗时；
+    prefilter 为可选的 date_prefilter.DateRangePrefilter，跳过其 skip_directory 返回 True 的子目录，
+    不产出 skip_name（stat 之前）或 skip_stat 返回 True 的文件
+    """
+    root = os.fspath(root)
+    if workers > 1:
+        return _scan_concurrent(root, extensions, skip_hidden, counter, workers, metrics, prefilter)
+    return _scan_sequential(root, extensions, skip_hidden, counter, metrics, prefilter)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+扫描索引
+在目标文件夹中用 SQLite 记录已经整理过的文件（源路径、大小、修改时间、目标路径），
+增量整理时未变化的文件直接跳过，无需重新计算日期和检查目标文件
+"""
+
+import os
+import sqlite3
+from pathlib import Path
+import threading
+import logging
+from datetime import datetime
+
+# 索引文件名，存放在目标文件夹根目录
+INDEX_FILENAME = '.media_organizer_index.sqlite3'
+
+# 累计多少条记录后写入一次数据库
+FLUSH_BATCH_SIZE = 1000
+
+
+def open_read_only(db_path):
+    """以只读方式打开索引数据库，不会创建文件；数据库不存在时返回内存数据库"""
+    if not Path(db_path).exists():
+        return sqlite3.connect(':memory:', check_same_thread=False)
+    uri = Path(db_path).absolute().as_uri() + '?mode=ro'
+    return sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+
+class ScanIndex:
+    """已整理文件的持久化索引
+
+    打开时把全部记录一次性读入内存，查询只是字典查找；
+    新记录先缓存在内存中，按批写入数据库，关闭时提交剩余记录。
+    可以在多个工作线程中同时使用。read_only 为 True 时以只读方式打开（用于生成整理计划），
+    新记录只保存在内存中。
+    """
+
+    def __init__(self, db_path, read_only=False):
+        self.db_path = db_path
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        self._pending = []
+        self._entries = {}
+        if read_only:
+            self._conn = open_read_only(db_path)
+            self._load()
+            return
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            '''
+            CREATE TABLE IF NOT EXISTS organized_files (
+                source_path TEXT NOT NULL,
+                device_name TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                destination TEXT NOT NULL,
+                organized_at TEXT NOT NULL,
+                PRIMARY KEY (source_path, device_name)
+            )
+            '''
+        )
+        self._conn.commit()
+        self._load()
+
+    def _load(self):
+        try:
+            rows = self._conn.execute(
+                'SELECT source_path, device_name, size, mtime_ns, destination FROM organized_files'
+            )
+            self._entries = {
+                (source_path, device_name): (size, mtime_ns, destination)
+                for source_path, device_name, size, mtime_ns, destination in rows
+            }
+        except sqlite3.OperationalError:
+            # 只读打开的旧数据库中可能还没有这张表
+            self._entries = {}
+        logging.info(f"已加载扫描索引: {self.db_path}（{len(self._entries)} 条记录）")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @staticmethod
+    def _key(source_path, device_name):
+        return os.path.abspath(source_path), device_name
+
+    def is_unchanged(self, source_path, device_name, stat_info):
+        """文件是否已整理过、大小和修改时间均未变化，且整理后的文件仍然存在
+
+        只对大小和修改时间都匹配的文件检查目标文件，整理后的文件被删除或移走时重新整理
+        """
+        entry = self._entries.get(self._key(source_path, device_name))
+        if entry is None or entry[:2] != (stat_info.st_size, stat_info.st_mtime_ns):
+            return False
+        return os.path.exists(entry[2])
+
+    def record(self, source_path, device_name, stat_info, destination):
+        """记录一个已整理的文件"""
+        key = self._key(source_path, device_name)
+        row = (
+            key[0],
+            device_name,
+            stat_info.st_size,
+            stat_info.st_mtime_ns,
+            str(destination),
+            datetime.now().isoformat(timespec='seconds'),
+        )
+        with self._lock:
+            self._entries[key] = (stat_info.st_size, stat_info.st_mtime_ns, str(destination))
+            if self.read_only:
+                return
+            self._pending.append(row)
+            if len(self._pending) >= FLUSH_BATCH_SIZE:
+                self._flush()
+
+    def _flush(self):
+        if self.read_only or not self._pending:
+            return
+        self._conn.executemany(
+            'INSERT OR REPLACE INTO organized_files '
+            '(source_path, device_name, size, mtime_ns, destination, organized_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            self._pending,
+        )
+        self._conn.commit()
+        self._pending = []
+
+    def close(self):
+        """写入剩余记录并关闭数据库"""
+        with self._lock:
+            if self._conn is None:
+                return
+            self._flush()
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,157 @@
+import multiprocessing
+import os
+from datetime import date
+
+import pytest
+
+import archive_catalog
+from archive_catalog import (
+    CATALOG_FILENAME, KIND_IMAGE, KIND_VIDEO, ArchiveCatalog, CatalogReader, parse_folder_name, rebuild_catalog,
+)
+
+
+@pytest.fixture(params=['numpy', 'struct'])
+def reader_mode(request, monkeypatch):
+    """同样的查询分别用 NumPy 和逐条解析执行"""
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(archive_catalog, 'np', None)
+    return request.param
+
+
+def add_files(root):
+    catalog = ArchiveCatalog(root)
+    catalog.add(root / '20240615 - Cam' / 'a.mp4', 100, 'Cam', kind=KIND_VIDEO, checksum='ab' * 20)
+    catalog.add(root / '20240616 - Cam' / 'b.jpg', 200, 'Cam', kind=KIND_IMAGE)
+    catalog.add(root / '20240616 - Phone' / 'c.mp4', 300, 'Phone', kind=KIND_VIDEO)
+    catalog.add(root / 'misc' / 'd.mp4', 400, 'Phone', date=20240701, kind=KIND_VIDEO)
+    catalog.close()
+
+
+def test_round_trip(tmp_path, reader_mode):
+    add_files(tmp_path)
+    with CatalogReader(tmp_path) as reader:
+        assert reader.count == 4
+        assert reader.devices == ['Cam', 'Phone']
+        first = reader.query(limit=1)[0]
+    assert first == {
+        'path': str(tmp_path / '20240615 - Cam' / 'a.mp4'),
+        'date': '2024-06-15',
+        'device_name': 'Cam',
+        'size': 100,
+        'kind': 'video',
+        'checksum': 'ab' * 20,
+    }
+
+
+def test_query_by_device_and_dates(tmp_path, reader_mode):
+    add_files(tmp_path)
+    with CatalogReader(tmp_path) as reader:
+        names = lambda rows: [os.path.basename(row['path']) for row in rows]
+        assert names(reader.query(device_name='Cam')) == ['a.mp4', 'b.jpg']
+        assert names(reader.query(start_date=date(2024, 6, 16), end_date=date(2024, 6, 30))) == ['b.jpg', 'c.mp4']
+        assert names(reader.query(device_name='Phone', kind=KIND_VIDEO)) == ['c.mp4', 'd.mp4']
+        assert reader.query(device_name='Unknown') == []
+        assert reader.count_matching(kind=KIND_VIDEO) == (3, 800)
+        stats = reader.stats()
+    assert stats['files'] == 4
+    assert stats['bytes'] == 1000
+    assert stats['devices'][1] == {
+        'device_name': 'Phone', 'files': 2, 'bytes': 700, 'first_date': '2024-06-16', 'last_date': '2024-07-01',
+    }
+
+
+def test_appends_across_runs(tmp_path, reader_mode):
+    add_files(tmp_path)
+    catalog = ArchiveCatalog(tmp_path)
+    catalog.add(tmp_path / '20240801 - Drone' / 'e.mp4', 500, 'Drone')
+    catalog.add(tmp_path / '20240802 - Cam' / 'f.mp4', 600, 'Cam')
+    catalog.close()
+    with CatalogReader(tmp_path) as reader:
+        assert reader.devices == ['Cam', 'Phone', 'Drone']
+        assert reader.count_matching(device_name='Cam') == (3, 900)
+        assert reader.query(device_name='Drone')[0]['size'] == 500
+
+
+def test_partial_trailing_record_is_ignored(tmp_path, reader_mode):
+    add_files(tmp_path)
+    with open(tmp_path / CATALOG_FILENAME, 'ab') as f:
+        f.write(b'\x01' * 17)
+    with CatalogReader(tmp_path) as reader:
+        assert reader.count == 4
+        assert len(reader.query()) == 4
+
+
+def test_empty_catalog(tmp_path, reader_mode):
+    with CatalogReader(tmp_path) as reader:
+        assert reader.count == 0
+        assert reader.query() == []
+        assert reader.stats() == {'files': 0, 'bytes': 0, 'devices': []}
+
+
+def test_unknown_format_is_rejected(tmp_path):
+    (tmp_path / CATALOG_FILENAME).write_bytes(b'NOTACATL' + b'\x00' * 8)
+    with pytest.raises(ValueError):
+        CatalogReader(tmp_path)
+
+
+def test_device_ids_are_shared_between_open_catalogs(tmp_path):
+    first = ArchiveCatalog(tmp_path)
+    second = ArchiveCatalog(tmp_path)
+    first.add(tmp_path / '20240615 - Cam' / 'a.mp4', 1, 'Cam')
+    second.add(tmp_path / '20240615 - Phone' / 'b.mp4', 2, 'Phone')
+    second.add(tmp_path / '20240615 - Cam' / 'c.mp4', 3, 'Cam')
+    first.close()
+    second.close()
+    with CatalogReader(tmp_path) as reader:
+        assert reader.devices == ['Cam', 'Phone']
+        assert {row['size']: row['device_name'] for row in reader.query()} == {1: 'Cam', 2: 'Phone', 3: 'Cam'}
+
+
+def _import_device(root, device_name, count):
+    catalog = ArchiveCatalog(root)
+    for i in range(count):
+        catalog.add(root / f"20240615 - {device_name}" / f"{i}.mp4", i, device_name)
+    catalog.close()
+
+
+@pytest.mark.skipif(archive_catalog.fcntl is None, reason="needs fcntl")
+def test_concurrent_processes(tmp_path):
+    context = multiprocessing.get_context('fork')
+    devices = [f"Card{i}" for i in range(6)]
+    processes = [
+        context.Process(target=_import_device, args=(tmp_path, name, 2500)) for name in devices
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+    with CatalogReader(tmp_path) as reader:
+        assert sorted(reader.devices) == devices
+        assert reader.count == 6 * 2500
+        for name in devices:
+            rows = reader.query(device_name=name)
+            assert len(rows) == 2500
+            assert all(os.path.basename(os.path.dirname(row['path'])) == f"20240615 - {name}" for row in rows)
+
+
+def test_rebuild_catalog(tmp_path):
+    for folder, name in (('20240615 - Cam', 'a.mp4'), ('20240616 - Phone', 'b.jpg'), ('notes', 'c.mp4')):
+        (tmp_path / folder).mkdir(exist_ok=True)
+        (tmp_path / folder / name).write_bytes(b'x' * 10)
+    (tmp_path / '20240615 - Cam' / '.hidden.mp4').write_bytes(b'')
+    add_files(tmp_path)
+
+    kinds = {'.mp4': KIND_VIDEO, '.jpg': KIND_IMAGE}
+    assert rebuild_catalog(tmp_path, lambda path: kinds.get(path.suffix)) == 2
+    with CatalogReader(tmp_path) as reader:
+        assert sorted(reader.devices) == ['Cam', 'Phone']
+        assert sorted(row['kind'] for row in reader.query()) == ['image', 'video']
+
+
+def test_parse_folder_name():
+    assert parse_folder_name('20240615 - Sony A7') == (20240615, 'Sony A7')
+    assert parse_folder_name('2024-06-15 - Cam') is None
+    assert parse_folder_name('20240615') is None
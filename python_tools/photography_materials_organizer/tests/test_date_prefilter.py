@@ -0,0 +1,106 @@
+import os
+from datetime import date, datetime
+from types import SimpleNamespace
+
+import pytest
+
+from date_prefilter import DateRangePrefilter, date_from_filename, date_range_from_dirname
+
+
+@pytest.mark.parametrize('name, expected', [
+    ('VID_20240615_123456.mp4', date(2024, 6, 15)),
+    ('IMG_20240615_101010.jpg', date(2024, 6, 15)),
+    ('PXL_20240615_101010123.mp4', date(2024, 6, 15)),
+    ('2024-06-15 12.00.00.jpg', date(2024, 6, 15)),
+    ('20240615123456.jpg', date(2024, 6, 15)),
+    ('DSC01234.JPG', None),
+    ('clip_120240615.mp4', None),
+    ('20241315_000000.mp4', None),
+    ('20240231_000000.mp4', None),
+])
+def test_date_from_filename(name, expected):
+    assert date_from_filename(name) == expected
+
+
+@pytest.mark.parametrize('name, expected', [
+    ('2024', (date(2024, 1, 1), date(2024, 12, 31))),
+    ('2024-02', (date(2024, 2, 1), date(2024, 2, 29))),
+    ('2024_12', (date(2024, 12, 1), date(2024, 12, 31))),
+    ('2024-06-15', (date(2024, 6, 15), date(2024, 6, 15))),
+    ('20240615 - iPhone', (date(2024, 6, 15), date(2024, 6, 15))),
+    ('100_0615', ('monthday', 6, 15)),
+    ('2024-0615', None),
+    ('DCIM', None),
+    ('100CANON', None),
+])
+def test_date_range_from_dirname(name, expected):
+    assert date_range_from_dirname(name) == expected
+
+
+def test_skip_directory_with_slack():
+    prefilter = DateRangePrefilter(date(2024, 6, 10), date(2024, 6, 20))
+    assert prefilter.skip_directory('2023')
+    assert prefilter.skip_directory('2024-05')
+    assert prefilter.skip_directory('20240601 - Cam')
+    # 两端各放宽一天
+    assert not prefilter.skip_directory('20240609 - Cam')
+    assert not prefilter.skip_directory('20240621 - Cam')
+    assert not prefilter.skip_directory('2024')
+    assert not prefilter.skip_directory('DCIM')
+    assert prefilter.counts['directories'] == 3
+
+
+def test_skip_directory_month_day():
+    prefilter = DateRangePrefilter(date(2023, 12, 30), date(2024, 1, 2))
+    assert not prefilter.skip_directory('100_1231')
+    assert not prefilter.skip_directory('101_0101')
+    assert prefilter.skip_directory('102_0615')
+    # 没有结束日期时无法判断年份
+    assert not DateRangePrefilter(date(2024, 1, 1)).skip_directory('102_0615')
+
+
+def test_skip_name():
+    prefilter = DateRangePrefilter(start_date=date(2024, 6, 10))
+    assert prefilter.skip_name('VID_20240601_000000.mp4')
+    assert not prefilter.skip_name('VID_20240609_000000.mp4')
+    assert not prefilter.skip_name('VID_20250101_000000.mp4')
+    assert not prefilter.skip_name('DSC01234.JPG')
+    assert prefilter.counts['by_name'] == 1
+
+
+def test_names_ignored_for_filesystem_dates():
+    prefilter = DateRangePrefilter(date(2024, 6, 10), date(2024, 6, 20), use_names=False)
+    assert not prefilter.skip_directory('2023')
+    assert not prefilter.skip_directory('20240601 - Cam')
+    assert not prefilter.skip_name('VID_20240601_000000.mp4')
+    assert not any(prefilter.counts.values())
+
+
+def test_skip_stat(tmp_path):
+    prefilter = DateRangePrefilter(start_date=date(2024, 6, 10), use_names=False)
+    path = tmp_path / 'clip.mp4'
+    path.write_bytes(b'')
+    old = datetime(2024, 6, 8, 23, 0).timestamp()
+    os.utime(path, (old, old))
+    assert prefilter.skip_stat(os.stat(path))
+    recent = datetime(2024, 6, 9, 1, 0).timestamp()
+    os.utime(path, (recent, recent))
+    assert not prefilter.skip_stat(os.stat(path))
+    assert not DateRangePrefilter(end_date=date(2024, 6, 1)).skip_stat(os.stat(path))
+    assert prefilter.counts['by_mtime'] == 1
+
+
+def test_skip_stat_keeps_files_created_in_range():
+    """macOS 上保留修改时间复制进来的文件：拍摄日期取创建时间，不能按修改时间排除"""
+    prefilter = DateRangePrefilter(start_date=date(2024, 6, 10))
+    old = datetime(2024, 1, 1).timestamp()
+    created = datetime(2024, 6, 12).timestamp()
+    assert not prefilter.skip_stat(SimpleNamespace(st_mtime=old, st_birthtime=created))
+    assert prefilter.skip_stat(SimpleNamespace(st_mtime=old, st_birthtime=old))
+
+
+def test_inactive_without_dates():
+    prefilter = DateRangePrefilter()
+    assert not prefilter.active
+    assert not prefilter.skip_directory('1999')
+    assert prefilter.summary() is None
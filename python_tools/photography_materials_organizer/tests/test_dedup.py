@@ -0,0 +1,115 @@
+import os
+
+import pytest
+
+import dedup
+from dedup import ContentIndex, full_hash, partial_hash
+from scan_index import INDEX_FILENAME
+from video_organizer import organize_videos
+
+BLOCK = 1024
+
+
+@pytest.fixture(autouse=True)
+def small_blocks(monkeypatch):
+    monkeypatch.setattr(dedup, 'PARTIAL_BLOCK_SIZE', BLOCK)
+
+
+def write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path
+
+
+def test_partial_hash_ignores_the_middle(tmp_path):
+    head, tail = os.urandom(BLOCK), os.urandom(BLOCK)
+    a = write(tmp_path / 'a', head + b'a' * 100 + tail)
+    b = write(tmp_path / 'b', head + b'b' * 100 + tail)
+    assert partial_hash(a) == partial_hash(b)
+    assert full_hash(a) != full_hash(b)
+    c = write(tmp_path / 'c', b'x' * 10)
+    assert partial_hash(c) != partial_hash(write(tmp_path / 'd', b'x' * 11))
+
+
+def test_partial_collision_escalates_to_full_hash(tmp_path, monkeypatch):
+    head, tail = os.urandom(BLOCK), os.urandom(BLOCK)
+    original = write(tmp_path / 'archive' / 'a.mp4', head + b'a' * 100 + tail)
+    same_edges = write(tmp_path / 'card' / 'b.mp4', head + b'b' * 100 + tail)
+    copy = write(tmp_path / 'card' / 'c.mp4', original.read_bytes())
+    hashed = []
+    monkeypatch.setattr(dedup, 'full_hash', lambda path: hashed.append(os.path.basename(path)) or full_hash(path))
+
+    with ContentIndex(tmp_path / INDEX_FILENAME) as index:
+        with index.lookup(original, original.stat().st_size) as match:
+            assert match.duplicate is None
+            match.register(original)
+        assert hashed == []
+
+        with index.lookup(same_edges, same_edges.stat().st_size) as match:
+            assert match.duplicate is None
+        assert sorted(hashed) == ['a.mp4', 'b.mp4']
+
+        with index.lookup(copy, copy.stat().st_size) as match:
+            assert match.duplicate == str(original)
+        # 已登记文件的完整哈希只计算一次
+        assert hashed.count('a.mp4') == 1
+
+
+def test_small_files_compare_by_partial_hash(tmp_path, monkeypatch):
+    original = write(tmp_path / 'a.jpg', b'x' * 100)
+    copy = write(tmp_path / 'b.jpg', b'x' * 100)
+    monkeypatch.setattr(dedup, 'full_hash', None)
+    with ContentIndex(tmp_path / INDEX_FILENAME) as index:
+        with index.lookup(original, 100) as match:
+            match.register(original)
+        with index.lookup(copy, 100) as match:
+            assert match.duplicate == str(original)
+
+
+def test_moved_archive_file_is_forgotten(tmp_path):
+    data = os.urandom(3 * BLOCK)
+    original = write(tmp_path / 'a.mp4', data)
+    with ContentIndex(tmp_path / INDEX_FILENAME) as index:
+        with index.lookup(original, len(data)) as match:
+            match.register(original)
+    original.rename(tmp_path / 'moved.mp4')
+
+    copy = write(tmp_path / 'card' / 'a.mp4', data)
+    with ContentIndex(tmp_path / INDEX_FILENAME) as index:
+        with index.lookup(copy, len(data)) as match:
+            assert match.duplicate is None
+
+
+def make_cards(root):
+    """两张存储卡上有一个内容相同的视频"""
+    data = os.urandom(4 * BLOCK)
+    write(root / 'card1' / 'a.mp4', data)
+    write(root / 'card2' / 'copy.mp4', data)
+    write(root / 'card2' / 'other.mp4', os.urandom(4 * BLOCK))
+
+
+def organized(target):
+    """整理后的文件名 -> 路径"""
+    return {path.name: path for path in target.rglob('*.mp4')}
+
+
+def test_skip_mode(tmp_path):
+    make_cards(tmp_path)
+    target = tmp_path / 'target'
+    assert organize_videos(tmp_path / 'card1', target, 'Cam', dedup='skip')
+    assert organize_videos(tmp_path / 'card2', target, 'Phone', dedup='skip')
+    files = organized(target)
+    assert sorted(files) == ['a.mp4', 'other.mp4']
+    assert files['other.mp4'].parent.name.endswith(' - Phone')
+
+
+def test_hardlink_mode(tmp_path):
+    make_cards(tmp_path)
+    target = tmp_path / 'target'
+    assert organize_videos(tmp_path / 'card1', target, 'Cam', dedup='hardlink')
+    assert organize_videos(tmp_path / 'card2', target, 'Phone', dedup='hardlink')
+    files = organized(target)
+    assert sorted(files) == ['a.mp4', 'copy.mp4', 'other.mp4']
+    assert files['copy.mp4'].parent.name.endswith(' - Phone')
+    assert os.path.samefile(files['a.mp4'], files['copy.mp4'])
+    assert not os.path.samefile(files['a.mp4'], files['other.mp4'])
@@ -0,0 +1,124 @@
+import threading
+
+from device_scheduler import DeviceScheduler
+
+
+def run_in_thread(target, *args):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(target(*args)), daemon=True)
+    thread.start()
+    return thread, result
+
+
+def test_devices_take_turns():
+    scheduler = DeviceScheduler(per_device_jobs=1)
+    for key, count in (('fast', 10), ('slow', 3)):
+        scheduler.add_device(key)
+        for i in range(count):
+            scheduler.put(key, f"{key}-{i}", 100)
+        scheduler.finish_device(key)
+
+    served = []
+    # 模拟两个写入线程：快速存储卡排队再多，慢速存储卡也不会被饿死
+    for _ in range(3):
+        tasks = [scheduler.get(), scheduler.get()]
+        served += [task[0] for task in tasks]
+        for key, _, size in tasks:
+            scheduler.task_done(key, size)
+    while True:
+        task = scheduler.get()
+        if task is None:
+            break
+        served.append(task[0])
+        scheduler.task_done(task[0], task[2])
+    assert served == ['fast', 'slow'] * 3 + ['fast'] * 7
+
+
+def test_prefers_device_with_fewer_bytes_in_flight():
+    scheduler = DeviceScheduler(per_device_jobs=2)
+    for key, size in (('big', 1000), ('small', 10)):
+        scheduler.add_device(key)
+        for i in range(3):
+            scheduler.put(key, i, size)
+    picked = [scheduler.get()[0] for _ in range(4)]
+    assert picked == ['big', 'small', 'small', 'big']
+
+
+def test_per_device_limit_blocks_until_task_done():
+    scheduler = DeviceScheduler(per_device_jobs=1)
+    scheduler.add_device('card')
+    scheduler.put('card', 'a', 1)
+    scheduler.put('card', 'b', 1)
+    assert scheduler.get() == ('card', 'a', 1)
+
+    thread, result = run_in_thread(scheduler.get)
+    thread.join(0.2)
+    assert thread.is_alive()
+    scheduler.task_done('card', 1)
+    thread.join(5)
+    assert result == [('card', 'b', 1)]
+
+
+def test_full_device_queue_blocks_reader_and_close_releases_it():
+    scheduler = DeviceScheduler(queue_size=2)
+    scheduler.add_device('card')
+    assert scheduler.put('card', 'a', 1)
+    assert scheduler.put('card', 'b', 1)
+
+    thread, result = run_in_thread(scheduler.put, 'card', 'c', 1)
+    thread.join(0.2)
+    assert thread.is_alive()
+    scheduler.close()
+    thread.join(5)
+    assert result == [False]
+    assert scheduler.queued() == 0
+    assert scheduler.get() is None
+
+
+def test_get_waits_for_unfinished_devices():
+    scheduler = DeviceScheduler()
+    scheduler.add_device('card')
+    thread, result = run_in_thread(scheduler.get)
+    thread.join(0.2)
+    assert thread.is_alive()
+    scheduler.finish_device('card')
+    thread.join(5)
+    assert result == [None]
+
+
+def test_concurrent_readers_and_writers():
+    scheduler = DeviceScheduler(per_device_jobs=2, queue_size=4)
+    devices = {f"card{i}": 50 + i * 25 for i in range(3)}
+    for key in devices:
+        scheduler.add_device(key)
+
+    def reader(key, count):
+        for i in range(count):
+            scheduler.put(key, (key, i), 10)
+        scheduler.finish_device(key)
+
+    done = []
+    lock = threading.Lock()
+
+    def writer():
+        while True:
+            task = scheduler.get()
+            if task is None:
+                return
+            with lock:
+                done.append(task[1])
+            scheduler.task_done(task[0], task[2])
+
+    threads = [threading.Thread(target=reader, args=item) for item in devices.items()]
+    threads += [threading.Thread(target=writer) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert not any(thread.is_alive() for thread in threads)
+
+    assert sorted(done) == sorted((key, i) for key, count in devices.items() for i in range(count))
+    stats = scheduler.stats()
+    for key, count in devices.items():
+        assert stats[key]['files'] == count
+        assert stats[key]['bytes'] == count * 10
@@ -0,0 +1,167 @@
+import errno
+import os
+
+import pytest
+
+import file_transfer
+from file_transfer import TEMP_SUFFIX, remove_partial_files, temp_path_for, transfer_file
+from integrity import ChecksumMismatch, file_checksum
+
+DATA = os.urandom(3 * 1024 * 1024 + 17)
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / 'source' / 'clip.mp4'
+    path.parent.mkdir()
+    path.write_bytes(DATA)
+    os.utime(path, (1700000000, 1700000000))
+    return path
+
+
+@pytest.fixture
+def target(tmp_path):
+    path = tmp_path / 'target'
+    path.mkdir()
+    return path
+
+
+def leftovers(folder):
+    return [name for name in os.listdir(folder) if name.endswith(TEMP_SUFFIX)]
+
+
+def unsupported(code=errno.EXDEV):
+    def fail(*args, **kwargs):
+        raise OSError(code, os.strerror(code))
+    return fail
+
+
+def write_then_fail(fd_index):
+    """写入一些数据后报告不支持，检查回退前是否清空了目标文件"""
+    def fail(*args):
+        os.write(args[fd_index], b'garbage')
+        raise OSError(errno.ENOSYS, os.strerror(errno.ENOSYS))
+    return fail
+
+
+def test_copy(source, target):
+    destination = target / 'clip.mp4'
+    method, checksum = transfer_file(source, destination)
+    assert method == 'copy_file_range'
+    assert checksum is None
+    assert destination.read_bytes() == DATA
+    assert os.stat(destination).st_mtime == 1700000000
+    assert source.exists()
+    assert leftovers(target) == []
+
+
+def test_copy_falls_back_to_sendfile(source, target, monkeypatch):
+    monkeypatch.setattr(file_transfer.os, 'copy_file_range', write_then_fail(1))
+    destination = target / 'clip.mp4'
+    assert transfer_file(source, destination)[0] == 'sendfile'
+    assert destination.read_bytes() == DATA
+    assert leftovers(target) == []
+
+
+def test_copy_falls_back_to_buffer(source, target, monkeypatch):
+    monkeypatch.setattr(file_transfer.os, 'copy_file_range', unsupported(errno.EXDEV))
+    monkeypatch.setattr(file_transfer.os, 'sendfile', write_then_fail(0))
+    monkeypatch.setattr(file_transfer, 'BUFFER_COPY_SIZE', 64 * 1024)
+    destination = target / 'clip.mp4'
+    assert transfer_file(source, destination)[0] == 'buffer'
+    assert destination.read_bytes() == DATA
+    assert leftovers(target) == []
+
+
+def test_copy_error_leaves_no_partial_file(source, target, monkeypatch):
+    monkeypatch.setattr(file_transfer.os, 'copy_file_range', unsupported(errno.EIO))
+    destination = target / 'clip.mp4'
+    with pytest.raises(OSError) as error:
+        transfer_file(source, destination)
+    assert error.value.errno == errno.EIO
+    assert os.listdir(target) == []
+
+
+@pytest.mark.parametrize('mode', ['copy', 'hardlink', 'reflink', 'move'])
+def test_existing_destination_is_not_overwritten(source, target, mode):
+    destination = target / 'clip.mp4'
+    destination.write_bytes(b'existing')
+    with pytest.raises(FileExistsError):
+        transfer_file(source, destination, mode)
+    assert destination.read_bytes() == b'existing'
+    assert source.exists()
+    assert leftovers(target) == []
+
+
+def test_reflink_falls_back_to_copy(source, target, monkeypatch):
+    monkeypatch.setattr(file_transfer.fcntl, 'ioctl', unsupported(errno.EOPNOTSUPP))
+    destination = target / 'clip.mp4'
+    assert transfer_file(source, destination, 'reflink')[0] == 'copy_file_range'
+    assert destination.read_bytes() == DATA
+
+
+def test_reflink_error_leaves_no_partial_file(source, target, monkeypatch):
+    monkeypatch.setattr(file_transfer.fcntl, 'ioctl', unsupported(errno.ENOSPC))
+    with pytest.raises(OSError):
+        transfer_file(source, target / 'clip.mp4', 'reflink')
+    assert os.listdir(target) == []
+
+
+def test_hardlink(source, target):
+    destination = target / 'clip.mp4'
+    assert transfer_file(source, destination, 'hardlink')[0] == 'hardlink'
+    assert os.path.samefile(source, destination)
+
+
+def test_hardlink_falls_back_to_copy(source, target, monkeypatch):
+    # 不支持硬链接时，发布临时文件也退回到检查后重命名
+    monkeypatch.setattr(file_transfer.os, 'link', unsupported(errno.EXDEV))
+    destination = target / 'clip.mp4'
+    assert transfer_file(source, destination, 'hardlink')[0] == 'copy_file_range'
+    assert not os.path.samefile(source, destination)
+    assert destination.read_bytes() == DATA
+    assert leftovers(target) == []
+
+
+def test_move(source, target):
+    destination = target / 'clip.mp4'
+    assert transfer_file(source, destination, 'move')[0] == 'move'
+    assert not source.exists()
+    assert destination.read_bytes() == DATA
+
+
+def test_move_without_hardlinks_renames(source, target, monkeypatch):
+    monkeypatch.setattr(file_transfer.os, 'link', unsupported(errno.EPERM))
+    destination = target / 'clip.mp4'
+    assert transfer_file(source, destination, 'move')[0] == 'move'
+    assert not source.exists()
+    assert destination.read_bytes() == DATA
+
+
+def test_verify_returns_source_checksum(source, target):
+    destination = target / 'clip.mp4'
+    method, checksum = transfer_file(source, destination, verify=True)
+    assert method == 'buffer'
+    assert checksum == file_checksum(source)
+    assert transfer_file(destination, target / 'link.mp4', 'hardlink', verify=True) == ('hardlink', checksum)
+
+
+def test_verify_mismatch_is_not_published(source, target, monkeypatch):
+    monkeypatch.setattr(file_transfer, 'file_checksum', lambda path, drop_cache=False: '0' * 40)
+    destination = target / 'clip.mp4'
+    with pytest.raises(ChecksumMismatch):
+        transfer_file(source, destination, verify=True)
+    assert os.listdir(target) == []
+
+
+def test_unknown_mode(source, target):
+    with pytest.raises(ValueError):
+        transfer_file(source, target / 'clip.mp4', 'symlink')
+
+
+def test_remove_partial_files(target):
+    destination = target / 'clip.mp4'
+    open(temp_path_for(destination), 'wb').close()
+    (target / '.other.mp4.1-2.partial').write_bytes(b'')
+    assert remove_partial_files(destination) == 1
+    assert os.listdir(target) == ['.other.mp4.1-2.partial']
@@ -0,0 +1,105 @@
+import os
+from datetime import datetime
+
+from file_transfer import temp_path_for
+from import_journal import ImportJournal, journal_path_for
+from video_organizer import organize_videos
+
+
+def test_records_survive_reopen(tmp_path):
+    source = tmp_path / 'a.mp4'
+    source.write_bytes(b'data')
+    path = tmp_path / 'journal.jsonl'
+
+    journal = ImportJournal(path)
+    assert not journal.resumed
+    journal.mark_started(source, tmp_path / 'out' / 'a.mp4')
+    journal.mark_done(source, os.stat(source), 'copied')
+    journal.close()
+
+    journal = ImportJournal(path)
+    assert journal.resumed
+    assert len(journal) == 1
+    assert journal.is_done(source, os.stat(source))
+    source.write_bytes(b'changed')
+    assert not journal.is_done(source, os.stat(source))
+    journal.close()
+
+
+def test_truncated_last_line_is_ignored(tmp_path):
+    source = tmp_path / 'a.mp4'
+    source.write_bytes(b'data')
+    path = tmp_path / 'journal.jsonl'
+    journal = ImportJournal(path)
+    journal.mark_done(source, os.stat(source), 'copied')
+    journal.close()
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"op": "done", "source": "/x/b.mp')
+
+    journal = ImportJournal(path)
+    assert len(journal) == 1
+    assert journal.is_done(source, os.stat(source))
+    journal.close()
+
+
+def test_started_files_lose_their_partial_data(tmp_path):
+    destination = tmp_path / 'out' / 'a.mp4'
+    destination.parent.mkdir()
+    partial = temp_path_for(destination)
+    with open(partial, 'wb') as f:
+        f.write(b'half')
+    path = tmp_path / 'journal.jsonl'
+    journal = ImportJournal(path)
+    journal.mark_started(tmp_path / 'a.mp4', destination)
+    journal.close()
+
+    journal = ImportJournal(path)
+    assert journal.resumed
+    assert len(journal) == 0
+    assert not os.path.exists(partial)
+    journal.close()
+
+
+def test_completed_journal_is_removed(tmp_path):
+    path = tmp_path / 'journal.jsonl'
+    ImportJournal(path).close(completed=True)
+    assert not path.exists()
+
+
+def test_journal_path_per_source_and_device(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert journal_path_for(tmp_path, 'card', 'Cam') == journal_path_for(tmp_path, tmp_path / 'card', 'Cam')
+    assert journal_path_for(tmp_path, 'card', 'Cam') != journal_path_for(tmp_path, 'card', 'Phone')
+    assert journal_path_for(tmp_path, 'card', 'Cam') != journal_path_for(tmp_path, 'other', 'Cam')
+
+
+def test_interrupted_import_resumes(tmp_path):
+    source = tmp_path / 'source'
+    source.mkdir()
+    timestamp = datetime(2024, 6, 15, 12, 0, 0).timestamp()
+    for name in ('a.mp4', 'b.mp4', 'c.mp4'):
+        (source / name).write_bytes(name.encode() * 10)
+        os.utime(source / name, (timestamp, timestamp))
+    target = tmp_path / 'target'
+    folder = target / '20240615 - Cam'
+    folder.mkdir(parents=True)
+
+    # 模拟上次导入：a 已完成，b 写到一半时被中断
+    (folder / 'a.mp4').write_bytes((source / 'a.mp4').read_bytes())
+    partial = temp_path_for(folder / 'b.mp4')
+    with open(partial, 'wb') as f:
+        f.write(b'b.')
+    path = journal_path_for(target, source, 'Cam')
+    journal = ImportJournal(path)
+    journal.mark_started(source / 'a.mp4', folder / 'a.mp4')
+    journal.mark_done(source / 'a.mp4', os.stat(source / 'a.mp4'), 'copied', folder / 'a.mp4')
+    journal.mark_started(source / 'b.mp4', folder / 'b.mp4')
+    journal.close()
+    before = os.stat(folder / 'a.mp4').st_mtime_ns
+
+    assert organize_videos(source, target, 'Cam', date_source='filesystem')
+    assert os.stat(folder / 'a.mp4').st_mtime_ns == before
+    for name in ('a.mp4', 'b.mp4', 'c.mp4'):
+        assert (folder / name).read_bytes() == name.encode() * 10
+    assert not os.path.exists(partial)
+    assert not path.exists()
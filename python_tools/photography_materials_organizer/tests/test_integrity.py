@@ -0,0 +1,97 @@
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+
+import pytest
+
+import file_transfer
+from file_transfer import copy_and_hash
+from integrity import (
+    CHECKSUM_DIGEST_SIZE, MANIFEST_FILENAME, ManifestWriter, file_checksum, read_manifest, verify_archive,
+)
+
+MANIFEST_LINE = re.compile(r'^\\?[0-9a-f]{40}  .+$')
+
+
+def blake2b(data):
+    return hashlib.blake2b(data, digest_size=CHECKSUM_DIGEST_SIZE).hexdigest()
+
+
+@pytest.mark.parametrize('size', [0, 100, 64 * 1024, 5 * 64 * 1024 + 3])
+def test_copy_and_hash(tmp_path, monkeypatch, size):
+    # 小缓冲区让多块数据轮流使用三个缓冲区并经过哈希线程
+    monkeypatch.setattr(file_transfer, 'BUFFER_COPY_SIZE', 64 * 1024)
+    data = os.urandom(size)
+    source = tmp_path / 'source'
+    source.write_bytes(data)
+    destination = tmp_path / 'destination'
+    src_fd = os.open(source, os.O_RDONLY)
+    dst_fd = os.open(destination, os.O_WRONLY | os.O_CREAT)
+    try:
+        checksum = copy_and_hash(src_fd, dst_fd)
+    finally:
+        os.close(src_fd)
+        os.close(dst_fd)
+    assert checksum == blake2b(data)
+    assert destination.read_bytes() == data
+    assert file_checksum(destination) == checksum
+
+
+def make_archive(root, names):
+    folder = root / '20240615 - Cam'
+    folder.mkdir(parents=True)
+    writer = ManifestWriter()
+    for name in names:
+        path = folder / name
+        path.write_bytes(name.encode() * 1000)
+        writer.record(path, file_checksum(path))
+    writer.close()
+    return folder
+
+
+def test_manifest_is_b2sum_format(tmp_path):
+    names = ['a.mp4', 'with space.mp4', 'back\\slash.mp4', 'new\nline.mp4']
+    folder = make_archive(tmp_path, names)
+    lines = (folder / MANIFEST_FILENAME).read_text(encoding='utf-8').splitlines()
+    assert len(lines) == len(names)
+    assert all(MANIFEST_LINE.match(line) for line in lines)
+    assert read_manifest(folder) == {name: file_checksum(folder / name) for name in names}
+
+    if shutil.which('b2sum'):
+        result = subprocess.run(
+            ['b2sum', '-l', str(CHECKSUM_DIGEST_SIZE * 8), '-c', MANIFEST_FILENAME],
+            cwd=folder, capture_output=True, text=True,
+        )
+        assert result.returncode == 0, result.stderr
+
+
+def test_manifest_writer_keeps_last_checksum_per_thread(tmp_path):
+    writer = ManifestWriter()
+    writer.record(tmp_path / 'a.mp4', 'ab' * 20)
+    assert writer.take_checksum() == 'ab' * 20
+    assert writer.take_checksum() is None
+    writer.close()
+    assert writer.recorded == 1
+
+
+def test_verify_archive_reports_problems(tmp_path):
+    folder = make_archive(tmp_path, ['ok.mp4', 'corrupt.mp4', 'missing.mp4'])
+    (folder / 'untracked.mp4').write_bytes(b'new')
+    with open(folder / 'corrupt.mp4', 'r+b') as f:
+        f.seek(500)
+        f.write(b'X')
+    os.unlink(folder / 'missing.mp4')
+
+    stats = verify_archive(tmp_path, workers=2)
+    assert stats == {
+        'folders': 1, 'files': 3, 'ok': 1, 'mismatch': 1, 'missing': 1, 'error': 0, 'untracked': 1,
+    }
+
+
+def test_verify_clean_archive(tmp_path):
+    make_archive(tmp_path, ['a.mp4', 'b.mp4'])
+    stats = verify_archive(tmp_path)
+    assert stats['ok'] == 2
+    assert stats['mismatch'] == stats['missing'] == stats['error'] == 0
@@ -0,0 +1,72 @@
+import os
+import threading
+import time
+from datetime import datetime
+
+import job_manager
+from job_manager import JobManager
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+def make_source(root):
+    root.mkdir()
+    path = root / 'a.mp4'
+    path.write_bytes(b'a' * 100)
+    timestamp = datetime(2024, 6, 15, 12, 0, 0).timestamp()
+    os.utime(path, (timestamp, timestamp))
+
+
+def test_job_succeeds(tmp_path):
+    make_source(tmp_path / 'source')
+    manager = JobManager(tmp_path / 'logs')
+    job = manager.submit({
+        'from_dir': str(tmp_path / 'source'), 'to_dir': str(tmp_path / 'target'), 'device_name': 'Cam',
+        'date_source': 'filesystem',
+    })
+    wait_for(lambda: job.done)
+    manager.shutdown()
+    assert job.state == 'succeeded'
+    assert (tmp_path / 'target' / '20240615 - Cam' / 'a.mp4').exists()
+
+
+def test_cancelled_watch_job_is_not_reported_as_succeeded(tmp_path):
+    make_source(tmp_path / 'source')
+    manager = JobManager(tmp_path / 'logs')
+    job = manager.submit({
+        'from_dir': str(tmp_path / 'source'), 'to_dir': str(tmp_path / 'target'), 'device_name': 'Cam',
+        'date_source': 'filesystem', 'watch': True, 'settle_seconds': 0.1,
+    })
+    wait_for(lambda: (tmp_path / 'target' / '20240615 - Cam' / 'a.mp4').exists())
+    assert manager.cancel(job.id)
+    wait_for(lambda: job.done)
+    manager.shutdown()
+    assert job.state == 'cancelled'
+
+
+def test_cancel_queued_job(tmp_path, monkeypatch):
+    release = threading.Event()
+
+    def organize_videos(control, **kwargs):
+        # 第一个任务一直占着唯一的工作线程，直到测试放行
+        release.wait(10)
+        control.checkpoint()
+        return True
+
+    monkeypatch.setattr(job_manager, 'organize_videos', organize_videos)
+    manager = JobManager(tmp_path / 'logs', max_workers=1)
+    params = {'from_dir': str(tmp_path / 'source'), 'to_dir': str(tmp_path / 'target'), 'device_name': 'Cam'}
+    running = manager.submit(params)
+    queued = manager.submit(params)
+    assert manager.cancel(queued.id)
+    assert queued.state == 'cancelled'
+    assert manager.cancel(running.id)
+    release.set()
+    wait_for(lambda: running.done)
+    manager.shutdown()
+    assert running.state == 'cancelled'
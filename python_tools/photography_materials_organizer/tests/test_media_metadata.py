@@ -0,0 +1,162 @@
+import struct
+from datetime import datetime, timezone
+
+import pytest
+
+from media_metadata import QUICKTIME_EPOCH_OFFSET, read_capture_date
+
+
+def tiff(endian='<', original=None, modified=None):
+    """生成只包含 IFD0 (DateTime) 和 Exif IFD (DateTimeOriginal) 的最小 TIFF 结构"""
+    ifd0 = []
+    exif = []
+    if modified:
+        ifd0.append((0x0132, modified))
+    if original:
+        ifd0.append((0x8769, None))
+        exif.append((0x9003, original))
+    ifd0_offset = 8
+    exif_offset = ifd0_offset + 2 + len(ifd0) * 12 + 4
+    data_offset = exif_offset + (2 + len(exif) * 12 + 4 if exif else 0)
+    data = b''
+
+    def ifd(entries):
+        nonlocal data
+        out = struct.pack(endian + 'H', len(entries))
+        for tag, value in entries:
+            if value is None:
+                out += struct.pack(endian + 'HHII', tag, 4, 1, exif_offset)
+            else:
+                raw = value.encode('ascii') + b'\x00'
+                out += struct.pack(endian + 'HHII', tag, 2, len(raw), data_offset + len(data))
+                data += raw
+        return out + b'\x00\x00\x00\x00'
+
+    body = ifd(ifd0) + (ifd(exif) if exif else b'')
+    magic = b'II' if endian == '<' else b'MM'
+    return magic + struct.pack(endian + 'HI', 42, ifd0_offset) + body + data
+
+
+def jpeg(tiff_data):
+    app0 = b'\xff\xe0' + struct.pack('>H', 16) + b'JFIF\x00' + b'\x00' * 9
+    app1 = b'\xff\xe1' + struct.pack('>H', 2 + 6 + len(tiff_data)) + b'Exif\x00\x00' + tiff_data
+    return b'\xff\xd8' + app0 + app1 + b'\xff\xda\x00\x02' + b'\x00' * 32
+
+
+def box(box_type, payload):
+    return struct.pack('>I4s', 8 + len(payload), box_type) + payload
+
+
+def mvhd(seconds, version=0):
+    if version == 1:
+        payload = bytes([1, 0, 0, 0]) + struct.pack('>QQ', seconds, seconds) + b'\x00' * 88
+    else:
+        payload = bytes([0, 0, 0, 0]) + struct.pack('>II', seconds, seconds) + b'\x00' * 88
+    return box(b'mvhd', payload)
+
+
+def quicktime_time(value):
+    return int(value.replace(tzinfo=timezone.utc).timestamp()) + QUICKTIME_EPOCH_OFFSET
+
+
+def write(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return path
+
+
+def test_jpeg_prefers_original_date(tmp_path):
+    data = jpeg(tiff(original='2024:06:15 08:30:00', modified='2025:01:01 00:00:00'))
+    assert read_capture_date(write(tmp_path, 'a.jpg', data)) == datetime(2024, 6, 15, 8, 30)
+
+
+def test_jpeg_falls_back_to_datetime(tmp_path):
+    data = jpeg(tiff(modified='2023:02:03 04:05:06'))
+    assert read_capture_date(write(tmp_path, 'a.JPEG', data)) == datetime(2023, 2, 3, 4, 5, 6)
+
+
+@pytest.mark.parametrize('endian', ['<', '>'])
+def test_tiff_raw(tmp_path, endian):
+    data = tiff(endian, original='2022:12:31 23:59:59')
+    assert read_capture_date(write(tmp_path, 'a.dng', data)) == datetime(2022, 12, 31, 23, 59, 59)
+
+
+def test_exif_without_date(tmp_path):
+    assert read_capture_date(write(tmp_path, 'a.jpg', jpeg(tiff()))) is None
+    assert read_capture_date(write(tmp_path, 'b.jpg', jpeg(tiff(original='0000:00:00 00:00:00')))) is None
+
+
+@pytest.mark.parametrize('version', [0, 1])
+def test_quicktime_mvhd(tmp_path, version):
+    utc = datetime(2024, 6, 15, 12, 0, 0)
+    moov = box(b'moov', mvhd(quicktime_time(utc), version) + box(b'trak', b'\x00' * 16))
+    data = box(b'ftyp', b'isom\x00\x00\x02\x00') + box(b'mdat', b'\x00' * 1024) + moov
+    expected = utc.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    assert read_capture_date(write(tmp_path, 'a.mp4', data)) == expected
+
+
+def test_quicktime_after_header_window(tmp_path):
+    """moov 位于文件末尾（超出首次读取的文件头）时也能读到"""
+    utc = datetime(2021, 3, 4, 5, 6, 7)
+    data = box(b'ftyp', b'qt  \x00\x00\x00\x00') + box(b'mdat', b'\x00' * (200 * 1024))
+    data += box(b'moov', mvhd(quicktime_time(utc)))
+    expected = utc.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    assert read_capture_date(write(tmp_path, 'a.mov', data)) == expected
+
+
+def test_quicktime_without_creation_time(tmp_path):
+    data = box(b'ftyp', b'isom\x00\x00\x02\x00') + box(b'moov', mvhd(0))
+    assert read_capture_date(write(tmp_path, 'a.mp4', data)) is None
+
+
+def test_heif_exif_item(tmp_path):
+    exif_payload = b'\x00\x00\x00\x00' + tiff(original='2024:01:02 03:04:05')
+    ftyp = box(b'ftyp', b'heic\x00\x00\x00\x00')
+    infe = box(b'infe', bytes([2, 0, 0, 0]) + struct.pack('>HH', 7, 0) + b'Exif' + b'\x00')
+    iinf = box(b'iinf', bytes([0, 0, 0, 0]) + struct.pack('>H', 1) + infe)
+
+    def iloc(offset):
+        # version 0, offset_size=4, length_size=4, base_offset_size=0
+        payload = bytes([0, 0, 0, 0, 0x44, 0x00]) + struct.pack('>H', 1)
+        payload += struct.pack('>HHH', 7, 0, 1) + struct.pack('>II', offset, len(exif_payload))
+        return box(b'iloc', payload)
+
+    def meta(offset):
+        return box(b'meta', bytes([0, 0, 0, 0]) + iinf + iloc(offset))
+
+    exif_offset = len(ftyp) + len(meta(0)) + 8
+    data = ftyp + meta(exif_offset) + box(b'mdat', exif_payload)
+    assert read_capture_date(write(tmp_path, 'a.heic', data)) == datetime(2024, 1, 2, 3, 4, 5)
+
+
+def test_avchd_mdpm(tmp_path):
+    tags = bytes([0x18, 0x00, 0x20, 0x24, 0x06]) + bytes([0x19, 0x15, 0x13, 0x45, 0x30])
+    data = b'\x47' * 500 + b'MDPM' + bytes([2]) + tags + b'\x00' * 100
+    assert read_capture_date(write(tmp_path, '00001.MTS', data)) == datetime(2024, 6, 15, 13, 45, 30)
+
+
+def test_avchd_invalid_bcd(tmp_path):
+    tags = bytes([0x18, 0x00, 0x20, 0x2A, 0x06]) + bytes([0x19, 0x15, 0x13, 0x45, 0x30])
+    data = b'MDPM' + bytes([2]) + tags
+    assert read_capture_date(write(tmp_path, '00001.mts', data)) is None
+
+
+def test_sony_xml_keeps_local_time(tmp_path):
+    data = b'<NonRealTimeMeta><CreationDate value="2024-06-15T08:00:00+09:00"/></NonRealTimeMeta>'
+    assert read_capture_date(write(tmp_path, 'C0001M01.XML', data)) == datetime(2024, 6, 15, 8, 0)
+
+
+@pytest.mark.parametrize('name, data', [
+    ('a.jpg', b'\xff\xd8\xff\xe1\x00'),
+    ('a.jpg', b'not a jpeg'),
+    ('a.mp4', b'\x00\x00\x00'),
+    ('a.dng', b'II*\x00\xff\xff\xff\xff'),
+    ('a.heic', b''),
+    ('a.txt', b'2024:06:15 08:30:00'),
+])
+def test_unreadable_files(tmp_path, name, data):
+    assert read_capture_date(write(tmp_path, name, data)) is None
+
+
+def test_missing_file(tmp_path):
+    assert read_capture_date(tmp_path / 'missing.jpg') is None
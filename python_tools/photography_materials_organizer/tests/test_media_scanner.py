@@ -0,0 +1,92 @@
+import os
+import threading
+
+import pytest
+
+from media_scanner import scan_files
+
+
+@pytest.fixture
+def tree(tmp_path):
+    for relative in (
+        'a.mp4', 'notes.txt', 'DCIM/100CANON/b.MP4', 'DCIM/100CANON/c.jpg', 'DCIM/101CANON/d.mov',
+        '.hidden/e.mp4', 'DCIM/.f.mp4', '.Trashes/g.mp4', '@eaDir/h.mp4', 'deep/1/2/3/4/i.mp4',
+    ):
+        path = tmp_path / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'x' * len(relative))
+    return tmp_path
+
+
+def found(root, **kwargs):
+    return sorted(os.path.relpath(path, root) for path, _ in scan_files(root, **kwargs))
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_filters_by_extension(tree, workers):
+    counter = {'total': 0}
+    assert found(tree, extensions={'.mp4', '.mov'}, skip_hidden=True, workers=workers, counter=counter) == [
+        'DCIM/100CANON/b.MP4', 'DCIM/101CANON/d.mov', 'a.mp4', 'deep/1/2/3/4/i.mp4',
+    ]
+    # 隐藏目录和系统目录中的文件不计入总数，同一目录中的隐藏文件计入
+    assert counter['total'] == 7
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_hidden_files_can_be_included(tree, workers):
+    assert found(tree, extensions={'.mp4'}, skip_hidden=False, workers=workers) == [
+        '.hidden/e.mp4', 'DCIM/.f.mp4', 'DCIM/100CANON/b.MP4', 'a.mp4', 'deep/1/2/3/4/i.mp4',
+    ]
+
+
+def test_stat_results_are_returned(tree):
+    results = dict(scan_files(tree, extensions={'.jpg'}))
+    assert [stat_info.st_size for stat_info in results.values()] == [len('DCIM/100CANON/c.jpg')]
+
+
+class Prefilter:
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+
+    def skip_directory(self, name):
+        return name == '101CANON'
+
+    def skip_name(self, name):
+        if name == self.fail_on:
+            raise RuntimeError(f"bad name {name}")
+        return name.startswith('b')
+
+    def skip_stat(self, stat_info):
+        return False
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_prefilter(tree, workers):
+    assert found(tree, extensions={'.mp4', '.mov'}, skip_hidden=True, workers=workers, prefilter=Prefilter()) == [
+        'a.mp4', 'deep/1/2/3/4/i.mp4',
+    ]
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_unexpected_errors_are_raised(tree, workers):
+    result = []
+
+    def scan():
+        try:
+            found(tree, extensions={'.mp4'}, workers=workers, prefilter=Prefilter(fail_on='i.mp4'))
+        except RuntimeError as e:
+            result.append(e)
+
+    thread = threading.Thread(target=scan, daemon=True)
+    thread.start()
+    thread.join(10)
+    assert not thread.is_alive(), "scan hung"
+    assert str(result[0]) == "bad name i.mp4"
+
+
+def test_hidden_files_are_included_by_default(tree):
+    paths = found(tree, extensions={'.mp4'})
+    assert '.hidden/e.mp4' in paths
+    assert 'DCIM/.f.mp4' in paths
+    assert '.Trashes/g.mp4' not in paths
+    assert '@eaDir/h.mp4' not in paths
@@ -0,0 +1,73 @@
+import os
+import threading
+from datetime import datetime
+
+from video_organizer import organize_videos, run_pipeline
+
+
+def make_source(root, count=12):
+    """在 root 下生成 count 个视频文件"""
+    for i in range(count):
+        (root / f"clip_{i:02d}.mp4").write_bytes(os.urandom(1024 + i))
+
+
+def tree(root):
+    return {
+        os.path.relpath(os.path.join(folder, name), root): open(os.path.join(folder, name), 'rb').read()
+        for folder, _, names in os.walk(root)
+        for name in names
+        if not name.startswith('.')
+    }
+
+
+def test_run_pipeline_handles_every_item():
+    results = {}
+    lock = threading.Lock()
+
+    def on_result(item, result):
+        with lock:
+            results[item] = result
+
+    run_pipeline(range(100), lambda item: item * 2, 4, on_result)
+    assert results == {item: item * 2 for item in range(100)}
+
+
+def test_run_pipeline_reports_handler_errors_as_failed():
+    results = {}
+
+    def handler(item):
+        if item == 3:
+            raise OSError("boom")
+        return "copied"
+
+    run_pipeline(range(5), handler, 2, results.__setitem__)
+    assert results[3] == "failed"
+    assert [results[i] for i in (0, 1, 2, 4)] == ["copied"] * 4
+
+
+def test_parallel_import_matches_sequential(tmp_path):
+    source = tmp_path / 'source'
+    source.mkdir()
+    make_source(source)
+
+    assert organize_videos(source, tmp_path / 'sequential', 'Cam', jobs=1)
+    assert organize_videos(source, tmp_path / 'parallel', 'Cam', jobs=4)
+
+    sequential = tree(tmp_path / 'sequential')
+    assert sorted(os.path.basename(path) for path in sequential) == [f"clip_{i:02d}.mp4" for i in range(12)]
+    assert tree(tmp_path / 'parallel') == sequential
+
+
+def test_hidden_files_are_imported_unless_skipped(tmp_path):
+    source = tmp_path / 'source'
+    (source / '.thumbnails').mkdir(parents=True)
+    (source / '.Trashes').mkdir()
+    timestamp = datetime(2024, 6, 15, 12, 0, 0).timestamp()
+    for path in (source / 'a.mp4', source / '.thumbnails' / 'b.mp4', source / '.Trashes' / 'c.mp4'):
+        path.write_bytes(b'x')
+        os.utime(path, (timestamp, timestamp))
+
+    assert organize_videos(source, tmp_path / 'all', 'Cam', date_source='filesystem')
+    assert sorted(os.listdir(tmp_path / 'all' / '20240615 - Cam')) == ['a.mp4', 'b.mp4']
+    assert organize_videos(source, tmp_path / 'visible', 'Cam', date_source='filesystem', skip_hidden=True)
+    assert os.listdir(tmp_path / 'visible' / '20240615 - Cam') == ['a.mp4']
@@ -0,0 +1,84 @@
+import json
+import os
+from datetime import datetime
+
+from video_organizer import apply_plan, organize_videos, read_plan, read_plan_summary
+
+
+def make_source(root):
+    for name, day in (('a.mp4', 15), ('b.mp4', 15), ('c.mov', 16)):
+        path = root / name
+        path.write_bytes(name.encode() * 100)
+        timestamp = datetime(2024, 6, day, 12, 0, 0).timestamp()
+        os.utime(path, (timestamp, timestamp))
+
+
+def test_plan_does_not_touch_target(tmp_path):
+    source = tmp_path / 'source'
+    source.mkdir()
+    make_source(source)
+    plan = tmp_path / 'plan.jsonl'
+
+    assert organize_videos(source, tmp_path / 'target', 'Cam', date_source='filesystem', plan_path=plan)
+    assert not (tmp_path / 'target').exists()
+
+    header, entries = read_plan(plan)
+    entries = list(entries)
+    assert header['from_dir'] == str(source)
+    assert sorted(os.path.basename(entry['destination']) for entry in entries) == ['a.mp4', 'b.mp4', 'c.mov']
+    assert all(entry['action'] == 'copy' for entry in entries)
+    summary = read_plan_summary(plan)
+    assert sorted(os.path.basename(folder) for folder in summary['folders']) == ['20240615 - Cam', '20240616 - Cam']
+
+
+def test_relative_plan_applies_from_other_directory(tmp_path, monkeypatch):
+    source = tmp_path / 'source'
+    source.mkdir()
+    make_source(source)
+    plan = tmp_path / 'plan.jsonl'
+
+    monkeypatch.chdir(tmp_path)
+    assert organize_videos('source', 'target', 'Cam', date_source='filesystem', plan_path=plan)
+    header, _ = read_plan(plan)
+    assert header['to_dir'] == str(tmp_path / 'target')
+
+    elsewhere = tmp_path / 'elsewhere'
+    elsewhere.mkdir()
+    monkeypatch.chdir(elsewhere)
+    assert apply_plan(plan, jobs=2)
+    assert not (elsewhere / 'target').exists()
+    assert (tmp_path / 'target' / '20240615 - Cam' / 'a.mp4').read_bytes() == b'a.mp4' * 100
+    assert (tmp_path / 'target' / '20240615 - Cam' / 'b.mp4').exists()
+    assert (tmp_path / 'target' / '20240616 - Cam' / 'c.mov').exists()
+    assert (source / 'a.mp4').exists()
+
+
+def test_apply_plan_rejects_relative_paths(tmp_path):
+    source = tmp_path / 'source'
+    source.mkdir()
+    make_source(source)
+    plan = tmp_path / 'plan.jsonl'
+    assert organize_videos(source, tmp_path / 'target', 'Cam', date_source='filesystem', plan_path=plan)
+
+    lines = plan.read_text(encoding='utf-8').splitlines()
+    header = json.loads(lines[0])
+    header['to_dir'] = 'target'
+    plan.write_text('\n'.join([json.dumps(header)] + lines[1:]) + '\n', encoding='utf-8')
+
+    assert not apply_plan(plan)
+    assert not (tmp_path / 'target').exists()
+
+
+def test_apply_plan_fails_changed_sources(tmp_path):
+    source = tmp_path / 'source'
+    source.mkdir()
+    make_source(source)
+    plan = tmp_path / 'plan.jsonl'
+    assert organize_videos(source, tmp_path / 'target', 'Cam', date_source='filesystem', plan_path=plan)
+
+    (source / 'b.mp4').write_bytes(b'changed')
+    (source / 'c.mov').unlink()
+    assert apply_plan(plan)
+    assert (tmp_path / 'target' / '20240615 - Cam' / 'a.mp4').exists()
+    assert not (tmp_path / 'target' / '20240615 - Cam' / 'b.mp4').exists()
+    assert not (tmp_path / 'target' / '20240616 - Cam' / 'c.mov').exists()
@@ -0,0 +1,78 @@
+import logging
+import os
+import re
+
+from scan_index import INDEX_FILENAME, ScanIndex
+from video_organizer import organize_videos
+
+
+def summary_count(caplog, label):
+    """取出最近一次整理的统计日志中 label 对应的数量"""
+    pattern = re.compile(re.escape(label) + r': (\d+)$')
+    counts = [int(match.group(1)) for match in map(pattern.match, caplog.messages) if match]
+    caplog.clear()
+    return counts[-1]
+
+
+def test_records_survive_reopen(tmp_path):
+    source = tmp_path / 'a.mp4'
+    source.write_bytes(b'data')
+    destination = tmp_path / 'out.mp4'
+    destination.write_bytes(b'data')
+
+    with ScanIndex(tmp_path / INDEX_FILENAME) as index:
+        assert not index.is_unchanged(source, 'Cam', os.stat(source))
+        index.record(source, 'Cam', os.stat(source), destination)
+        assert index.is_unchanged(source, 'Cam', os.stat(source))
+
+    with ScanIndex(tmp_path / INDEX_FILENAME) as index:
+        assert len(index) == 1
+        assert index.is_unchanged(source, 'Cam', os.stat(source))
+        assert not index.is_unchanged(source, 'Phone', os.stat(source))
+        source.write_bytes(b'changed')
+        assert not index.is_unchanged(source, 'Cam', os.stat(source))
+
+
+def test_missing_destination_is_not_unchanged(tmp_path):
+    source = tmp_path / 'a.mp4'
+    source.write_bytes(b'data')
+    destination = tmp_path / 'out.mp4'
+    destination.write_bytes(b'data')
+    with ScanIndex(tmp_path / INDEX_FILENAME) as index:
+        index.record(source, 'Cam', os.stat(source), destination)
+    destination.unlink()
+    with ScanIndex(tmp_path / INDEX_FILENAME) as index:
+        assert not index.is_unchanged(source, 'Cam', os.stat(source))
+
+
+def test_read_only_index_does_not_write(tmp_path):
+    source = tmp_path / 'a.mp4'
+    source.write_bytes(b'data')
+    with ScanIndex(tmp_path / INDEX_FILENAME, read_only=True) as index:
+        index.record(source, 'Cam', os.stat(source), source)
+        assert index.is_unchanged(source, 'Cam', os.stat(source))
+    assert not (tmp_path / INDEX_FILENAME).exists()
+
+
+def test_rerun_skips_unchanged_files(tmp_path, caplog):
+    caplog.set_level(logging.INFO)
+    source = tmp_path / 'source'
+    source.mkdir()
+    for name in ('a.mp4', 'b.mp4'):
+        (source / name).write_bytes(name.encode() * 10)
+    target = tmp_path / 'target'
+
+    def run():
+        assert organize_videos(source, target, 'Cam', use_index=True)
+
+    run()
+    assert summary_count(caplog, '成功复制') == 2
+    run()
+    assert summary_count(caplog, '索引命中（未变化）') == 2
+
+    # 整理后的文件被删除后重新导入
+    organized, = target.rglob('a.mp4')
+    organized.unlink()
+    run()
+    assert summary_count(caplog, '成功复制') == 1
+    assert organized.exists()
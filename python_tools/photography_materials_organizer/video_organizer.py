@@ -6,12 +6,48 @@
 """
 
 import os
-import shutil
+import json
 import argparse
+import queue
+import threading
+import time
+from contextlib import nullcontext
 from datetime import datetime, date
 from pathlib import Path
 import logging
 
+from scan_index import ScanIndex, INDEX_FILENAME
+from dedup import ContentIndex
+from media_metadata import read_capture_date
+from file_transfer import transfer_file, LINK_MODES
+from integrity import ManifestWriter, verify_archive, read_manifest, MANIFEST_FILENAME
+from media_proxies import ProxyGenerator, PROXY_DIRNAME
+from archive_catalog import (
+    ArchiveCatalog, CatalogReader, rebuild_catalog, KIND_VIDEO, KIND_IMAGE
+)
+from media_scanner import scan_files
+from date_prefilter import DateRangePrefilter
+from folder_watcher import FolderWatcher, SETTLE_SECONDS
+from import_journal import ImportJournal, journal_path_for
+from import_metrics import ImportMetrics, PHASE_NAMES, format_progress, format_phases
+from device_scheduler import DeviceScheduler
+
+# 重复文件处理方式: off (不去重), skip (跳过), hardlink (硬链接到已有文件)
+DEDUP_MODES = ('off', 'skip', 'hardlink')
+
+# 拍摄日期来源: metadata (优先读取文件内嵌的拍摄时间), filesystem (仅使用文件系统时间)
+DATE_SOURCES = ('metadata', 'filesystem')
+
+# 整理计划文件格式版本
+PLAN_FORMAT_VERSION = 1
+
+# 预设配置文件路径（与 Web UI 共用）
+PRESETS_FILE = Path(__file__).parent / "presets.json"
+
+# 估算计划耗时使用的默认复制速度 (MB/s)，以及每次元数据操作（硬链接/克隆/重命名）的耗时（秒）
+DEFAULT_ESTIMATE_SPEED_MB = 100
+METADATA_OP_SECONDS = 0.001
+
 # 支持的视频文件扩展名
 VIDEO_EXTENSIONS = {
     '.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.webm', 
@@ -78,6 +114,24 @@ def is_image_file(file_path):
     """检查文件是否为图片文件"""
     return file_path.suffix.lower() in IMAGE_EXTENSIONS
 
+def media_kind(file_path):
+    """返回归档目录中使用的文件类型，不是媒体文件时返回 None"""
+    if is_video_file(file_path):
+        return KIND_VIDEO
+    if is_image_file(file_path):
+        return KIND_IMAGE
+    return None
+
+def media_extensions(file_type):
+    """返回指定文件类型对应的扩展名集合"""
+    if file_type == 'video':
+        return VIDEO_EXTENSIONS
+    elif file_type == 'image':
+        return IMAGE_EXTENSIONS
+    elif file_type == 'all':
+        return VIDEO_EXTENSIONS | IMAGE_EXTENSIONS
+    return set()
+
 def is_media_file(file_path, file_type):
     """根据指定类型检查文件是否为媒体文件"""
     if file_type == 'video':
@@ -88,18 +142,20 @@ def is_media_file(file_path, file_type):
         return is_video_file(file_path) or is_image_file(file_path)
     return False
 
-def get_file_creation_date(file_path):
-    """获取文件创建时间"""
+def get_file_creation_date(file_path, stat_info=None):
+    """获取文件创建时间，已有 stat 结果时可通过 stat_info 传入以免重复 stat"""
     try:
         # 在 macOS 和 Linux 上使用 stat().st_birthtime (如果可用) 或 st_ctime
-        stat_info = file_path.stat()
+        if stat_info is None:
+            stat_info = file_path.stat()
         
         # 尝试获取真正的创建时间 (macOS)
         if hasattr(stat_info, 'st_birthtime'):
             creation_time = stat_info.st_birthtime
         else:
-            # 在 Linux 上使用 ctime
-            creation_time = stat_info.st_ctime
+            # Linux 上的 ctime 是 inode 变更时间（通常就是复制时间），
+            # 修改时间会被相机和常见的复制工具保留，更接近拍摄时间
+            creation_time = stat_info.st_mtime
             
         return datetime.fromtimestamp(creation_time)
     except Exception as e:
@@ -107,6 +163,28 @@ def get_file_creation_date(file_path):
         # 回退到修改时间
         return datetime.fromtimestamp(file_path.stat().st_mtime)
 
+def get_media_date(file_path, use_metadata=True, cache=None, stat_info=None):
+    """获取媒体文件的拍摄日期
+
+    优先从 EXIF、QuickTime mvhd、AVCHD 等内嵌元数据中读取（只读取文件头部），
+    无法读取时回退到文件系统时间。cache 为可选的字典，同一次运行中每个文件只解析一次
+    """
+    key = str(file_path)
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    
+    capture_date = read_capture_date(file_path) if use_metadata else None
+    if capture_date is None:
+        if use_metadata:
+            logging.debug(f"未找到内嵌拍摄时间，使用文件系统时间: {file_path}")
+        capture_date = get_file_creation_date(file_path, stat_info)
+    
+    if cache is not None:
+        cache[key] = capture_date
+    return capture_date
+
 def create_date_folder_name(date, device_name):
     """创建日期文件夹名称"""
     date_str = date.strftime('%Y%m%d')
@@ -117,28 +195,539 @@ def ensure_folder_exists(folder_path):
     folder_path.mkdir(parents=True, exist_ok=True)
     logging.info(f"文件夹已创建或已存在: {folder_path}")
 
-def copy_media_file(source_file, destination_folder):
-    """复制媒体文件到目标文件夹"""
+class FolderCache:
+    """一次整理运行中已确认存在的目标文件夹
+
+    每个文件夹只在第一次用到时调用一次 mkdir，之后直接命中内存中的集合；
+    新建的文件夹在运行结束时由 log_summary 统一输出，而不是每个文件输出一行日志。
+    可以在多个工作线程中同时使用。
+    """
+
+    def __init__(self):
+        self._folders = set()
+        self._lock = threading.Lock()
+        self.created = []
+        self.mkdir_calls = 0
+        self.cache_hits = 0
+
+    def ensure(self, folder_path):
+        """确保文件夹存在，返回本次是否新建了该文件夹"""
+        with self._lock:
+            if folder_path in self._folders:
+                self.cache_hits += 1
+                return False
+            self.mkdir_calls += 1
+            try:
+                folder_path.mkdir(parents=True)
+                created = True
+                self.created.append(folder_path)
+                logging.debug(f"文件夹已创建: {folder_path}")
+            except FileExistsError:
+                created = False
+            self._folders.add(folder_path)
+            return created
+
+    def precreate(self, folders):
+        """一次性创建一组文件夹（如整理计划中的全部目标文件夹），返回新建的数量"""
+        return sum(self.ensure(folder) for folder in sorted(set(folders)))
+
+    def stats(self):
+        """返回计数器：已知文件夹数、新建数、mkdir 调用次数、缓存命中次数"""
+        return {
+            'folders': len(self._folders),
+            'created': len(self.created),
+            'mkdir_calls': self.mkdir_calls,
+            'cache_hits': self.cache_hits,
+        }
+
+    def log_summary(self, max_listed=10):
+        """输出新建文件夹的汇总（最多列出 max_listed 个）"""
+        if not self.created:
+            return
+        names = ", ".join(folder.name for folder in sorted(self.created)[:max_listed])
+        more = " 等" if len(self.created) > max_listed else ""
+        logging.info(f"新建文件夹 {len(self.created)} 个: {names}{more}")
+
+def copy_media_file(source_file, destination_folder, link_mode='copy', durable=False, manifest=None):
+    """复制媒体文件到目标文件夹
+
+    link_mode 为 copy / hardlink / reflink / move，见 file_transfer.transfer_file；
+    数据先写入临时文件再原子发布，durable 为 True 时发布前 fsync；
+    manifest 为 integrity.ManifestWriter 时校验复制的数据，并把校验和记录到目标文件夹的校验清单
+    """
     try:
         destination_file = destination_folder / source_file.name
         
         # 如果目标文件已存在，则跳过
-        if destination_file.exists():
+        # 目标文件以独占方式创建，并发复制同名文件时只有一个线程能成功
+        try:
+            method, checksum = transfer_file(
+                source_file, destination_file, link_mode, durable, verify=manifest is not None
+            )
+        except FileExistsError:
             logging.info(f"文件已存在，跳过: {destination_file}")
             return "skipped"
-        
-        shutil.copy2(source_file, destination_file)
-        logging.info(f"文件已复制: {source_file.name} -> {destination_file}")
+        if manifest is not None:
+            manifest.record(destination_file, checksum)
+        logging.info(f"文件已复制 ({method}): {source_file.name} -> {destination_file}")
         return "copied"
         
     except Exception as e:
         logging.error(f"复制文件失败 {source_file} -> {destination_folder}: {e}")
         return "failed"
 
-def organize_videos(from_dir, to_dir, device_name, file_type='video', start_date=None, end_date=None):
-    """整理媒体文件的主要函数"""
-    from_path = Path(from_dir)
-    to_path = Path(to_dir)
+def iter_media_files(from_path, file_type, counter=None, skip_hidden=False, scan_workers=1, metrics=None,
+                     prefilter=None):
+    """遍历源文件夹，逐个产出指定类型的媒体文件 (Path, stat 结果)
+
+    counter 为可选的字典，用于累计扫描到的文件总数 (键 'total')；
+    skip_hidden、scan_workers、metrics 和 prefilter 见 media_scanner.scan_files
+    """
+    for path, stat_info in scan_files(
+        from_path, media_extensions(file_type), skip_hidden=skip_hidden, workers=scan_workers,
+        counter=counter, metrics=metrics, prefilter=prefilter
+    ):
+        yield Path(path), stat_info
+
+def link_duplicate_file(existing_file, destination_file):
+    """把重复文件硬链接到目标位置，失败时（如跨文件系统）只跳过不复制"""
+    try:
+        os.link(existing_file, destination_file)
+    except FileExistsError:
+        logging.info(f"文件已存在，跳过: {destination_file}")
+        return "skipped"
+    except OSError as e:
+        logging.warning(f"无法创建硬链接 {existing_file} -> {destination_file}: {e}，按重复文件跳过")
+        return "duplicate"
+    logging.info(f"重复文件已硬链接: {destination_file} -> {existing_file}")
+    return "linked"
+
+class OrganizeContext:
+    """一次整理运行的配置和共享状态，由 organize_videos / apply_plan 创建后传给每个文件的处理函数
+
+    index 为 ScanIndex，content_index 为 ContentIndex，journal 为 ImportJournal，不使用时为 None；
+    get_date(file_path, stat_info) 用于获取文件日期，默认使用文件系统时间；
+    durable 为 True 时复制的数据在发布前 fsync 到磁盘；
+    metrics 为 ImportMetrics，用于统计各阶段耗时；folders 为本次运行共享的 FolderCache；
+    manifest 为 integrity.ManifestWriter 时校验复制的文件并记录校验和；
+    proxies 为 media_proxies.ProxyGenerator 时整理好的视频会提交给它生成封面图和代理文件；
+    catalog 为 archive_catalog.ArchiveCatalog 时新放入目标文件夹的文件会登记到归档目录
+    """
+
+    def __init__(self, to_path, device_name, start_date=None, end_date=None, index=None,
+                 content_index=None, dedup_mode='off', link_mode='copy', get_date=None,
+                 journal=None, durable=False, metrics=None, folders=None, manifest=None, proxies=None,
+                 catalog=None):
+        self.to_path = to_path
+        self.device_name = device_name
+        self.start_date = start_date
+        self.end_date = end_date
+        self.index = index
+        self.content_index = content_index
+        self.dedup_mode = dedup_mode
+        self.link_mode = link_mode
+        self.get_date = get_date or get_file_creation_date
+        self.journal = journal
+        self.durable = durable
+        self.metrics = metrics
+        self.folders = folders if folders is not None else FolderCache()
+        self.manifest = manifest
+        self.proxies = proxies
+        self.catalog = catalog
+        # 生成计划时记录已分配的目标路径，避免两个同名源文件被规划到同一个位置
+        self._planned_destinations = set()
+        self._planned_lock = threading.Lock()
+
+    def claim_planned_destination(self, destination):
+        """登记计划中的目标路径，已被其他文件占用时返回 False"""
+        with self._planned_lock:
+            if destination in self._planned_destinations:
+                return False
+            self._planned_destinations.add(destination)
+            return True
+
+    def phase(self, name):
+        """统计 with 块的耗时（计入阶段 name），没有 metrics 时不做任何事"""
+        if self.metrics is None:
+            return nullcontext()
+        return self.metrics.phase(name)
+
+def resolve_target_folder(file_path, stat_info, ctx):
+    """计算文件的目标文件夹（YYYYMMDD - 设备名称），不在日期范围内时返回 None"""
+    # 获取文件创建日期
+    with ctx.phase('date'):
+        creation_date = ctx.get_date(file_path, stat_info)
+    
+    # 检查日期是否在指定范围内
+    if ctx.start_date and creation_date.date() < ctx.start_date:
+        return None
+    if ctx.end_date and creation_date.date() > ctx.end_date:
+        return None
+    
+    # 创建目标文件夹名称
+    folder_name = create_date_folder_name(creation_date, ctx.device_name)
+    return ctx.to_path / folder_name
+
+def copy_or_dedup_file(file_path, target_folder, size, ctx, link_mode):
+    """按内容去重后复制文件"""
+    destination_file = target_folder / file_path.name
+    hash_start = time.perf_counter()
+    with ctx.content_index.lookup(file_path, size) as match:
+        if ctx.metrics is not None:
+            ctx.metrics.add_time('hash', time.perf_counter() - hash_start)
+        if match.duplicate is not None:
+            if match.duplicate == str(destination_file):
+                logging.info(f"文件已存在，跳过: {destination_file}")
+                return "skipped"
+            if ctx.dedup_mode == 'hardlink':
+                with ctx.phase('copy'):
+                    return link_duplicate_file(match.duplicate, destination_file)
+            logging.info(f"重复文件，跳过: {file_path} (与 {match.duplicate} 内容相同)")
+            return "duplicate"
+        
+        with ctx.phase('copy'):
+            result = copy_media_file(file_path, target_folder, link_mode, ctx.durable, ctx.manifest)
+        if result == "copied":
+            match.register(destination_file)
+        return result
+
+def transfer_to_folder(file_path, target_folder, stat_info, ctx, link_mode=None):
+    """把文件放入目标文件夹（按需去重），并更新扫描索引和导入日志
+
+    link_mode 为空时使用 ctx.link_mode
+    """
+    link_mode = link_mode or ctx.link_mode
+    destination_file = target_folder / file_path.name
+    
+    # 确保目标文件夹存在
+    with ctx.phase('mkdir'):
+        ctx.folders.ensure(target_folder)
+    
+    if ctx.journal is not None:
+        ctx.journal.mark_started(file_path, destination_file)
+    
+    # 复制文件
+    if ctx.content_index is not None:
+        try:
+            result = copy_or_dedup_file(file_path, target_folder, stat_info.st_size, ctx, link_mode)
+        except OSError as e:
+            logging.error(f"计算文件哈希失败 {file_path}: {e}")
+            return "failed"
+    else:
+        with ctx.phase('copy'):
+            result = copy_media_file(file_path, target_folder, link_mode, ctx.durable, ctx.manifest)
+    if result in ("copied", "skipped", "duplicate", "linked"):
+        if ctx.index is not None:
+            ctx.index.record(file_path, ctx.device_name, stat_info, destination_file)
+        if ctx.journal is not None:
+            ctx.journal.mark_done(file_path, stat_info, result, destination_file)
+    if ctx.catalog is not None and result in ("copied", "linked"):
+        checksum = ctx.manifest.take_checksum() if ctx.manifest is not None and result == "copied" else None
+        ctx.catalog.add(destination_file, stat_info.st_size, ctx.device_name,
+                        kind=media_kind(destination_file), checksum=checksum)
+    if ctx.proxies is not None and result in ("copied", "skipped", "linked") and is_video_file(destination_file):
+        ctx.proxies.submit(destination_file, ctx.to_path)
+    return result
+
+def process_media_file(file_path, ctx, stat_info=None):
+    """处理单个媒体文件：获取日期、按日期过滤、复制到目标文件夹
+
+    使用扫描索引时，已整理且未变化的文件直接返回 "unchanged"；
+    使用内容去重时，重复文件按 ctx.dedup_mode 跳过或硬链接；
+    上次被中断的导入中已经处理完成的文件返回 "resumed"。
+    stat_info 为扫描时得到的 stat 结果，没有时按需 stat。
+    返回 "copied" / "skipped" / "failed" / "filtered" / "unchanged" / "duplicate" / "linked" / "resumed"
+    """
+    if stat_info is None and (ctx.index is not None or ctx.content_index is not None or ctx.journal is not None):
+        stat_info = file_path.stat()
+    if ctx.journal is not None and ctx.journal.is_done(file_path, stat_info):
+        return "resumed"
+    if ctx.index is not None:
+        if ctx.index.is_unchanged(file_path, ctx.device_name, stat_info):
+            return "unchanged"
+    
+    target_folder = resolve_target_folder(file_path, stat_info, ctx)
+    if target_folder is None:
+        if ctx.journal is not None:
+            ctx.journal.mark_done(file_path, stat_info, "filtered")
+        return "filtered"
+    
+    return transfer_to_folder(file_path, target_folder, stat_info, ctx)
+
+def plan_media_file(file_path, ctx, stat_info=None):
+    """为单个媒体文件生成计划条目，不修改磁盘上的任何内容
+
+    返回 dict: source, destination, size, action, reason（action 为 "link" 时还有 link_target）
+    action 为传输方式 (copy/hardlink/reflink/move)、"link"（硬链接到内容相同的文件）或 "skip"
+    """
+    if stat_info is None:
+        stat_info = file_path.stat()
+    entry = {
+        'source': str(file_path),
+        'destination': None,
+        'size': stat_info.st_size,
+        'action': 'skip',
+        'reason': '',
+    }
+    if ctx.index is not None and ctx.index.is_unchanged(file_path, ctx.device_name, stat_info):
+        entry['reason'] = 'unchanged'
+        return entry
+    
+    target_folder = resolve_target_folder(file_path, stat_info, ctx)
+    if target_folder is None:
+        entry['reason'] = 'out_of_date_range'
+        return entry
+    
+    destination_file = target_folder / file_path.name
+    entry['destination'] = str(destination_file)
+    if destination_file.exists():
+        entry['reason'] = 'exists'
+        return entry
+    if not ctx.claim_planned_destination(str(destination_file)):
+        entry['reason'] = 'name_conflict'
+        return entry
+    
+    if ctx.content_index is not None:
+        with ctx.content_index.lookup(file_path, stat_info.st_size) as match:
+            if match.duplicate is not None:
+                if ctx.dedup_mode == 'hardlink':
+                    entry['action'] = 'link'
+                    entry['link_target'] = match.duplicate
+                entry['reason'] = 'duplicate'
+                return entry
+            # 目标文件还不存在，后续比较内容时读取源文件
+            match.register(destination_file, content_path=file_path)
+    
+    entry['action'] = ctx.link_mode
+    entry['reason'] = 'new'
+    return entry
+
+def run_pipeline(items, handler, jobs, on_result, metrics=None):
+    """生产者/消费者流水线
+
+    当前线程作为生产者遍历 items 并放入有界队列，jobs 个工作线程从队列中取出
+    条目调用 handler 处理，再把 (item, result) 交给 on_result 汇总。
+    队列长度有上限，扫描不会远远跑在复制前面。
+    metrics 为 ImportMetrics 时记录队列深度、生产者因队列已满阻塞的时间和工作线程的空闲时间。
+    """
+    maxsize = jobs * 4
+    # 工作线程以当前线程名为前缀命名，按线程名过滤日志时（见 job_manager）能归到同一个任务
+    parent_name = threading.current_thread().name
+    work_queue = queue.Queue(maxsize=maxsize)
+    stop_event = threading.Event()
+    
+    def worker():
+        while True:
+            wait_start = time.perf_counter()
+            item = work_queue.get()
+            if metrics is not None:
+                metrics.worker_waited(time.perf_counter() - wait_start)
+            try:
+                if item is None:
+                    return
+                if stop_event.is_set():
+                    continue
+                try:
+                    result = handler(item)
+                except Exception as e:
+                    logging.error(f"处理文件失败 {item}: {e}")
+                    result = "failed"
+                on_result(item, result)
+            finally:
+                work_queue.task_done()
+    
+    workers = [
+        threading.Thread(target=worker, name=f"{parent_name}-worker-{i}", daemon=True)
+        for i in range(jobs)
+    ]
+    for thread in workers:
+        thread.start()
+    
+    try:
+        for item in items:
+            put_start = time.perf_counter()
+            work_queue.put(item)
+            if metrics is not None:
+                metrics.queue_sampled(work_queue.qsize(), maxsize, time.perf_counter() - put_start)
+    except BaseException:
+        # 中断时丢弃尚未处理的条目，让工作线程尽快退出
+        stop_event.set()
+        raise
+    finally:
+        for _ in workers:
+            work_queue.put(None)
+        for thread in workers:
+            thread.join()
+
+def _start_prefilter(enabled, start_date, end_date, date_source):
+    """指定了日期范围时创建扫描阶段的日期预过滤，不需要时返回 None"""
+    if not enabled or not (start_date or end_date):
+        return None
+    logging.info("启用日期预过滤: 按目录名、文件名中的日期和修改时间提前排除范围外的文件")
+    return DateRangePrefilter(start_date, end_date, use_names=date_source == 'metadata')
+
+def _log_prefilter(prefilter):
+    """输出日期预过滤排除的目录和文件数"""
+    summary = prefilter.summary() if prefilter is not None else None
+    if summary:
+        logging.info(summary)
+
+def _start_proxies(enabled, workers=None):
+    """按需创建代理文件生成器，找不到 ffmpeg 时只输出警告"""
+    if not enabled:
+        return None
+    try:
+        proxies = ProxyGenerator(workers)
+    except FileNotFoundError:
+        logging.warning("未找到 ffmpeg，跳过封面图和代理文件生成")
+        return None
+    logging.info(f"整理过程中同时生成封面图和代理文件（{proxies.workers} 个 ffmpeg 进程）")
+    return proxies
+
+def _log_proxies(counts):
+    """输出代理文件生成的统计"""
+    if counts is None:
+        return
+    logging.info(
+        f"封面图和代理文件: 新生成 {counts['generated']}，复用相同内容 {counts['reused']}，"
+        f"已存在 {counts['existing']}，失败 {counts['failed']}（存放在各日期文件夹的 {PROXY_DIRNAME} 中）"
+    )
+
+def _log_summary(stats, file_type_name, use_index=False, dedup='off', manifest=None):
+    """输出统计信息"""
+    logging.info(f"整理完成!")
+    logging.info(f"总文件数: {stats['total']}")
+    logging.info(f"{file_type_name}文件数: {stats['processed']}")
+    logging.info(f"成功复制: {stats['copied']}")
+    logging.info(f"跳过文件: {stats['skipped']}")
+    if stats['resumed']:
+        logging.info(f"断点续传跳过（上次已完成）: {stats['resumed']}")
+    if use_index:
+        logging.info(f"索引命中（未变化）: {stats['unchanged']}")
+    if dedup != 'off':
+        logging.info(f"重复文件跳过: {stats['duplicate']}")
+        logging.info(f"重复文件硬链接: {stats['linked']}")
+    logging.info(f"复制失败: {stats['failed']}")
+    if manifest is not None:
+        logging.info(f"已校验并记录校验和: {manifest.recorded}")
+
+def _log_metrics(snapshot, folders=None):
+    """输出耗时、吞吐量和各阶段耗时；folders 为 FolderCache 时同时输出文件夹创建的计数"""
+    logging.info(
+        f"耗时: {snapshot['elapsed_seconds']:.1f} 秒，平均 {snapshot['files_per_second']:.1f} 个文件/秒，"
+        f"复制 {format_size(snapshot['bytes_copied'])}（{snapshot['copy_mb_per_second']:.1f} MB/s）"
+    )
+    phases = format_phases(snapshot)
+    if phases:
+        logging.info(f"各阶段累计耗时: {phases}")
+    if snapshot['queue']['max']:
+        queue_info = snapshot['queue']
+        logging.info(
+            f"工作队列: 峰值 {queue_info['peak']}/{queue_info['max']}，"
+            f"扫描因队列已满等待 {queue_info['producer_blocked_seconds']:.2f} 秒，"
+            f"工作线程空闲 {queue_info['worker_idle_seconds']:.2f} 秒"
+        )
+    if snapshot['bottleneck']:
+        logging.info(f"主要耗时阶段: {PHASE_NAMES.get(snapshot['bottleneck'], snapshot['bottleneck'])}")
+    if folders is not None:
+        counts = folders.stats()
+        logging.info(
+            f"目标文件夹: {counts['folders']} 个（新建 {counts['created']} 个），"
+            f"mkdir 调用 {counts['mkdir_calls']} 次，缓存命中 {counts['cache_hits']} 次"
+        )
+
+def _new_stats():
+    return {
+        'total': 0,
+        'processed': 0,
+        'copied': 0,
+        'skipped': 0,
+        'failed': 0,
+        'filtered': 0,
+        'unchanged': 0,
+        'duplicate': 0,
+        'linked': 0,
+        'resumed': 0,
+    }
+
+def estimate_plan_duration(copy_bytes, metadata_ops, copy_speed_mb=DEFAULT_ESTIMATE_SPEED_MB):
+    """估算执行计划所需的秒数：需要复制的数据量按 copy_speed_mb (MB/s) 计算，
+    同一文件系统上的硬链接/克隆/移动按每个文件一次元数据操作计算"""
+    return copy_bytes / (copy_speed_mb * 1024 * 1024) + metadata_ops * METADATA_OP_SECONDS
+
+def format_size(size):
+    """把字节数格式化为便于阅读的字符串"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+def _watch_after_scan(media_files, watcher, stats, stats_lock, metrics, control=None):
+    """先产出扫描到的已有文件，再持续产出监视到的新文件
+
+    刚被修改过的已有文件可能仍在写入（如相机或 Wi-Fi 传输中），交给监视器等待写入稳定后再产出
+    """
+    deferred = set()
+    for path, stat_info in media_files:
+        if watcher.defer_if_recent(path, stat_info):
+            deferred.add(os.path.abspath(path))
+            continue
+        yield path, stat_info
+    if deferred:
+        logging.info(f"{len(deferred)} 个已有文件可能仍在写入，等待写入稳定后整理")
+    stop_event = control.stop_event if control is not None else None
+    stop_hint = "取消任务" if control is not None else "按 Ctrl+C"
+    logging.info(f"已有文件已全部提交，开始监视源文件夹（{watcher.mode}），{stop_hint}停止")
+    for batch in watcher.batches(stop_event):
+        logging.info(f"发现 {len(batch)} 个写入完成的新文件")
+        for path, stat_info in batch:
+            if path in deferred:
+                # 扫描时已经计数
+                deferred.discard(path)
+            else:
+                with stats_lock:
+                    stats['total'] += 1
+                metrics.file_found(stat_info.st_size)
+            yield Path(path), stat_info
+    if control is not None:
+        # 取消任务时监视器只是停止产出新文件，这里抛出 JobCancelled，不把被取消的任务当作正常完成
+        control.checkpoint()
+
+def organize_videos(from_dir, to_dir, device_name, file_type='video', start_date=None, end_date=None, jobs=1,
+                    use_index=False, dedup='off', date_source='metadata', link_mode='copy',
+                    skip_hidden=False, scan_workers=1, plan_path=None, estimate_speed=DEFAULT_ESTIMATE_SPEED_MB,
+                    durable=False, progress_callback=None, metrics_path=None, control=None, verify=False,
+                    proxies=False, proxy_workers=None, watch=False, settle_seconds=SETTLE_SECONDS,
+                    date_prefilter=True):
+    """整理媒体文件的主要函数
+
+    jobs 大于 1 时启用并发模式：扫描与复制以流水线方式运行，由 jobs 个线程并行复制
+    use_index 为 True 时使用目标文件夹中的扫描索引，跳过上次已整理且未变化的文件
+    dedup 为 skip/hardlink 时按文件内容去重，重复文件跳过或硬链接到已有文件
+    date_source 为 metadata 时优先使用文件内嵌的拍摄时间，filesystem 时只使用文件系统时间
+    link_mode 为 copy / hardlink / reflink / move，不支持时自动回退到复制（move 会删除源文件）
+    skip_hidden 为 True 时跳过隐藏文件和目录；scan_workers 大于 1 时并行扫描子目录
+    plan_path 不为空时只生成整理计划 (JSONL) 写入该文件，不创建文件夹也不复制文件，
+    之后可用 apply_plan 执行；estimate_speed 为估算耗时使用的复制速度 (MB/s)
+    每次导入都会在目标文件夹中写入导入日志，中断后重新运行会从中断处继续；
+    durable 为 True 时复制的数据在发布前 fsync 到磁盘
+    progress_callback(snapshot) 定期接收进度和性能指标（见 import_metrics.ImportMetrics.snapshot），
+    metrics_path 不为空时把最终的指标以 JSON 格式写入该文件
+    control 为 job_manager.JobControl 时在放入每个文件前检查暂停/取消，
+    取消时抛出 JobCancelled，导入日志保留，之后可以从中断处继续
+    verify 为 True 时校验复制的每个文件，校验和记录在各目标文件夹的校验清单中（见 integrity）
+    proxies 为 True 时整理的同时用 proxy_workers 个 ffmpeg 进程（默认 CPU 核心数）生成视频的封面图和代理文件
+    watch 为 True 时整理完已有的文件后继续监视源文件夹（见 folder_watcher），新文件写入稳定
+    settle_seconds 秒后立即整理，直到按下 Ctrl+C 或任务被取消
+    date_prefilter 为 True 且指定了日期范围时，扫描阶段先按目录名、文件名中的日期和修改时间
+    排除明显不在范围内的目录和文件（见 date_prefilter），只对其余文件读取拍摄日期
+    """
+    # 计划文件中记录绝对路径，之后在其他工作目录（如定时任务）中执行时仍然指向同样的文件
+    from_path = Path(from_dir).absolute()
+    to_path = Path(to_dir).absolute()
+    jobs = max(1, int(jobs or 1))
+    dry_run = plan_path is not None
     
     # 检查源文件夹是否存在
     if not from_path.exists():
@@ -146,17 +735,19 @@ def organize_videos(from_dir, to_dir, device_name, file_type='video', start_date
         return False
     
     # 确保目标文件夹存在
-    ensure_folder_exists(to_path)
+    if not dry_run:
+        ensure_folder_exists(to_path)
     
     # 统计信息
-    total_files = 0
-    processed_files = 0
-    copied_files = 0
-    skipped_files = 0
+    stats = _new_stats()
+    stats_lock = threading.Lock()
     
     file_type_name = '视频' if file_type == 'video' else '图片' if file_type == 'image' else '媒体'
     
-    logging.info(f"开始整理{file_type_name}文件...")
+    if dry_run:
+        logging.info(f"开始生成{file_type_name}文件整理计划（不会修改任何文件）...")
+    else:
+        logging.info(f"开始整理{file_type_name}文件...")
     logging.info(f"源文件夹: {from_dir}")
     logging.info(f"目标文件夹: {to_dir}")
     logging.info(f"设备名称: {device_name}")
@@ -165,48 +756,597 @@ def organize_videos(from_dir, to_dir, device_name, file_type='video', start_date
         logging.info(f"起始日期: {start_date.strftime('%Y-%m-%d')}")
     if end_date:
         logging.info(f"终止日期: {end_date.strftime('%Y-%m-%d')}")
+    if jobs > 1:
+        logging.info(f"并发线程数: {jobs}")
+    if dedup != 'off':
+        logging.info(f"内容去重: {dedup}")
+    logging.info(f"日期来源: {date_source}")
+    if link_mode != 'copy':
+        logging.info(f"传输方式: {link_mode}")
+    
+    index_path = to_path / INDEX_FILENAME
+    index = ScanIndex(index_path, read_only=dry_run) if use_index else None
+    content_index = ContentIndex.for_target(to_path, read_only=dry_run) if dedup != 'off' else None
+    journal = None if dry_run else ImportJournal(journal_path_for(to_path, from_path, device_name))
+    manifest = ManifestWriter() if verify and not dry_run else None
+    proxy_generator = _start_proxies(proxies and not dry_run, proxy_workers)
+    catalog = None if dry_run else ArchiveCatalog(to_path)
+    prefilter = _start_prefilter(date_prefilter, start_date, end_date, date_source)
+    metrics = ImportMetrics(progress_callback, jobs=jobs)
+    date_cache = {}
+    
+    def get_date(file_path, stat_info=None):
+        return get_media_date(file_path, date_source == 'metadata', date_cache, stat_info)
+    
+    ctx = OrganizeContext(
+        to_path, device_name, start_date, end_date, index=index, content_index=content_index,
+        dedup_mode=dedup, link_mode=link_mode, get_date=get_date, journal=journal, durable=durable,
+        metrics=metrics, manifest=manifest, proxies=proxy_generator, catalog=catalog
+    )
+    
+    plan_file = None
+    plan_totals = {'copy_bytes': 0, 'metadata_ops': 0, 'actions': {}, 'folders': set()}
+    if dry_run:
+        target_device = _nearest_existing_device(to_path)
+        plan_file = open(plan_path, 'w', encoding='utf-8')
+        plan_file.write(json.dumps({
+            'type': 'header',
+            'version': PLAN_FORMAT_VERSION,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'from_dir': str(from_path),
+            'to_dir': str(to_path),
+            'device_name': device_name,
+            'link_mode': link_mode,
+            'use_index': bool(use_index),
+            'dedup': dedup,
+        }, ensure_ascii=False) + '\n')
+        
+        def handle(item):
+            file_path, stat_info = item
+            try:
+                return plan_media_file(file_path, ctx, stat_info)
+            except Exception as e:
+                logging.error(f"生成计划失败 {file_path}: {e}")
+                return {'source': str(file_path), 'destination': None, 'size': stat_info.st_size,
+                        'action': 'skip', 'reason': f'error: {e}'}
+        
+        def record(item, entry):
+            _, stat_info = item
+            with stats_lock:
+                stats['processed'] += 1
+                action = entry['action']
+                plan_totals['actions'][action] = plan_totals['actions'].get(action, 0) + 1
+                if action == 'copy' or (action in LINK_MODES and stat_info.st_dev != target_device):
+                    plan_totals['copy_bytes'] += entry['size']
+                elif action != 'skip':
+                    plan_totals['metadata_ops'] += 1
+                if action != 'skip':
+                    plan_totals['folders'].add(str(Path(entry['destination']).parent))
+                plan_file.write(json.dumps(dict(type='item', **entry), ensure_ascii=False) + '\n')
+            metrics.file_done(action, entry['size'])
+    else:
+        def handle(item):
+            file_path, stat_info = item
+            try:
+                return process_media_file(file_path, ctx, stat_info)
+            except Exception as e:
+                logging.error(f"处理文件失败 {file_path}: {e}")
+                return "failed"
+        
+        def record(item, result):
+            with stats_lock:
+                stats['processed'] += 1
+                if result in stats:
+                    stats[result] += 1
+            metrics.file_done(result, item[1].st_size)
+    
+    # 监视模式：先开始监视再扫描已有文件，扫描期间出现的新文件不会遗漏
+    watcher = None
+    if watch and not dry_run:
+        watcher = FolderWatcher(from_path, media_extensions(file_type), skip_hidden, settle_seconds)
     
     # 遍历源文件夹中的所有文件
-    for file_path in from_path.rglob('*'):
-        if file_path.is_file():
-            total_files += 1
-            
-            # 检查是否为指定类型的媒体文件
-            if is_media_file(file_path, file_type):
-                processed_files += 1
-                
-                # 获取文件创建日期
-                creation_date = get_file_creation_date(file_path)
-                
-                # 检查日期是否在指定范围内
-                if start_date and creation_date.date() < start_date:
-                    continue
-                if end_date and creation_date.date() > end_date:
-                    continue
-                
-                # 创建目标文件夹名称
-                folder_name = create_date_folder_name(creation_date, device_name)
-                target_folder = to_path / folder_name
-                
-                # 确保目标文件夹存在
-                ensure_folder_exists(target_folder)
-                
-                # 复制文件
-                result = copy_media_file(file_path, target_folder)
-                if result == "copied":
-                    copied_files += 1
-                elif result == "skipped":
-                    skipped_files += 1
+    media_files = metrics.track_scan(
+        iter_media_files(from_path, file_type, stats, skip_hidden, scan_workers, metrics, prefilter),
+        lambda item: item[1].st_size
+    )
+    if watcher is not None:
+        media_files = _watch_after_scan(media_files, watcher, stats, stats_lock, metrics, control)
+    if control is not None:
+        media_files = control.wrap(media_files)
+    completed = False
+    try:
+        if jobs > 1:
+            run_pipeline(media_files, handle, jobs, record, metrics)
+        else:
+            for item in media_files:
+                record(item, handle(item))
+        completed = True
+        
+        if dry_run:
+            estimated = estimate_plan_duration(plan_totals['copy_bytes'], plan_totals['metadata_ops'], estimate_speed)
+            plan_file.write(json.dumps({
+                'type': 'summary',
+                'files': stats['processed'],
+                'actions': plan_totals['actions'],
+                'copy_bytes': plan_totals['copy_bytes'],
+                'metadata_ops': plan_totals['metadata_ops'],
+                'estimated_seconds': round(estimated, 1),
+                'folders': sorted(plan_totals['folders']),
+            }, ensure_ascii=False) + '\n')
+    finally:
+        if plan_file is not None:
+            plan_file.close()
+        if index is not None:
+            index.close()
+        if content_index is not None:
+            content_index.close()
+        if journal is not None:
+            journal.close(completed)
+        if manifest is not None:
+            manifest.close()
+        if catalog is not None:
+            catalog.close()
+        proxy_counts = proxy_generator.close(cancel=not completed) if proxy_generator is not None else None
+    
+    snapshot = metrics.finish()
+    if metrics_path:
+        metrics.write_summary(metrics_path, mode='plan' if dry_run else 'import', folders=ctx.folders.stats())
+    
+    if dry_run:
+        actions = plan_totals['actions']
+        logging.info(f"整理计划已生成: {plan_path}")
+        logging.info(f"总文件数: {stats['total']}")
+        logging.info(f"{file_type_name}文件数: {stats['processed']}")
+        _log_prefilter(prefilter)
+        for action in LINK_MODES + ('link', 'skip'):
+            if actions.get(action):
+                logging.info(f"计划操作 {action}: {actions[action]}")
+        logging.info(f"需要创建或使用的目标文件夹: {len(plan_totals['folders'])} 个")
+        logging.info(f"需要复制的数据量: {format_size(plan_totals['copy_bytes'])}")
+        logging.info(f"预计耗时: {estimated:.0f} 秒（按 {estimate_speed} MB/s 估算）")
+        return True
     
     # 输出统计信息
-    logging.info(f"整理完成!")
-    logging.info(f"总文件数: {total_files}")
-    logging.info(f"{file_type_name}文件数: {processed_files}")
-    logging.info(f"成功复制: {copied_files}")
-    logging.info(f"跳过文件: {skipped_files}")
+    ctx.folders.log_summary()
+    _log_summary(stats, file_type_name, use_index, dedup, manifest)
+    _log_prefilter(prefilter)
+    _log_proxies(proxy_counts)
+    _log_metrics(snapshot, ctx.folders)
     
     return True
 
+def _nearest_existing_device(path):
+    """返回 path 或其最近的已存在父目录所在的设备号，用于判断是否与源文件在同一文件系统"""
+    path = path.absolute()
+    for candidate in (path, *path.parents):
+        try:
+            return candidate.stat().st_dev
+        except OSError:
+            continue
+    return None
+
+def read_plan(plan_path):
+    """读取计划文件，返回 (header, 逐条产出计划条目的生成器)"""
+    plan_file = open(plan_path, 'r', encoding='utf-8')
+    header = json.loads(plan_file.readline())
+    if header.get('type') != 'header' or header.get('version') != PLAN_FORMAT_VERSION:
+        plan_file.close()
+        raise ValueError(f"无法识别的计划文件: {plan_path}")
+    
+    def entries():
+        with plan_file:
+            for line in plan_file:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record.get('type') == 'item':
+                    yield record
+    
+    return header, entries()
+
+def read_plan_summary(plan_path, block_size=64 * 1024):
+    """读取计划文件最后一行的 summary 记录（从文件末尾向前读取，不解析全部条目），没有时返回 None"""
+    with open(plan_path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        tail = b''
+        while position > 0:
+            step = min(block_size, position)
+            position -= step
+            f.seek(position)
+            tail = f.read(step) + tail
+            # 去掉末尾换行后，找到倒数第一个换行即可得到完整的最后一行
+            if b'\n' in tail.rstrip(b'\n'):
+                break
+    lines = tail.rstrip(b'\n').rsplit(b'\n', 1)
+    try:
+        record = json.loads(lines[-1].decode('utf-8'))
+    except ValueError:
+        return None
+    return record if record.get('type') == 'summary' else None
+
+def apply_plan(plan_path, jobs=1, durable=False, progress_callback=None, metrics_path=None, verify=False,
+               proxies=False, proxy_workers=None):
+    """执行 organize_videos(plan_path=...) 生成的整理计划
+
+    复制类条目由 jobs 个线程并行执行；硬链接到重复文件的条目在复制全部完成后执行，
+    保证链接目标已经存在。源文件在生成计划后发生变化（被删除或大小改变）时记为失败。
+    与 organize_videos 一样使用导入日志，中断后重新执行同一计划会从中断处继续。
+    progress_callback、metrics_path、verify、proxies 和 proxy_workers 与 organize_videos 相同。
+    """
+    jobs = max(1, int(jobs or 1))
+    try:
+        header, entries = read_plan(plan_path)
+    except (OSError, ValueError) as e:
+        logging.error(f"读取计划文件失败: {e}")
+        return False
+    if not (os.path.isabs(header['from_dir']) and os.path.isabs(header['to_dir'])):
+        # 旧版本生成的计划可能记录了相对路径，在不同的工作目录中执行会指向错误的文件
+        logging.error(f"计划文件中的路径不是绝对路径，请重新生成计划: {plan_path}")
+        return False
+    
+    to_path = Path(header['to_dir'])
+    device_name = header['device_name']
+    link_mode = header.get('link_mode', 'copy')
+    use_index = header.get('use_index', False)
+    dedup = header.get('dedup', 'off')
+    
+    logging.info(f"开始执行整理计划: {plan_path}")
+    logging.info(f"计划生成时间: {header.get('created_at')}")
+    logging.info(f"目标文件夹: {to_path}")
+    logging.info(f"设备名称: {device_name}")
+    
+    ensure_folder_exists(to_path)
+    index = ScanIndex(to_path / INDEX_FILENAME) if use_index else None
+    content_index = ContentIndex.for_target(to_path) if dedup != 'off' else None
+    journal = ImportJournal(journal_path_for(to_path, header['from_dir'], device_name))
+    manifest = ManifestWriter() if verify else None
+    proxy_generator = _start_proxies(proxies, proxy_workers)
+    catalog = ArchiveCatalog(to_path)
+    metrics = ImportMetrics(progress_callback, jobs=jobs)
+    ctx = OrganizeContext(
+        to_path, device_name, index=index, content_index=content_index, dedup_mode=dedup, link_mode=link_mode,
+        journal=journal, durable=durable, metrics=metrics, manifest=manifest, proxies=proxy_generator,
+        catalog=catalog
+    )
+    
+    stats = _new_stats()
+    stats_lock = threading.Lock()
+    deferred_links = []
+    
+    # 计划中记录了全部目标文件夹，执行前一次性创建，之后每个文件都直接命中缓存
+    summary = read_plan_summary(plan_path)
+    if summary and summary.get('folders'):
+        with ctx.phase('mkdir'):
+            ctx.folders.precreate(Path(folder) for folder in summary['folders'])
+    
+    def handle(entry):
+        source = Path(entry['source'])
+        destination = Path(entry['destination'])
+        try:
+            stat_info = source.stat()
+        except OSError as e:
+            logging.error(f"源文件已不存在 {source}: {e}")
+            return "failed"
+        if stat_info.st_size != entry['size']:
+            logging.error(f"源文件在生成计划后发生了变化，跳过: {source}")
+            return "failed"
+        if journal.is_done(source, stat_info):
+            return "resumed"
+        try:
+            return transfer_to_folder(source, destination.parent, stat_info, ctx, entry['action'])
+        except Exception as e:
+            logging.error(f"处理文件失败 {source}: {e}")
+            return "failed"
+    
+    def record(entry, result):
+        with stats_lock:
+            stats['processed'] += 1
+            if result in stats:
+                stats[result] += 1
+        metrics.file_done(result, entry['size'])
+    
+    def actionable():
+        for entry in metrics.track_scan(entries, lambda entry: entry['size']):
+            stats['total'] += 1
+            action = entry['action']
+            if action in LINK_MODES:
+                yield entry
+            elif action == 'link':
+                deferred_links.append(entry)
+            else:
+                reason = entry.get('reason')
+                record(entry, {'unchanged': 'unchanged', 'duplicate': 'duplicate',
+                               'out_of_date_range': 'filtered'}.get(reason, 'skipped'))
+    
+    completed = False
+    try:
+        if jobs > 1:
+            run_pipeline(actionable(), handle, jobs, record, metrics)
+        else:
+            for entry in actionable():
+                record(entry, handle(entry))
+        
+        for entry in deferred_links:
+            destination = Path(entry['destination'])
+            with ctx.phase('mkdir'):
+                ctx.folders.ensure(destination.parent)
+            with ctx.phase('copy'):
+                result = link_duplicate_file(entry['link_target'], destination)
+            if result == "linked":
+                catalog.add(destination, entry['size'], device_name, kind=media_kind(destination))
+            if index is not None and result == "linked":
+                try:
+                    index.record(entry['source'], device_name, os.stat(entry['source']), destination)
+                except OSError:
+                    pass
+            record(entry, result)
+        completed = True
+    finally:
+        if index is not None:
+            index.close()
+        if content_index is not None:
+            content_index.close()
+        journal.close(completed)
+        if manifest is not None:
+            manifest.close()
+        catalog.close()
+        proxy_counts = proxy_generator.close(cancel=not completed) if proxy_generator is not None else None
+    
+    snapshot = metrics.finish()
+    if metrics_path:
+        metrics.write_summary(metrics_path, mode='apply_plan', folders=ctx.folders.stats())
+    ctx.folders.log_summary()
+    _log_summary(stats, '计划', use_index, dedup, manifest)
+    _log_proxies(proxy_counts)
+    _log_metrics(snapshot, ctx.folders)
+    return True
+
+def load_preset_sources(names=None, presets_file=PRESETS_FILE):
+    """从预设配置文件读取导入源列表，names 为空时返回全部预设"""
+    with open(presets_file, 'r', encoding='utf-8') as f:
+        presets = json.load(f)
+    if names:
+        by_name = {preset.get('name'): preset for preset in presets}
+        missing = [name for name in names if name not in by_name]
+        if missing:
+            raise ValueError(f"预设不存在: {', '.join(missing)}")
+        presets = [by_name[name] for name in names]
+    return [
+        {
+            'from_dir': preset['from_dir'],
+            'to_dir': preset.get('to_dir'),
+            'device_name': preset['device_name'],
+            'file_type': preset.get('file_type', 'video'),
+        }
+        for preset in presets
+    ]
+
+def _device_label(device_key):
+    return f"{os.major(device_key)}:{os.minor(device_key)}" if hasattr(os, 'major') else str(device_key)
+
+def organize_sources(sources, to_dir=None, jobs=None, per_device_jobs=1, start_date=None, end_date=None,
+                     use_index=False, dedup='off', date_source='metadata', link_mode='copy', skip_hidden=False,
+                     durable=False, progress_callback=None, metrics_path=None, verify=False,
+                     proxies=False, proxy_workers=None, date_prefilter=True):
+    """同时从多个源导入
+
+    sources 为字典列表，每项包含 from_dir、device_name，可选 to_dir（默认使用参数 to_dir）
+    和 file_type（默认 video），可以直接使用 load_preset_sources() 的结果。
+    位于同一物理设备（st_dev 相同）上的源由同一个读取线程依次扫描，每个设备同时最多处理
+    per_device_jobs 个文件；jobs 个写入线程在各设备之间公平调度（见 device_scheduler），
+    默认每个设备一个写入线程。其余参数与 organize_videos 相同。
+    """
+    if not sources:
+        logging.error("没有指定任何导入源")
+        return False
+    
+    success = True
+    targets = {}
+    runs = []
+    devices = {}
+    stats_lock = threading.Lock()
+    
+    for source in sources:
+        from_path = Path(source['from_dir'])
+        target = source.get('to_dir') or to_dir
+        if not target:
+            logging.error(f"导入源没有指定目标文件夹: {from_path}")
+            success = False
+            continue
+        try:
+            device_key = from_path.stat().st_dev
+        except OSError as e:
+            logging.error(f"源文件夹不存在: {from_path} ({e})")
+            success = False
+            continue
+        runs.append({
+            'from_path': from_path,
+            'to_path': Path(target),
+            'device_name': source['device_name'],
+            'file_type': source.get('file_type') or 'video',
+            'device_key': device_key,
+            'stats': _new_stats(),
+        })
+        devices.setdefault(device_key, []).append(runs[-1])
+    if not runs:
+        return False
+    
+    jobs = max(1, int(jobs or len(devices) * max(1, int(per_device_jobs))))
+    metrics = ImportMetrics(progress_callback, jobs=jobs)
+    scheduler = DeviceScheduler(per_device_jobs)
+    
+    logging.info(f"开始多源导入: {len(runs)} 个源，{len(devices)} 个源设备，{jobs} 个写入线程")
+    for run in runs:
+        logging.info(
+            f"源: {run['from_path']} -> {run['to_path']}（设备名称: {run['device_name']}，"
+            f"类型: {run['file_type']}，源设备 {_device_label(run['device_key'])}）"
+        )
+    
+    manifest = ManifestWriter() if verify else None
+    proxy_generator = _start_proxies(proxies, proxy_workers)
+    prefilter = _start_prefilter(date_prefilter, start_date, end_date, date_source)
+    completed = False
+    try:
+        for run in runs:
+            to_path = run['to_path']
+            if to_path not in targets:
+                # 多个源导入到同一目标文件夹时共享索引和文件夹缓存
+                ensure_folder_exists(to_path)
+                targets[to_path] = (
+                    ScanIndex(to_path / INDEX_FILENAME) if use_index else None,
+                    ContentIndex.for_target(to_path) if dedup != 'off' else None,
+                    FolderCache(),
+                    ArchiveCatalog(to_path),
+                )
+            index, content_index, folders, catalog = targets[to_path]
+            date_cache = {}
+            
+            def get_date(file_path, stat_info=None, cache=date_cache):
+                return get_media_date(file_path, date_source == 'metadata', cache, stat_info)
+            
+            run['journal'] = ImportJournal(journal_path_for(to_path, run['from_path'], run['device_name']))
+            run['ctx'] = OrganizeContext(
+                to_path, run['device_name'], start_date, end_date, index=index, content_index=content_index,
+                dedup_mode=dedup, link_mode=link_mode, get_date=get_date, journal=run['journal'],
+                durable=durable, metrics=metrics, folders=folders, manifest=manifest, proxies=proxy_generator,
+                catalog=catalog
+            )
+        for device_key in devices:
+            scheduler.add_device(device_key)
+        
+        def reader(device_key, device_runs):
+            try:
+                for run in device_runs:
+                    items = iter_media_files(run['from_path'], run['file_type'], run['stats'], skip_hidden,
+                                             metrics=metrics, prefilter=prefilter)
+                    while True:
+                        scan_start = time.perf_counter()
+                        item = next(items, None)
+                        metrics.add_time('scan', time.perf_counter() - scan_start)
+                        if item is None:
+                            break
+                        size = item[1].st_size
+                        metrics.file_found(size)
+                        put_start = time.perf_counter()
+                        if not scheduler.put(device_key, (run, item), size):
+                            return
+                        metrics.queue_sampled(scheduler.queued(), scheduler.queue_size * len(devices),
+                                              time.perf_counter() - put_start)
+            except Exception as e:
+                logging.error(f"扫描源设备 {_device_label(device_key)} 失败: {e}")
+            finally:
+                scheduler.finish_device(device_key)
+        
+        def writer():
+            while True:
+                task = scheduler.get()
+                if task is None:
+                    return
+                device_key, (run, (file_path, stat_info)), size = task
+                try:
+                    result = process_media_file(file_path, run['ctx'], stat_info)
+                except Exception as e:
+                    logging.error(f"处理文件失败 {file_path}: {e}")
+                    result = "failed"
+                finally:
+                    scheduler.task_done(device_key, size)
+                with stats_lock:
+                    run['stats']['processed'] += 1
+                    if result in run['stats']:
+                        run['stats'][result] += 1
+                metrics.file_done(result, size)
+        
+        threads = [
+            threading.Thread(target=reader, args=(device_key, device_runs),
+                             name=f"reader-{_device_label(device_key)}", daemon=True)
+            for device_key, device_runs in devices.items()
+        ]
+        threads += [threading.Thread(target=writer, name=f"writer-{i}", daemon=True) for i in range(jobs)]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads[:len(devices)]:
+                thread.join()
+            metrics.scan_finished()
+            for thread in threads[len(devices):]:
+                thread.join()
+        except BaseException:
+            # 中断时丢弃排队的任务，让读取和写入线程尽快退出
+            scheduler.close()
+            for thread in threads:
+                thread.join()
+            raise
+        completed = True
+    finally:
+        for run in runs:
+            if 'journal' in run:
+                run['journal'].close(completed)
+        for index, content_index, _, catalog in targets.values():
+            if index is not None:
+                index.close()
+            if content_index is not None:
+                content_index.close()
+            catalog.close()
+        if manifest is not None:
+            manifest.close()
+        proxy_counts = proxy_generator.close(cancel=not completed) if proxy_generator is not None else None
+    
+    snapshot = metrics.finish()
+    device_stats = scheduler.stats()
+    if metrics_path:
+        metrics.write_summary(
+            metrics_path, mode='multi_source',
+            devices={_device_label(key): value for key, value in device_stats.items()},
+            sources=[
+                {'from_dir': str(run['from_path']), 'to_dir': str(run['to_path']),
+                 'device_name': run['device_name'], 'stats': run['stats']}
+                for run in runs
+            ],
+            folders={str(to_path): folders.stats() for to_path, (_, _, folders, _) in targets.items()},
+        )
+    
+    for run in runs:
+        logging.info(f"—— {run['device_name']}（{run['from_path']}）——")
+        _log_summary(run['stats'], '媒体', use_index, dedup)
+    for to_path, (_, _, folders, _) in targets.items():
+        folders.log_summary()
+    if manifest is not None:
+        logging.info(f"已校验并记录校验和: {manifest.recorded}")
+    _log_prefilter(prefilter)
+    _log_proxies(proxy_counts)
+    _log_metrics(snapshot)
+    for device_key, device_runs in devices.items():
+        counts = device_stats[device_key]
+        names = ", ".join(run['device_name'] for run in device_runs)
+        logging.info(
+            f"源设备 {_device_label(device_key)}（{names}）: {counts['files']} 个文件，"
+            f"{format_size(counts['bytes'])}，繁忙 {counts['busy_seconds']:.1f} 秒，{counts['mb_per_second']:.1f} MB/s"
+        )
+    return success
+
+def _read_manifest_if_exists(folder):
+    """读取文件夹中的校验清单，没有时返回空字典"""
+    if not os.path.exists(os.path.join(folder, MANIFEST_FILENAME)):
+        return {}
+    return read_manifest(folder)
+
+def log_archive_stats(archive_dir):
+    """根据归档目录输出已整理文件的统计"""
+    with CatalogReader(archive_dir) as reader:
+        stats = reader.stats()
+    if not stats['files']:
+        logging.info(f"归档目录为空或不存在: {archive_dir}（可用 --rebuild-catalog 从已整理的文件夹生成）")
+        return stats
+    logging.info(f"归档: {archive_dir}，共 {stats['files']} 个文件，{format_size(stats['bytes'])}")
+    for device in stats['devices']:
+        logging.info(
+            f"{device['device_name']}: {device['files']} 个文件，{format_size(device['bytes'])}，"
+            f"{device['first_date']} ~ {device['last_date']}"
+        )
+    return stats
+
 def main():
     """主函数"""
     parser = argparse.ArgumentParser(
@@ -219,21 +1359,38 @@ def main():
   python video_organizer.py ~/Downloads/media ~/Media/organized "GoPro Hero12" --type all
   python video_organizer.py ~/Downloads/videos ~/Videos/organized "DJI Mavic" --start-date 2024-01-01 --end-date 2024-12-31
   python video_organizer.py ~/Downloads/photos ~/Photos/organized "iPhone 15" --start-date 2024/06/01
+  python video_organizer.py /Volumes/DJI_CARD ~/Videos/organized "DJI Mavic" --jobs 8
+  python video_organizer.py /Volumes/DJI_CARD ~/Videos/organized "DJI Mavic" --index
+  python video_organizer.py /Volumes/CARD2 ~/Videos/organized "DJI Mavic" --dedup hardlink --jobs 8
+  python video_organizer.py /data/ingest /data/archive "DJI Mavic" --link-mode reflink
+  python video_organizer.py /Volumes/DJI_CARD ~/Videos/organized "DJI Mavic" --plan import.jsonl
+  python video_organizer.py --apply-plan import.jsonl --jobs 8
+  python video_organizer.py --source /Volumes/CARD_A "Sony A7" --source /Volumes/CARD_B "DJI Mavic" --to ~/Videos/organized
+  python video_organizer.py --presets
+  python video_organizer.py /Volumes/DJI_CARD ~/Videos/organized "DJI Mavic" --verify
+  python video_organizer.py --verify-archive ~/Videos/organized
+  python video_organizer.py /Volumes/DJI_CARD ~/Videos/organized "DJI Mavic" --proxies -j 4
+  python video_organizer.py --archive-stats ~/Videos/organized
+  python video_organizer.py --query-archive ~/Videos/organized --device "DJI Mavic" --start-date 2024-06-01 --end-date 2024-06-30
+  python video_organizer.py ~/Ingest ~/Videos/organized "DJI Mavic" --watch --index
         """
     )
     
     parser.add_argument(
         'from_dir',
+        nargs='?',
         help='源文件夹路径（包含要整理的媒体文件）'
     )
     
     parser.add_argument(
         'to_dir',
+        nargs='?',
         help='目标文件夹路径（整理后的文件存放位置）'
     )
     
     parser.add_argument(
         'device_name',
+        nargs='?',
         help='设备名称（将作为文件夹名称的一部分）'
     )
     
@@ -256,6 +1413,189 @@ def main():
         help='终止日期，只处理此日期之前的文件。支持格式: YYYY-MM-DD, YYYY/MM/DD, YYYYMMDD 等'
     )
     
+    parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=1,
+        help='并发复制线程数，大于 1 时扫描与复制并行进行（默认: 1，即顺序处理）'
+    )
+    
+    parser.add_argument(
+        '--index',
+        action='store_true',
+        help=f'使用目标文件夹中的扫描索引 ({INDEX_FILENAME})，跳过上次已整理且大小、修改时间未变化的文件（整理后的文件被删除或移走时重新整理）'
+    )
+    
+    parser.add_argument(
+        '--dedup',
+        choices=DEDUP_MODES,
+        default='off',
+        help='按文件内容去重: off (不去重，默认), skip (跳过重复文件), hardlink (硬链接到已整理的相同文件)'
+    )
+    
+    parser.add_argument(
+        '--date-source',
+        choices=DATE_SOURCES,
+        default='metadata',
+        help='拍摄日期来源: metadata (优先读取 EXIF/视频元数据中的拍摄时间，默认), filesystem (仅使用文件系统时间)'
+    )
+    
+    parser.add_argument(
+        '--link-mode',
+        choices=LINK_MODES,
+        default='copy',
+        help='传输方式: copy (复制，默认), hardlink (硬链接), reflink (写时复制克隆，Btrfs/XFS), '
+             'move (移动，会删除源文件)。同一文件系统上后三种只涉及元数据操作，不支持时自动回退到复制'
+    )
+    
+    parser.add_argument(
+        '--skip-hidden',
+        action='store_true',
+        help='跳过以 "." 开头的隐藏文件和目录（默认处理；.Trashes、@eaDir 等系统目录总是跳过）'
+    )
+    
+    parser.add_argument(
+        '--scan-workers',
+        type=int,
+        default=1,
+        help='并行扫描子目录的线程数，适合 NAS/SMB 等高延迟存储（默认: 1）'
+    )
+    
+    parser.add_argument(
+        '--plan',
+        metavar='PLAN_FILE',
+        help='只扫描并生成整理计划 (JSONL)，列出每个文件的目标位置、大小、操作和原因，'
+             '并估算数据量和耗时；不会创建文件夹或复制文件'
+    )
+    
+    parser.add_argument(
+        '--apply-plan',
+        metavar='PLAN_FILE',
+        help='执行之前用 --plan 生成的整理计划（此时不需要 from_dir/to_dir/device_name）'
+    )
+    
+    parser.add_argument(
+        '--estimate-speed',
+        type=float,
+        default=DEFAULT_ESTIMATE_SPEED_MB,
+        help=f'生成计划时估算耗时使用的复制速度，单位 MB/s（默认: {DEFAULT_ESTIMATE_SPEED_MB}）'
+    )
+    
+    parser.add_argument(
+        '--source',
+        nargs=2,
+        action='append',
+        metavar=('FROM_DIR', 'DEVICE_NAME'),
+        help='多源导入：指定一个源文件夹和设备名称，可重复多次，与 --to 一起使用；'
+             '各源设备并行读取，共享写入线程'
+    )
+    
+    parser.add_argument(
+        '--presets',
+        nargs='*',
+        metavar='NAME',
+        help=f'多源导入：同时导入 {PRESETS_FILE.name} 中的预设（不指定名称时导入全部预设）'
+    )
+    
+    parser.add_argument(
+        '--to',
+        metavar='TO_DIR',
+        help='多源导入的目标文件夹（使用 --presets 时可省略，默认使用各预设中的目标文件夹）'
+    )
+    
+    parser.add_argument(
+        '--per-device-jobs',
+        type=int,
+        default=1,
+        help='多源导入时每个源设备同时处理的文件数（默认: 1，即每个设备一个读取者）'
+    )
+    
+    parser.add_argument(
+        '--fsync',
+        action='store_true',
+        help='每个文件复制完成后先同步到磁盘再发布，防止断电后出现内容不完整的文件（会降低速度）'
+    )
+    
+    parser.add_argument(
+        '--verify',
+        action='store_true',
+        help='复制后从磁盘重新读取目标文件比对校验和（源文件只读取一次），'
+             f'校验和记录在每个目标文件夹的 {MANIFEST_FILENAME} 中'
+    )
+    
+    parser.add_argument(
+        '--verify-archive',
+        metavar='ARCHIVE_DIR',
+        help='按校验清单重新校验已整理的归档文件夹，--jobs 指定并行线程数（默认使用全部 CPU 核心）'
+    )
+    
+    parser.add_argument(
+        '--proxies',
+        action='store_true',
+        help=f'整理的同时用 ffmpeg 生成视频的封面图和低分辨率代理文件，存放在各日期文件夹的 {PROXY_DIRNAME} 子文件夹中'
+    )
+    
+    parser.add_argument(
+        '--proxy-workers',
+        type=int,
+        help='同时运行的 ffmpeg 进程数（默认: CPU 核心数）'
+    )
+    
+    parser.add_argument(
+        '--no-date-prefilter',
+        action='store_true',
+        help='指定日期范围时不按目录名、文件名中的日期和修改时间提前排除文件，每个文件都读取拍摄日期后再判断'
+    )
+    
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='整理完已有的文件后继续监视源文件夹（Linux 上使用 inotify），新文件写入完成后立即整理，按 Ctrl+C 停止'
+    )
+    
+    parser.add_argument(
+        '--settle-seconds',
+        type=float,
+        default=SETTLE_SECONDS,
+        help=f'--watch 时文件最后一次写入后等待多少秒才开始整理（默认: {SETTLE_SECONDS:g}）'
+    )
+    
+    parser.add_argument(
+        '--archive-stats',
+        metavar='ARCHIVE_DIR',
+        help='根据归档目录输出已整理文件的统计（按设备的文件数、大小和日期范围），不遍历文件夹'
+    )
+    
+    parser.add_argument(
+        '--query-archive',
+        metavar='ARCHIVE_DIR',
+        help='在归档目录中查询文件并输出路径，可配合 --device、--start-date、--end-date 和 --type 过滤'
+    )
+    
+    parser.add_argument(
+        '--device',
+        metavar='DEVICE_NAME',
+        help='--query-archive 时只查询该设备名称的文件'
+    )
+    
+    parser.add_argument(
+        '--rebuild-catalog',
+        metavar='ARCHIVE_DIR',
+        help='遍历已整理的文件夹重新生成归档目录（升级前整理的归档、或手动删除/移动过文件后使用）'
+    )
+    
+    parser.add_argument(
+        '--progress',
+        action='store_true',
+        help='运行过程中定期输出进度、处理速度、复制速度、队列深度和预计剩余时间'
+    )
+    
+    parser.add_argument(
+        '--metrics-json',
+        metavar='FILE',
+        help='结束后把吞吐量、各阶段耗时（扫描/stat/读取日期/哈希/复制）、队列深度等指标以 JSON 格式写入该文件'
+    )
+    
     parser.add_argument(
         '-v', '--verbose',
         action='store_true',
@@ -264,6 +1604,30 @@ def main():
     
     args = parser.parse_args()
     
+    multi_source = args.source is not None or args.presets is not None
+    archive_mode = args.verify_archive or args.archive_stats or args.query_archive or args.rebuild_catalog
+    if archive_mode and (args.from_dir or args.plan or args.apply_plan or multi_source):
+        parser.error("--verify-archive/--archive-stats/--query-archive/--rebuild-catalog 不能与导入参数同时使用")
+    if args.device and not args.query_archive:
+        parser.error("--device 只能与 --query-archive 一起使用")
+    if args.apply_plan and args.plan:
+        parser.error("--plan 和 --apply-plan 不能同时使用")
+    if args.watch and (args.plan or args.apply_plan or multi_source or archive_mode):
+        parser.error("--watch 只能用于单个源文件夹的导入，不能与 --plan、--apply-plan、--source/--presets 同时使用")
+    if args.settle_seconds < 0:
+        parser.error("--settle-seconds 不能小于 0")
+    if multi_source:
+        if args.from_dir or args.plan or args.apply_plan:
+            parser.error("--source/--presets 不能与位置参数、--plan 或 --apply-plan 同时使用")
+        if args.source and not args.to:
+            parser.error("使用 --source 时需要通过 --to 指定目标文件夹")
+        if args.per_device_jobs < 1:
+            parser.error("--per-device-jobs 必须大于等于 1")
+    elif not args.apply_plan and not archive_mode and not (args.from_dir and args.to_dir and args.device_name):
+        parser.error("需要提供 from_dir、to_dir 和 device_name（使用 --apply-plan 或 --source/--presets 时除外）")
+    if args.estimate_speed <= 0:
+        parser.error("--estimate-speed 必须大于 0")
+    
     # 设置日志
     if args.verbose:
         logging.getLogger().setLevel(logging.DEBUG)
@@ -292,10 +1656,88 @@ def main():
         logging.error(f"日期解析错误: {e}")
         return 1
     
+    if args.jobs < 1 or args.scan_workers < 1 or (args.proxy_workers is not None and args.proxy_workers < 1):
+        logging.error("并发线程数必须大于等于 1")
+        return 1
+    
+    progress_callback = None
+    if args.progress:
+        progress_callback = lambda snapshot: logging.info(format_progress(snapshot))
+    
     # 执行整理操作
     try:
-        success = organize_videos(args.from_dir, args.to_dir, args.device_name, args.type, start_date, end_date)
-        if success:
+        if args.verify_archive:
+            counts = verify_archive(args.verify_archive, workers=args.jobs if args.jobs > 1 else None)
+            logging.info(
+                f"校验完成: {counts['folders']} 个文件夹，{counts['files']} 个文件，通过 {counts['ok']}，"
+                f"不一致 {counts['mismatch']}，缺失 {counts['missing']}，读取失败 {counts['error']}，"
+                f"未记录校验和 {counts['untracked']}"
+            )
+            if counts['mismatch'] or counts['missing'] or counts['error']:
+                print("❌ 归档校验发现问题!")
+                return 1
+            print("✅ 归档校验通过!")
+            return 0
+        if args.rebuild_catalog:
+            rebuild_catalog(args.rebuild_catalog, media_kind, _read_manifest_if_exists)
+            print("✅ 归档目录已重新生成!")
+            return 0
+        if args.archive_stats:
+            log_archive_stats(args.archive_stats)
+            return 0
+        if args.query_archive:
+            kind = {'video': KIND_VIDEO, 'image': KIND_IMAGE}.get(args.type)
+            with CatalogReader(args.query_archive) as reader:
+                started = time.perf_counter()
+                results = reader.query(args.device, start_date, end_date, kind)
+                elapsed = time.perf_counter() - started
+            for entry in results:
+                print(entry['path'])
+            logging.info(
+                f"查询到 {len(results)} 个文件，共 {format_size(sum(entry['size'] for entry in results))}"
+                f"（目录共 {reader.count} 条记录，用时 {elapsed * 1000:.1f} 毫秒）"
+            )
+            return 0
+        if multi_source:
+            sources = [
+                {'from_dir': from_dir, 'device_name': device_name, 'file_type': args.type}
+                for from_dir, device_name in args.source or []
+            ]
+            if args.presets is not None:
+                sources += load_preset_sources(args.presets)
+            success = organize_sources(
+                sources, to_dir=args.to, jobs=args.jobs if args.jobs > 1 else None,
+                per_device_jobs=args.per_device_jobs, start_date=start_date, end_date=end_date,
+                use_index=args.index, dedup=args.dedup, date_source=args.date_source, link_mode=args.link_mode,
+                skip_hidden=args.skip_hidden, durable=args.fsync,
+                progress_callback=progress_callback, metrics_path=args.metrics_json, verify=args.verify,
+                proxies=args.proxies, proxy_workers=args.proxy_workers,
+                date_prefilter=not args.no_date_prefilter
+            )
+        elif args.apply_plan:
+            success = apply_plan(
+                args.apply_plan, jobs=args.jobs, durable=args.fsync,
+                progress_callback=progress_callback, metrics_path=args.metrics_json, verify=args.verify,
+                proxies=args.proxies, proxy_workers=args.proxy_workers
+            )
+        else:
+            success = organize_videos(
+                args.from_dir, args.to_dir, args.device_name, args.type, start_date, end_date,
+                jobs=args.jobs, use_index=args.index, dedup=args.dedup,
+                date_source=args.date_source, link_mode=args.link_mode,
+                skip_hidden=args.skip_hidden, scan_workers=args.scan_workers,
+                plan_path=args.plan, estimate_speed=args.estimate_speed, durable=args.fsync,
+                progress_callback=progress_callback, metrics_path=args.metrics_json, verify=args.verify,
+                proxies=args.proxies, proxy_workers=args.proxy_workers, watch=args.watch,
+                settle_seconds=args.settle_seconds, date_prefilter=not args.no_date_prefilter
+            )
+        if success and multi_source:
+            print("✅ 多源导入完成!")
+        elif success and args.plan:
+            print(f"✅ 整理计划已生成: {args.plan}")
+        elif success and args.apply_plan:
+            print("✅ 整理计划执行完成!")
+        elif success:
             file_type_name = '视频' if args.type == 'video' else '图片' if args.type == 'image' else '媒体'
             print(f"✅ {file_type_name}文件整理完成!")
         else:
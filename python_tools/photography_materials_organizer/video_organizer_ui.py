@@ -11,15 +11,17 @@ from pathlib import Path
 from datetime import datetime
 import logging
 import json
-import threading
-import queue
+import time
 from video_organizer import (
-    organize_videos,
     parse_date,
     setup_logging,
+    format_size,
     VIDEO_EXTENSIONS,
     IMAGE_EXTENSIONS
 )
+from import_metrics import format_progress
+from job_manager import JobManager
+from archive_catalog import CatalogReader
 
 # 设置日志
 setup_logging()
@@ -27,6 +29,16 @@ setup_logging()
 # 预设配置文件路径
 PRESETS_FILE = Path(__file__).parent / "presets.json"
 
+# 完整日志文件的存放目录
+LOG_DIR = Path(__file__).parent / "logs"
+
+# 界面中显示的日志行数和刷新间隔（秒）
+UI_LOG_LINES = 200
+UI_REFRESH_INTERVAL = 0.5
+
+# 后台任务在进程内共享，关闭页面不会中断正在运行的任务
+job_manager = JobManager(LOG_DIR, log_lines=UI_LOG_LINES)
+
 def load_presets():
     """加载预设配置"""
     try:
@@ -101,10 +113,20 @@ def organize_files_wrapper(
     file_type,
     start_date,
     end_date,
+    jobs=1,
+    use_index=False,
+    dedup="off",
+    date_source="metadata",
+    link_mode="copy",
+    verify=False,
+    proxies=False,
+    watch=False,
     progress=gr.Progress()
 ):
     """
     包装整理文件函数，用于 Gradio 界面
+    
+    整理在后台任务中运行，这里提交任务后跟踪其进度，返回 (日志, 结果消息, 任务 ID)
     """
     log_output = ""
     
@@ -112,19 +134,19 @@ def organize_files_wrapper(
     if not from_dir or not os.path.exists(from_dir):
         error_msg = "❌ 源文件夹不存在或未指定"
         log_output += format_log_output(error_msg, "ERROR")
-        yield log_output, None
+        yield log_output, None, ""
         return
     
     if not to_dir:
         error_msg = "❌ 目标文件夹未指定"
         log_output += format_log_output(error_msg, "ERROR")
-        yield log_output, None
+        yield log_output, None, ""
         return
     
     if not device_name:
         error_msg = "❌ 设备名称未指定"
         log_output += format_log_output(error_msg, "ERROR")
-        yield log_output, None
+        yield log_output, None, ""
         return
     
     # 解析日期
@@ -143,98 +165,217 @@ def organize_files_wrapper(
         if start_date_obj and end_date_obj and start_date_obj > end_date_obj:
             error_msg = "起始日期不能晚于终止日期"
             log_output += format_log_output(error_msg, "ERROR")
-            yield log_output, None
+            yield log_output, None, ""
             return
             
     except ValueError as e:
         log_output += format_log_output(f"日期解析错误: {e}", "ERROR")
-        yield log_output, None
+        yield log_output, None, ""
         return
     
-    # 记录配置信息
-    log_output += format_log_output(f"源文件夹: {from_dir}")
-    log_output += format_log_output(f"目标文件夹: {to_dir}")
-    log_output += format_log_output(f"设备名称: {device_name}")
-    log_output += format_log_output(f"文件类型: {file_type}")
+    params = {
+        'from_dir': from_dir,
+        'to_dir': to_dir,
+        'device_name': device_name,
+        'file_type': file_type,
+        'start_date': start_date_obj,
+        'end_date': end_date_obj,
+        'jobs': int(jobs or 1),
+        'use_index': bool(use_index),
+        'dedup': dedup or "off",
+        'date_source': date_source or "metadata",
+        'link_mode': link_mode or "copy",
+        'verify': bool(verify),
+        'proxies': bool(proxies),
+        'watch': bool(watch),
+    }
+    try:
+        job = job_manager.submit(params, description=f"{device_name}: {from_dir} → {to_dir}")
+    except RuntimeError as e:
+        log_output += format_log_output(str(e), "ERROR")
+        yield log_output, gr.Markdown(value=f"❌ {e}", visible=True), ""
+        return
     
-    # 创建自定义日志处理器来捕获日志
-    class GradioLogHandler(logging.Handler):
-        def __init__(self, log_queue):
-            super().__init__()
-            self.log_queue = log_queue
-        
-        def emit(self, record):
-            log_entry = self.format(record)
-            self.log_queue.put(log_entry)
+    # 记录配置信息（任务在后台运行，关闭页面后可以用任务 ID 重新连接）
+    log_buffer = job.log
+    log_buffer.add(f"任务 ID: {job.id}")
+    if start_date_obj:
+        log_buffer.add(f"起始日期: {start_date_obj}")
+    if end_date_obj:
+        log_buffer.add(f"终止日期: {end_date_obj}")
+    log_buffer.add(f"源文件夹: {from_dir}")
+    log_buffer.add(f"目标文件夹: {to_dir}")
+    log_buffer.add(f"设备名称: {device_name}")
+    log_buffer.add(f"文件类型: {file_type}")
+    log_buffer.add(f"并发线程数: {params['jobs']}")
+    if use_index:
+        log_buffer.add("使用扫描索引: 是")
+    if dedup and dedup != "off":
+        log_buffer.add(f"内容去重: {dedup}")
+    log_buffer.add(f"日期来源: {params['date_source']}")
+    if link_mode and link_mode != "copy":
+        log_buffer.add(f"传输方式: {link_mode}")
+    if verify:
+        log_buffer.add("复制后校验: 是")
+    if proxies:
+        log_buffer.add("生成封面图和代理文件: 是")
+    if watch:
+        log_buffer.add("持续监视源文件夹: 是（在后台任务中点击取消即可停止）")
     
-    log_queue = queue.Queue()
-    handler = GradioLogHandler(log_queue)
-    handler.setFormatter(logging.Formatter('[%(asctime)s] %(levelname)s: %(message)s', datefmt='%Y-%m-%d %H:%M:%S'))
-    logger = logging.getLogger()
-    logger.addHandler(handler)
+    for log_text, result in follow_job(job.id, progress):
+        yield log_text, result, job.id
+
+def follow_job(job_id, progress=gr.Progress()):
+    """跟踪一个后台任务，按固定间隔返回 (日志, 结果消息)，直到任务结束
+
+    只读取任务的状态，页面关闭或断开连接不会影响任务本身
+    """
+    job = job_manager.get((job_id or "").strip())
+    if job is None:
+        yield "", gr.Markdown(value="❌ 任务不存在（可能已过期），请在任务列表中查看", visible=True)
+        return
     
-    # 立即返回初始日志
-    yield log_output, gr.Markdown(visible=False)
+    progress(0, desc="正在扫描文件..." if job.snapshot is None else format_progress(job.snapshot))
+    rendered_version = None
+    shown_snapshot = None
+    while True:
+        # 先读取状态再渲染，保证任务结束后的最后一次渲染包含全部日志
+        done = job.done
+        snapshot = job.snapshot
+        if snapshot is not None and snapshot is not shown_snapshot:
+            shown_snapshot = snapshot
+            progress(snapshot['fraction'], desc=format_progress(snapshot))
+        
+        # 只有日志有变化时才发送，避免大量导入时频繁传输整个日志
+        if job.log.version != rendered_version:
+            rendered_version = job.log.version
+            yield job.log.render(), gr.Markdown(visible=False)
+        if done:
+            break
+        time.sleep(UI_REFRESH_INTERVAL)
     
-    def worker():
-        try:
-            success = organize_videos(
-                from_dir,
-                to_dir,
-                device_name,
-                file_type,
-                start_date_obj,
-                end_date_obj
-            )
-            log_queue.put(("_DONE_", success))
-        except Exception as e:
-            log_queue.put(("_ERROR_", str(e)))
+    if job.state == 'succeeded':
+        yield job.log.render(), gr.Markdown(value=f"✅ 整理成功！文件已保存到: {job.params['to_dir']}", visible=True)
+    elif job.state == 'cancelled':
+        yield job.log.render(), gr.Markdown(value="⏹️ 任务已取消，重新运行相同的导入会从中断处继续", visible=True)
+    elif job.error:
+        yield job.log.render(), gr.Markdown(value=f"发生错误: {job.error}", visible=True)
+    else:
+        yield job.log.render(), gr.Markdown(value="❌ 文件整理失败", visible=True)
 
-    thread = threading.Thread(target=worker)
-    thread.start()
-    
+def format_jobs_table():
+    """把后台任务列表格式化为 Markdown 表格"""
+    jobs = job_manager.list_jobs()
+    if not jobs:
+        return "*暂无后台任务*"
+    rows = [
+        "| 任务 ID | 状态 | 任务 | 进度 | 速度 | 已运行 |",
+        "| --- | --- | --- | --- | --- | --- |",
+    ]
+    for job in jobs:
+        status = job.status()
+        found = status['files_found']
+        progress_text = f"{status['files_done']}/{found}"
+        if status['fraction'] is not None:
+            progress_text += f" ({status['fraction'] * 100:.1f}%)"
+        speed = f"{status['files_per_second']:.1f} 个/秒，{status['copy_mb_per_second']:.1f} MB/s"
+        rows.append(
+            f"| `{status['id']}` | {status['state_name']} | {status['description']} "
+            f"| {progress_text} | {speed} | {status['elapsed_seconds']:.0f} 秒 |"
+        )
+    return "\n".join(rows)
+
+def control_job(action, job_id):
+    """暂停/继续/取消任务，返回 (提示信息, 任务列表)"""
+    job_id = (job_id or "").strip()
+    handlers = {
+        'pause': (job_manager.pause, "已暂停"),
+        'resume': (job_manager.resume, "已继续"),
+        'cancel': (job_manager.cancel, "已请求取消"),
+    }
+    handler, done_text = handlers[action]
+    if not job_id:
+        message = "❌ 请输入任务 ID"
+    elif handler(job_id):
+        message = f"✅ 任务 {job_id} {done_text}"
+    else:
+        message = f"❌ 任务 {job_id} 不存在或当前状态不支持该操作"
+    return gr.Markdown(value=message, visible=True), format_jobs_table()
+
+# 各传输方式对源文件的影响，显示在使用说明和页脚中
+TRANSFER_NOTES = {
+    'copy': "只会复制，不会修改或删除源文件",
+    'hardlink': "目标文件与源文件是同一份数据的硬链接，不会删除源文件（不支持时回退到复制）",
+    'reflink': "以 reflink 克隆到目标文件夹，不会修改或删除源文件（不支持时回退到复制）",
+    'move': "⚠️ 移动模式会删除源文件（跨文件系统时先复制并写入磁盘，再删除源文件）",
+}
+
+USAGE_HELP = """
+1. **源文件夹**: 选择包含要整理文件的文件夹
+2. **目标文件夹**: 选择整理后文件的存放位置
+3. **设备名称**: 输入拍摄设备的名称（如：iPhone 15）
+4. **文件类型**: 选择要整理的文件类型
+5. **日期过滤**: 可选，只处理特定日期范围内的文件
+
+**日期格式支持**:
+- `YYYY-MM-DD` (2024-01-15)
+- `YYYY/MM/DD` (2024/01/15)
+- `YYYYMMDD` (20240115)
+- `MM-DD-YYYY` (01-15-2024)
+
+**注意**: 
+- {transfer_note}
+- 如果目标文件已存在，会自动添加数字后缀
+- 整理在后台运行，关闭页面后可以在 "后台任务" 中重新连接
+"""
+
+FOOTER = """
+---
+<div style="text-align: center; color: #666; font-size: 0.9em;">
+    💡 提示: {transfer_note}
+</div>
+"""
+
+def transfer_texts(link_mode):
+    """返回与所选传输方式对应的 (使用说明, 页脚)"""
+    note = TRANSFER_NOTES.get(link_mode or 'copy', TRANSFER_NOTES['copy'])
+    return USAGE_HELP.format(transfer_note=note), FOOTER.format(transfer_note=note)
+
+def archive_summary(archive_dir, device_name, start_date_str, end_date_str):
+    """根据归档目录统计已整理的文件，返回 Markdown 文本"""
+    archive_dir = (archive_dir or "").strip()
+    if not archive_dir:
+        return "❌ 请输入已整理的目标文件夹"
+    if not os.path.isdir(archive_dir):
+        return f"❌ 文件夹不存在: {archive_dir}"
     try:
-        while True:
-            # 批量获取日志，避免界面卡顿
-            messages_received = False
-            while True:
-                try:
-                    # 第一个元素设置超时，后续非阻塞获取
-                    timeout = 0.1 if not messages_received else 0.0
-                    msg = log_queue.get(timeout=timeout)
-                    
-                    if isinstance(msg, tuple):
-                        if msg[0] == "_DONE_":
-                            success = msg[1]
-                            if success:
-                                file_type_name = '视频' if file_type == 'video' else '图片' if file_type == 'image' else '媒体'
-                                success_msg = f"✅ {file_type_name}文件整理完成!"
-                                log_output += format_log_output(success_msg, "SUCCESS")
-                                yield log_output, gr.Markdown(value=f"✅ 整理成功！文件已保存到: {to_dir}", visible=True)
-                            else:
-                                error_msg = "❌ 文件整理失败"
-                                log_output += format_log_output(error_msg, "ERROR")
-                                yield log_output, gr.Markdown(value="❌ 文件整理失败", visible=True)
-                            return
-                        elif msg[0] == "_ERROR_":
-                            error_msg = f"发生错误: {msg[1]}"
-                            log_output += format_log_output(error_msg, "ERROR")
-                            yield log_output, gr.Markdown(value=error_msg, visible=True)
-                            return
-                    else:
-                        log_output += msg + "\n"
-                        messages_received = True
-                        
-                except queue.Empty:
-                    break
-            
-            if messages_received:
-                yield log_output, gr.Markdown(visible=False)
-                
-            if not thread.is_alive() and log_queue.empty():
-                break
-    finally:
-        logger.removeHandler(handler)
+        start_date = parse_date(start_date_str) if start_date_str else None
+        end_date = parse_date(end_date_str) if end_date_str else None
+    except ValueError as e:
+        return f"❌ 日期解析错误: {e}"
+    device_name = (device_name or "").strip() or None
+    try:
+        with CatalogReader(archive_dir) as reader:
+            stats = reader.stats()
+            files, total = reader.count_matching(device_name, start_date, end_date)
+    except (OSError, ValueError) as e:
+        return f"❌ 读取归档目录失败: {e}"
+    if not stats['files']:
+        return "*归档目录为空或不存在，可以运行 `python video_organizer.py --rebuild-catalog <目标文件夹>` 从已整理的文件夹生成*"
+    rows = [
+        f"共 **{stats['files']}** 个文件，{format_size(stats['bytes'])}",
+        "",
+        "| 设备 | 文件数 | 大小 | 日期范围 |",
+        "| --- | --- | --- | --- |",
+    ]
+    for device in stats['devices']:
+        rows.append(
+            f"| {device['device_name']} | {device['files']} | {format_size(device['bytes'])} "
+            f"| {device['first_date']} ~ {device['last_date']} |"
+        )
+    if device_name or start_date or end_date:
+        rows.extend(["", f"满足筛选条件的文件: **{files}** 个，{format_size(total)}"])
+    return "\n".join(rows)
 
 def get_supported_formats():
     """获取支持的文件格式列表"""
@@ -317,6 +458,16 @@ def create_ui():
                     info="选择要整理的文件类型"
                 )
                 
+                date_source = gr.Radio(
+                    choices=[
+                        ("拍摄时间（EXIF/视频元数据）", "metadata"),
+                        ("文件系统时间", "filesystem")
+                    ],
+                    value="metadata",
+                    label="日期来源",
+                    info="优先读取文件内嵌的拍摄时间，读取不到时回退到文件系统时间"
+                )
+                
                 # 高级选项
                 gr.Markdown("### 📅 日期过滤（可选）")
                 
@@ -337,6 +488,65 @@ def create_ui():
                         value=None
                     )
                 
+                # 性能选项
+                gr.Markdown("### ⚡ 性能选项")
+                
+                jobs = gr.Slider(
+                    minimum=1,
+                    maximum=32,
+                    step=1,
+                    value=1,
+                    label="并发线程数",
+                    info="大于 1 时扫描与复制并行进行，适合 SSD/NVMe 等高速目标盘"
+                )
+                
+                use_index = gr.Checkbox(
+                    value=False,
+                    label="使用扫描索引",
+                    info="在目标文件夹记录已整理的文件，再次导入时跳过未变化的文件"
+                )
+                
+                dedup = gr.Radio(
+                    choices=[
+                        ("不去重", "off"),
+                        ("跳过重复文件", "skip"),
+                        ("硬链接重复文件", "hardlink")
+                    ],
+                    value="off",
+                    label="内容去重",
+                    info="按文件内容识别不同存储卡或改名后的重复文件"
+                )
+                
+                link_mode = gr.Radio(
+                    choices=[
+                        ("复制", "copy"),
+                        ("硬链接", "hardlink"),
+                        ("Reflink 克隆", "reflink"),
+                        ("移动（删除源文件）", "move")
+                    ],
+                    value="copy",
+                    label="传输方式",
+                    info="同一文件系统上硬链接/克隆/移动几乎瞬间完成，不支持时自动回退到复制"
+                )
+                
+                verify = gr.Checkbox(
+                    value=False,
+                    label="复制后校验",
+                    info="从磁盘重新读取目标文件比对校验和，并在每个日期文件夹中记录校验清单（适合不稳定的读卡器）"
+                )
+                
+                proxies = gr.Checkbox(
+                    value=False,
+                    label="生成封面图和代理文件",
+                    info="整理的同时用 ffmpeg 为每个视频生成封面图和低分辨率代理文件（存放在日期文件夹的 proxies 中）"
+                )
+                
+                watch = gr.Checkbox(
+                    value=False,
+                    label="持续监视源文件夹",
+                    info="整理完已有的文件后继续等待新文件（如 Wi-Fi 传输），写入完成后立即整理；在后台任务中点击取消停止"
+                )
+                
                 # 操作按钮
                 with gr.Row():
                     organize_btn = gr.Button(
@@ -352,25 +562,7 @@ def create_ui():
             with gr.Column(scale=1):
                 # 帮助信息
                 gr.Markdown("### 📖 使用说明")
-                gr.Markdown(
-                    """
-                    1. **源文件夹**: 选择包含要整理文件的文件夹
-                    2. **目标文件夹**: 选择整理后文件的存放位置
-                    3. **设备名称**: 输入拍摄设备的名称（如：iPhone 15）
-                    4. **文件类型**: 选择要整理的文件类型
-                    5. **日期过滤**: 可选，只处理特定日期范围内的文件
-                    
-                    **日期格式支持**:
-                    - `YYYY-MM-DD` (2024-01-15)
-                    - `YYYY/MM/DD` (2024/01/15)
-                    - `YYYYMMDD` (20240115)
-                    - `MM-DD-YYYY` (01-15-2024)
-                    
-                    **注意**: 
-                    - 操作不会删除源文件，只会复制
-                    - 如果目标文件已存在，会自动添加数字后缀
-                    """
-                )
+                usage_help = gr.Markdown(transfer_texts("copy")[0])
         
         # 输出区域
         gr.Markdown("---")
@@ -386,6 +578,35 @@ def create_ui():
         
         result_msg = gr.Markdown(visible=False)
         
+        # 后台任务：关闭页面后任务继续运行，可以按任务 ID 重新连接
+        with gr.Accordion("🗂️ 后台任务", open=False):
+            gr.Markdown("整理任务在后台运行，关闭页面不会中断。重新打开页面后输入任务 ID 即可重新查看进度和日志。")
+            jobs_table = gr.Markdown(format_jobs_table())
+            with gr.Row():
+                job_id = gr.Textbox(
+                    label="任务 ID",
+                    placeholder="开始整理后自动填入，也可以从上表中复制",
+                    scale=2
+                )
+                refresh_jobs_btn = gr.Button("🔃 刷新列表", variant="secondary", size="sm")
+                attach_job_btn = gr.Button("🔗 重新连接", variant="secondary", size="sm")
+            with gr.Row():
+                pause_job_btn = gr.Button("⏸️ 暂停", variant="secondary", size="sm")
+                resume_job_btn = gr.Button("▶️ 继续", variant="secondary", size="sm")
+                cancel_job_btn = gr.Button("⏹️ 取消", variant="stop", size="sm")
+            job_action_result = gr.Markdown(visible=False)
+        
+        # 归档统计：读取目标文件夹中的归档目录，不需要遍历文件夹
+        with gr.Accordion("📚 归档统计", open=False):
+            with gr.Row():
+                archive_dir = gr.Textbox(label="已整理的目标文件夹", placeholder="例如: /Users/username/Videos/organized", scale=2)
+                archive_device = gr.Textbox(label="设备名称（可选）", placeholder="例如: DJI Mavic")
+            with gr.Row():
+                archive_start = gr.Textbox(label="开始日期（可选）", placeholder="YYYY-MM-DD")
+                archive_end = gr.Textbox(label="结束日期（可选）", placeholder="YYYY-MM-DD")
+                archive_btn = gr.Button("📊 统计", variant="secondary", size="sm")
+            archive_result = gr.Markdown()
+        
         # 支持的格式信息
         with gr.Accordion("📋 支持的文件格式", open=False):
             gr.Markdown(get_supported_formats())
@@ -505,38 +726,76 @@ def create_ui():
                 device_name,
                 file_type,
                 start_date,
-                end_date
+                end_date,
+                jobs,
+                use_index,
+                dedup,
+                date_source,
+                link_mode,
+                verify,
+                proxies,
+                watch
             ],
-            outputs=[log_output, result_msg]
+            outputs=[log_output, result_msg, job_id]
         ).then(
             fn=update_result_visibility,
             inputs=[log_output, result_msg],
             outputs=[result_msg]
+        ).then(
+            fn=format_jobs_table,
+            outputs=[jobs_table]
+        )
+        
+        # 后台任务事件
+        refresh_jobs_btn.click(fn=format_jobs_table, outputs=[jobs_table])
+        attach_job_btn.click(
+            fn=follow_job,
+            inputs=[job_id],
+            outputs=[log_output, result_msg]
+        ).then(
+            fn=format_jobs_table,
+            outputs=[jobs_table]
+        )
+        for button, action in ((pause_job_btn, 'pause'), (resume_job_btn, 'resume'), (cancel_job_btn, 'cancel')):
+            button.click(
+                fn=lambda job_id_val, action=action: control_job(action, job_id_val),
+                inputs=[job_id],
+                outputs=[job_action_result, jobs_table]
+            )
+        app.load(fn=format_jobs_table, outputs=[jobs_table])
+        
+        # 归档统计事件
+        archive_btn.click(
+            fn=archive_summary,
+            inputs=[archive_dir, archive_device, archive_start, archive_end],
+            outputs=[archive_result]
         )
         
         clear_btn.click(
-            fn=lambda: ("", "", "", "video", None, None, "", gr.Markdown(visible=False)),
+            fn=lambda: ("", "", "", "video", "metadata", None, None, 1, False, "off", "copy", False, False, False, "", gr.Markdown(visible=False)),
             outputs=[
                 from_dir,
                 to_dir,
                 device_name,
                 file_type,
+                date_source,
                 start_date,
                 end_date,
+                jobs,
+                use_index,
+                dedup,
+                link_mode,
+                verify,
+                proxies,
+                watch,
                 log_output,
                 result_msg
             ]
         )
         
-        # 页脚
-        gr.Markdown(
-            """
-            ---
-            <div style="text-align: center; color: #666; font-size: 0.9em;">
-                💡 提示: 本工具采用复制模式，不会修改或删除源文件
-            </div>
-            """
-        )
+        # 页脚（随所选的传输方式更新）
+        footer = gr.Markdown(transfer_texts("copy")[1])
+        link_mode.change(fn=transfer_texts, inputs=[link_mode], outputs=[usage_help, footer])
     
     return app
 
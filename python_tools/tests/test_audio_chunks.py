@@ -0,0 +1,163 @@
+import io
+import wave
+import asyncio
+
+import pytest
+
+pytest.importorskip("openai")
+
+from python_tools import audio_craweler
+from python_tools.audio_craweler import (
+    SAMPLE_RATE, AudioChunk, Pipeline, Segment, StageLimits, Transcriber, TranscriptionBackend, VideoResult,
+    format_timestamp, plan_cuts, render_transcript, slice_wav, split_audio,
+)
+
+
+def make_wav(seconds: float) -> bytes:
+    """16 kHz mono wav whose every sample holds its own frame number (mod 2**15)."""
+    frames = b"".join((i % 32768).to_bytes(2, "little") for i in range(int(seconds * SAMPLE_RATE)))
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(frames)
+    return buffer.getvalue()
+
+
+def wav_frames(audio: bytes) -> bytes:
+    with wave.open(io.BytesIO(audio)) as wav:
+        return wav.readframes(wav.getnframes())
+
+
+def test_short_audio_is_not_cut():
+    assert plan_cuts(300, [], 300) == []
+    assert plan_cuts(10, [(2, 3)], 300) == []
+
+
+def test_cuts_at_max_length_without_silence():
+    assert plan_cuts(1000, [], 300) == [300, 600, 900]
+
+
+def test_cuts_in_last_silence_of_second_half():
+    silences = [(50, 60), (200, 210), (280, 290), (450, 452)]
+    assert plan_cuts(700, silences, 300) == [285, 451]
+
+
+def test_silence_in_first_half_is_ignored():
+    assert plan_cuts(500, [(100, 110)], 300) == [300]
+
+
+def test_chunks_never_exceed_max_length():
+    silences = [(t, t + 1) for t in range(7, 3600, 37)]
+    cuts = plan_cuts(3600, silences, 120)
+    bounds = [0.0, *cuts, 3600]
+    assert all(0 < b - a <= 120 for a, b in zip(bounds, bounds[1:]))
+
+
+def test_slice_wav():
+    audio = make_wav(2.5)
+    frames = wav_frames(audio)
+    assert wav_frames(slice_wav(audio, 0, 1)) == frames[:2 * SAMPLE_RATE]
+    assert wav_frames(slice_wav(audio, 1, 2)) == frames[2 * SAMPLE_RATE:4 * SAMPLE_RATE]
+    assert wav_frames(slice_wav(audio, 2, None)) == frames[4 * SAMPLE_RATE:]
+    assert wav_frames(slice_wav(audio, 3, None)) == b""
+
+
+def test_split_wav_along_planned_cuts(monkeypatch):
+    audio = make_wav(10)
+
+    async def analyze_audio(data):
+        return 10.0, [(3.5, 4.5)]
+
+    monkeypatch.setattr(audio_craweler, "analyze_audio", analyze_audio)
+    chunks = asyncio.run(split_audio(audio, "talk.wav", 6, len(audio) * 2))
+    assert [(chunk.start, chunk.filename) for chunk in chunks] == [(0.0, "talk.part1.wav"), (4.0, "talk.part2.wav")]
+    assert b"".join(wav_frames(chunk.audio) for chunk in chunks) == wav_frames(audio)
+
+
+def test_split_keeps_small_audio_whole(monkeypatch):
+    audio = make_wav(1)
+
+    async def analyze_audio(data):
+        return 1.0, []
+
+    monkeypatch.setattr(audio_craweler, "analyze_audio", analyze_audio)
+    assert asyncio.run(split_audio(audio, "talk.wav", 6, len(audio) * 2)) == [AudioChunk(0.0, audio, "talk.wav")]
+
+
+def test_size_limit_shortens_chunks(monkeypatch):
+    audio = make_wav(10)
+
+    async def analyze_audio(data):
+        return 10.0, []
+
+    monkeypatch.setattr(audio_craweler, "analyze_audio", analyze_audio)
+    chunks = asyncio.run(split_audio(audio, "talk.wav", 300, len(audio) // 2))
+    assert len(chunks) == 3
+    assert all(len(chunk.audio) <= len(audio) // 2 for chunk in chunks)
+
+
+class FlakyBackend(TranscriptionBackend):
+    """Fails the first attempt of every chunk named in failures, then echoes the chunk name."""
+
+    name = "flaky"
+
+    def __init__(self, failures=(), always_fail=()):
+        self.failures = set(failures)
+        self.always_fail = set(always_fail)
+        self.calls = []
+
+    async def transcribe(self, audio, filename):
+        self.calls.append(filename)
+        if filename in self.always_fail:
+            raise ConnectionError("down")
+        if filename in self.failures:
+            self.failures.discard(filename)
+            raise ConnectionError("reset")
+        await asyncio.sleep(0.01 if filename.endswith("1.wav") else 0)
+        return [Segment(0.0, 1.0, f" {filename} "), Segment(1.0, 2.0, "")]
+
+
+def run_transcriber(monkeypatch, backend, chunks, retries=2):
+    async def split(audio, filename, max_seconds, max_bytes):
+        return chunks
+
+    monkeypatch.setattr(audio_craweler, "split_audio", split)
+    monkeypatch.setattr(audio_craweler, "RETRY_BACKOFF_SECONDS", 0)
+
+    async def main():
+        transcriber = Transcriber(backend, chunk_seconds=60, retries=retries)
+        return await transcriber.transcribe(b"", "talk.wav", VideoResult("url"), Pipeline(StageLimits(1, 1, 4)))
+
+    return asyncio.run(main())
+
+
+CHUNKS = [AudioChunk(0.0, b"", "talk.part1.wav"), AudioChunk(58.5, b"", "talk.part2.wav")]
+
+
+def test_transcriber_offsets_segments_in_order(monkeypatch):
+    segments = run_transcriber(monkeypatch, FlakyBackend(), CHUNKS)
+    assert [segment.start for segment in segments] == [0.0, 1.0, 58.5, 59.5]
+    assert render_transcript(segments) == "[00:00:00] talk.part1.wav\n[00:00:58] talk.part2.wav"
+
+
+def test_transcriber_retries_failed_chunks(monkeypatch, capsys):
+    backend = FlakyBackend(failures=["talk.part2.wav"])
+    segments = run_transcriber(monkeypatch, backend, CHUNKS)
+    assert backend.calls.count("talk.part2.wav") == 2
+    assert len(segments) == 4
+    assert "retrying" in capsys.readouterr().err
+
+
+def test_transcriber_gives_up_after_retries(monkeypatch):
+    backend = FlakyBackend(always_fail=["talk.part2.wav"])
+    with pytest.raises(Exception, match="talk.part2.wav"):
+        run_transcriber(monkeypatch, backend, CHUNKS, retries=1)
+    assert backend.calls.count("talk.part2.wav") == 2
+
+
+def test_format_timestamp():
+    assert format_timestamp(0) == "00:00:00"
+    assert format_timestamp(59.9) == "00:00:59"
+    assert format_timestamp(3725) == "01:02:05"
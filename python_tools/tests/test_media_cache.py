@@ -0,0 +1,126 @@
+import os
+import time
+
+import pytest
+
+pytest.importorskip("openai")
+
+from python_tools import audio_craweler
+from python_tools.audio_craweler import MediaCache, STALE_PARTIAL_SECONDS, parse_video_id
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A clock that moves one second per call, so every cache access has its own time."""
+    now = [time.time()]
+
+    def tick():
+        now[0] += 1
+        return now[0]
+
+    monkeypatch.setattr(audio_craweler.time, "time", tick)
+
+
+def test_evicts_least_recently_used(tmp_path, clock):
+    cache = MediaCache(tmp_path, max_bytes=250)
+    for key in ("a", "b", "c"):
+        cache.put_bytes("audio", key, b"x" * 100)
+    # the third file pushes the cache over its limit, the oldest goes
+    assert cache.get("audio", "a") is None
+    assert cache.size == 200
+
+    assert cache.get("audio", "b") is not None
+    cache.put_bytes("audio", "d", b"x" * 100)
+    assert cache.get("audio", "c") is None
+    assert cache.get("audio", "b") is not None
+    assert cache.get("audio", "d") is not None
+
+
+def test_pinned_files_are_not_evicted(tmp_path, clock):
+    cache = MediaCache(tmp_path, max_bytes=150)
+    video = cache.put_bytes("video", "a", b"x" * 100)
+    with cache.pinned(video):
+        cache.put_bytes("video", "b", b"x" * 100)
+        assert video.exists()
+        assert cache.get("video", "b") is None
+    cache.put_bytes("video", "c", b"x" * 100)
+    assert not video.exists()
+
+
+def test_pins_are_counted(tmp_path, clock):
+    cache = MediaCache(tmp_path, max_bytes=100)
+    video = cache.put_bytes("video", "a", b"x" * 100)
+    cache.pin(video)
+    cache.pin(video)
+    cache.unpin(video)
+    cache.put_bytes("video", "b", b"x" * 100)
+    assert video.exists()
+    cache.unpin(video)
+    cache.put_bytes("video", "c", b"x" * 100)
+    assert not video.exists()
+
+
+def test_put_can_pin_a_file_larger_than_the_cache(tmp_path, clock):
+    cache = MediaCache(tmp_path, max_bytes=10)
+    source = tmp_path / "download.mp4"
+    source.write_bytes(b"x" * 100)
+    path = cache.put("video", "a", source, pin=True)
+    assert path == cache.path("video", "a")
+    assert path.read_bytes() == b"x" * 100
+    assert not source.exists()
+    cache.unpin(path)
+    cache.evict()
+    assert not path.exists()
+    assert cache.size == 0
+
+
+def test_text_round_trip_and_reopen(tmp_path):
+    cache = MediaCache(tmp_path, max_bytes=1024)
+    cache.put_text("transcript", "abc", "hello")
+    cache.put_text("info", "BV1xx411c7mD", '{"title": "t"}')
+    assert cache.read_text("transcript", "abc") == "hello"
+    assert cache.read_text("transcript", "missing") is None
+
+    reopened = MediaCache(tmp_path, max_bytes=1024)
+    assert reopened.size == cache.size
+    assert reopened.read_text("transcript", "abc") == "hello"
+
+
+def test_files_deleted_behind_the_cache_are_forgotten(tmp_path):
+    cache = MediaCache(tmp_path, max_bytes=1024)
+    path = cache.put_bytes("audio", "a", b"x" * 10)
+    os.unlink(path)
+    assert cache.get("audio", "a") is None
+    assert cache.size == 0
+
+
+def test_stale_partial_downloads_are_removed(tmp_path):
+    cache = MediaCache(tmp_path, max_bytes=1024)
+    with cache.partial_dir("current") as current:
+        (current / "video.mp4").write_bytes(b"x")
+        stale = tmp_path / "partial" / "old.1"
+        stale.mkdir()
+        old = time.time() - STALE_PARTIAL_SECONDS - 60
+        os.utime(stale, (old, old))
+
+        MediaCache(tmp_path, max_bytes=1024)
+        assert current.exists()
+        assert not stale.exists()
+    assert not current.exists()
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://www.bilibili.com/video/BV1xx411c7mD", "BV1xx411c7mD"),
+    ("https://www.bilibili.com/video/BV1xx411c7mD/?p=1", "BV1xx411c7mD"),
+    ("https://www.bilibili.com/video/BV1xx411c7mD?p=3&t=10", "BV1xx411c7mD_p3"),
+    ("https://www.bilibili.com/video/av170001", "av170001"),
+])
+def test_parse_video_id(url, expected):
+    assert parse_video_id(url) == expected
+
+
+def test_parse_video_id_falls_back_to_url_hash():
+    first = parse_video_id("https://example.com/watch?v=1")
+    assert first.startswith("url-")
+    assert first == parse_video_id("https://example.com/watch?v=1")
+    assert first != parse_video_id("https://example.com/watch?v=2")